@@ -0,0 +1,62 @@
+"""
+Benchmarks the per-call overhead of backend dispatch in `phi.math`.
+
+Compares inspecting all registered backends on every call (previous behaviour) with the type-keyed cache of
+`DynamicBackend.choose_backend` and with a backend pinned via `math.use_backend`.
+Also measures a complete `math.add` call on small arrays where dispatch dominates.
+
+Usage: python benchmarks/backend_dispatch.py [--calls 100000]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from phi import math
+from phi.backend.dynamic_backend import DYNAMIC_BACKEND
+from phi.physics.field import CenteredGrid  # registers the symbolic field backend like a simulation would
+
+
+def inspect_backends(values):
+    """ Previous implementation of `choose_backend`, checking the applicability of every backend. """
+    if not isinstance(values, tuple) and not isinstance(values, list):
+        values = [values]
+    for backend in DYNAMIC_BACKEND.backends:
+        if backend.is_applicable(values):
+            return backend
+
+
+def measure(function, calls):
+    function()  # warm-up
+    t = time.time()
+    for _ in range(calls):
+        function()
+    return (time.time() - t) / calls
+
+
+def run(calls):
+    array = np.zeros([1, 4, 4, 1], np.float32)
+    arguments = [
+        ('ndarray', array),
+        ('[ndarray, ndarray]', [array, array]),
+        ('[ndarray, float]', [array, 1.0]),
+        ('[ndarray] * 8', [array] * 8),
+        ('CenteredGrid', CenteredGrid(array)),
+    ]
+    scipy_backend = math.choose_backend(array)
+    for name, values in arguments:
+        inspect_time = measure(lambda: inspect_backends(values), calls)
+        cached_time = measure(lambda: math.choose_backend(values), calls)
+        print('choose_backend(%-20s inspect %6.2f us   cached %6.2f us' % (name + ')', inspect_time * 1e6, cached_time * 1e6))
+    add_time = measure(lambda: math.add(array, array), calls)
+    with math.use_backend(scipy_backend):
+        pinned_add_time = measure(lambda: math.add(array, array), calls)
+    native_time = measure(lambda: scipy_backend.add(array, array), calls)
+    print('add(ndarray, ndarray)       dispatched %6.2f us   pinned %6.2f us   native %6.2f us' % (add_time * 1e6, pinned_add_time * 1e6, native_time * 1e6))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--calls', type=int, default=100000)
+    args = parser.parse_args()
+    run(args.calls)
@@ -0,0 +1,57 @@
+"""
+Benchmarks reusing NumPy buffers with `math.BufferPool` in fluid simulations.
+
+Times the matrix-free Laplace stencil and steps of an `IncompressibleFlow` simulation with and without an active pool.
+With a pool, semi-Lagrangian advection writes into ping-pong buffers per state field and the stencil uses scratch buffers owned by the solver.
+The benefit depends on the array size. The allocator recycles arrays below its mmap threshold (up to 32 MB with glibc) on its own,
+while larger arrays are mapped freshly on every allocation, which causes page faults that the pool avoids.
+
+Usage: python benchmarks/buffer_pool.py [resolution ...] [--rank 3] [--steps 3]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from phi import math
+from phi.flow import World, Fluid, Domain, CLOSED, IncompressibleFlow, Inflow, Sphere, PoissonDomain, SparseCG
+from phi.physics.material import Material
+from phi.physics.pressuresolver.sparse import LaplaceStencil
+
+
+def measure(function, repeat):
+    function()  # warm-up
+    t = time.time()
+    for _ in range(repeat):
+        function()
+    return (time.time() - t) / repeat
+
+
+def run(resolution, rank, steps):
+    domain = Domain([resolution] * rank, CLOSED)
+    poisson_domain = PoissonDomain(domain)
+    stencil = LaplaceStencil(domain.resolution, poisson_domain.active_tensor(extend=1), poisson_domain.accessible_tensor(extend=1), Material.periodic(domain.boundaries))
+    vec = np.random.rand(1, resolution ** rank).astype(np.float32)
+    pool = math.BufferPool()
+    plain_time = measure(lambda: stencil(vec), 10)
+    with math.use_buffer_pool(pool):
+        pooled_time = measure(lambda: stencil(vec), 10)
+    print('%4d^%d  LaplaceStencil        plain %8.2f ms   pooled %8.2f ms' % (resolution, rank, plain_time * 1e3, pooled_time * 1e3))
+    world = World()
+    world.add(Fluid(domain, buoyancy_factor=0.1), physics=IncompressibleFlow(pressure_solver=SparseCG(matrix_free=True)))
+    world.add(Inflow(Sphere([resolution / 4] + [resolution / 2] * (rank - 1), resolution / 8), rate=0.2))
+    pool = math.BufferPool()
+    plain_time = measure(world.step, steps)
+    with math.use_buffer_pool(pool):
+        pooled_time = measure(world.step, steps)
+    print('%4d^%d  world.step()          plain %8.2f ms   pooled %8.2f ms   %s' % (resolution, rank, plain_time * 1e3, pooled_time * 1e3, pool))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('resolutions', nargs='*', type=int, default=[64, 128])
+    parser.add_argument('--rank', type=int, default=3)
+    parser.add_argument('--steps', type=int, default=3)
+    args = parser.parse_args()
+    for resolution in args.resolutions:
+        run(resolution, args.rank, args.steps)
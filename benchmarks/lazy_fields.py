@@ -0,0 +1,54 @@
+"""
+Benchmarks eager against lazy field arithmetic.
+
+Evaluates the obstacle velocity blending of `divergence_free`,
+`(1 - obs_mask) * velocity + obs_mask * (angular_velocity + obstacle.velocity)`, on a staggered grid
+once with eager operations and once inside `lazy_evaluation()`.
+
+Usage: python benchmarks/lazy_fields.py [resolution ...] [--batch 1] [--repeat 10]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from phi.flow import Domain, Noise, Sphere, mask
+from phi.physics.field import lazy_evaluation
+from phi.physics.field.angular_velocity import AngularVelocity
+
+
+def measure(function, repeat):
+    function()  # warm-up
+    t = time.time()
+    for _ in range(repeat):
+        result = function()
+    return result, (time.time() - t) / repeat
+
+
+def run(resolution, batch, repeat):
+    velocity = Domain([resolution] * 2).staggered_grid(Noise(), batch_size=batch)
+    sphere = Sphere([resolution / 2] * 2, resolution / 8)
+    obs_mask = mask(sphere, antialias=True)
+    angular_velocity = AngularVelocity(location=sphere.center, strength=0.1, falloff=None)
+
+    def eager():
+        return ((1 - obs_mask) * velocity + obs_mask * (angular_velocity + [1., 0.5])).at(velocity)
+
+    def lazy():
+        with lazy_evaluation():
+            return eager()
+
+    eager_result, eager_time = measure(eager, repeat)
+    lazy_result, lazy_time = measure(lazy, repeat)
+    difference = np.max(np.abs(eager_result.staggered_tensor() - lazy_result.staggered_tensor()))
+    print('%4d^2  batch %d  eager %8.2f ms   lazy %8.2f ms   max difference %g' % (resolution, batch, eager_time * 1e3, lazy_time * 1e3, difference))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('resolutions', nargs='*', type=int, default=[64, 256, 512])
+    parser.add_argument('--batch', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+    for resolution in args.resolutions:
+        run(resolution, args.batch, args.repeat)
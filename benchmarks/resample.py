@@ -0,0 +1,53 @@
+"""
+Benchmarks linear grid resampling with NumPy.
+
+Compares `resample_linear` of the SciPy backend with the backend-independent `general_grid_sample_nd`
+which pads the grid and gathers the 2^d corners recursively.
+Samples are placed randomly inside and slightly outside the grid, similar to semi-Lagrangian advection.
+
+Usage: python benchmarks/resample.py [resolution ...] [--rank 2] [--batch 4] [--channels 1] [--boundary constant] [--repeat 5]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from phi.backend.backend_helper import general_grid_sample_nd
+from phi.backend.scipy_backend import SciPyBackend, resample_linear
+
+
+def measure(function, repeat):
+    function()  # warm-up
+    t = time.time()
+    for _ in range(repeat):
+        result = function()
+    return result, (time.time() - t) / repeat
+
+
+def run(resolution, rank, batch, channels, boundary, repeat):
+    shape = [resolution] * rank
+    grid = np.random.randn(*([batch] + shape + [channels])).astype(np.float32)
+    coords = (np.random.rand(*([batch] + shape + [rank])) * (resolution + 2) - 1).astype(np.float32)
+    variants = [
+        ('general_grid_sample_nd', lambda: general_grid_sample_nd(grid, coords, boundary, 0, SciPyBackend())),
+        ('resample_linear', lambda: resample_linear(grid, coords, boundary, 0)),
+    ]
+    results = []
+    for name, function in variants:
+        result, duration = measure(function, repeat)
+        results.append(result)
+        print('%4d^%d  batch %d  %-23s %8.4f s' % (resolution, rank, batch, name, duration))
+    print('max difference: %g' % np.max(np.abs(results[0] - results[1])))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('resolutions', nargs='*', type=int, default=[64, 128, 256])
+    parser.add_argument('--rank', type=int, default=2)
+    parser.add_argument('--batch', type=int, default=4)
+    parser.add_argument('--channels', type=int, default=1)
+    parser.add_argument('--boundary', default='constant', choices=['constant', 'replicate', 'circular', 'symmetric', 'reflect'])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    for resolution in args.resolutions:
+        run(resolution, args.rank, args.batch, args.channels, args.boundary, args.repeat)
@@ -0,0 +1,79 @@
+"""
+Benchmarks the assembly of the sparse pressure matrix.
+
+Compares the vectorized COO assembly of `sparse_pressure_matrix` (int64 and int32 indices)
+with the previous lil_matrix implementation in terms of wall time and peak memory.
+
+Usage: python benchmarks/sparse_matrix_assembly.py [resolution ...] [--legacy-max N]
+
+The lil_matrix assembly is only run for resolutions up to --legacy-max (default 64) as it becomes impractically slow.
+"""
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+import scipy.sparse
+
+from phi import math
+from phi.math.helper import _dim_shifted
+from phi.physics.pressuresolver.sparse import sparse_pressure_matrix, wrap_or_discard
+from phi.struct.tensorop import collapsed_gather_nd
+
+
+def legacy_sparse_pressure_matrix(dimensions, extended_active_mask, extended_fluid_mask, periodic=False):
+    """ Previous implementation using fancy assignment on a lil_matrix. """
+    N = int(np.prod(dimensions))
+    d = len(dimensions)
+    A = scipy.sparse.lil_matrix((N, N), dtype=np.float32)
+    diagonal_entries = np.zeros(N, extended_active_mask.dtype)
+    gridpoints_linear = np.arange(N)
+    gridpoints = np.stack(np.unravel_index(gridpoints_linear, dimensions))
+    for dim in range(d):
+        lower_active, self_active, upper_active = _dim_shifted(extended_active_mask, dim, (-1, 0, 1), diminish_others=(1, 1))
+        lower_accessible, upper_accessible = _dim_shifted(extended_fluid_mask, dim, (-1, 1), diminish_others=(1, 1))
+        stencil_upper = upper_active * self_active
+        stencil_lower = lower_active * self_active
+        diagonal_entries += math.flatten(- lower_accessible - upper_accessible)
+        dim_direction = math.expand_dims([1 if i == dim else 0 for i in range(d)], axis=-1)
+        upper_points, upper_idx = wrap_or_discard(gridpoints + dim_direction, dim, dimensions, periodic=collapsed_gather_nd(periodic, [dim, 1]))
+        A[gridpoints_linear[upper_idx], upper_points] = stencil_upper.flatten()[upper_idx]
+        lower_points, lower_idx = wrap_or_discard(gridpoints - dim_direction, dim, dimensions, periodic=collapsed_gather_nd(periodic, [dim, 0]))
+        A[gridpoints_linear[lower_idx], lower_points] = stencil_lower.flatten()[lower_idx]
+    A[gridpoints_linear, gridpoints_linear] = math.minimum(diagonal_entries, -1)
+    return scipy.sparse.csc_matrix(A)
+
+
+def measure(function, *args, **kwargs):
+    tracemalloc.start()
+    t = time.time()
+    result = function(*args, **kwargs)
+    duration = time.time() - t
+    _current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, duration, peak
+
+
+def run(resolution, legacy_max):
+    dimensions = [resolution] * 3
+    mask = np.ones([1] + [r + 2 for r in dimensions] + [1], np.float32)
+    mask[(0,) + tuple(slice(r // 4, r // 2) for r in dimensions) + (0,)] = 0  # obstacle
+    variants = [
+        ('COO int64', lambda: sparse_pressure_matrix(dimensions, mask, mask, index_dtype=np.int64)),
+        ('COO int32', lambda: sparse_pressure_matrix(dimensions, mask, mask, index_dtype=np.int32)),
+    ]
+    if resolution <= legacy_max:
+        variants.append(('lil_matrix', lambda: legacy_sparse_pressure_matrix(dimensions, mask, mask)))
+    for name, function in variants:
+        A, duration, peak = measure(function)
+        print('%4d^3  %-11s %8.2f s  peak %8.1f MB  nnz=%d' % (resolution, name, duration, peak / 2.**20, A.nnz))
+        del A
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('resolutions', nargs='*', type=int, default=[64, 128, 256])
+    parser.add_argument('--legacy-max', type=int, default=64)
+    args = parser.parse_args()
+    for resolution in args.resolutions:
+        run(resolution, args.legacy_max)
@@ -0,0 +1,55 @@
+"""
+Benchmarks the Python overhead of structs in a small simulation.
+
+Steps a world containing several small smoke simulations, an inflow and an obstacle where the numerical work is negligible,
+and times the struct operations that dominate such steps: `copied_with`, `struct.map` and `struct.zip` on fields and states.
+
+Usage: python benchmarks/struct_overhead.py [--resolution 16] [--fluids 4] [--steps 20] [--calls 2000]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from phi import struct
+from phi.flow import World, Fluid, Domain, SLIPPERY, IncompressibleFlow, Inflow, Obstacle, Sphere, box
+
+
+def measure(function, repeat):
+    function()  # warm-up
+    t = time.time()
+    for _ in range(repeat):
+        function()
+    return (time.time() - t) / repeat
+
+
+def run(resolution, fluids, steps, calls):
+    world = World()
+    for i in range(fluids):
+        world.add(Fluid(Domain([resolution] * 2, SLIPPERY), buoyancy_factor=0.1, name='fluid%d' % i), physics=IncompressibleFlow())
+    world.add(Inflow(Sphere([resolution / 4, resolution / 2], resolution / 8), rate=0.2))
+    world.add(Obstacle(box[resolution * 5 // 8:resolution * 3 // 4, resolution * 3 // 8:resolution * 5 // 8]))
+    step_time = measure(world.step, steps)
+    print('world.step() with %d fluids at %d^2     %8.2f ms' % (fluids, resolution, step_time * 1e3))
+    fluid = world.state['fluid0']
+    density = fluid.density
+    data = np.ones_like(density.data)
+    timings = [
+        ('CenteredGrid.copied_with(data)', lambda: density.copied_with(data=data)),
+        ('CenteredGrid.with_data(data)', lambda: density.with_data(data)),
+        ('CenteredGrid * 2', lambda: density * 2),
+        ('struct.map(Fluid)', lambda: struct.map(lambda x: x, fluid)),
+        ('struct.zip([Fluid, Fluid])', lambda: struct.zip([fluid, fluid])),
+    ]
+    for name, function in timings:
+        print('%-40s %8.2f us' % (name, measure(function, calls) * 1e6))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--resolution', type=int, default=16)
+    parser.add_argument('--fluids', type=int, default=4)
+    parser.add_argument('--steps', type=int, default=20)
+    parser.add_argument('--calls', type=int, default=2000)
+    args = parser.parse_args()
+    run(args.resolution, args.fluids, args.steps, args.calls)
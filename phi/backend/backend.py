@@ -76,7 +76,7 @@ class Backend:
         Interpolates a regular grid at the specified coordinates.
         :param inputs: grid data
         :param sample_coords: tensor of floating grid indices. The last dimension must match the dimensions of inputs. The first grid point of dimension i lies at position 0, the last at data.shape[i]-1.
-        :param interpolation: only 'linear' is currently supported
+        :param interpolation: 'linear'. The SciPy backend also supports 'quadratic' and 'cubic' splines, which require the same boundary on all faces and SciPy >= 1.6 for 'constant' and 'circular' boundaries.
         :param boundary: values to use for coordinates outside the grid, can be specified for each face, options are 'constant', 'replicate', 'circular', 'symmetric', 'reflect'
         :param constant_values: Value used for constant boundaries, can be specified for each face
         """
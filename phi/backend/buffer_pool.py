@@ -0,0 +1,159 @@
+"""
+Reuse of NumPy output buffers between operations and simulation steps.
+
+While a `BufferPool` is active, NumPy kernels that support it write their results into arrays owned by the pool instead of allocating new ones.
+Ownership is explicit: every buffer is requested under a key chosen by its owner, e.g. the name of the state being advected or a solver.
+Scratch buffers hold temporaries that are consumed before the owner requests them again.
+Ping-pong buffers hold the fields of a state; each request returns the buffer that does not hold the previous result.
+"""
+from contextlib import contextmanager
+
+import numpy as np
+
+
+class BufferPool(object):
+
+    def __init__(self, min_size=2 ** 14):
+        """
+        Workspace of NumPy arrays that are reused between operations and simulation steps.
+
+        Simulation steps allocate the same set of large arrays every time, e.g. advected fields and solver vectors.
+        With a pool, these arrays are allocated during the first step and written into in subsequent ones.
+        This avoids the page faults and memory traffic that come with allocating fresh arrays.
+
+        Buffers are only handed out under explicit keys, see `scratch()` and `ping_pong()`.
+        Results written into ping-pong buffers stay valid for one more step of their owner.
+        States that are kept for longer, e.g. for a history of frames, must be copied while a pool is in use.
+
+        :param min_size: minimum number of elements of pooled arrays. Smaller arrays are allocated normally.
+        """
+        self.min_size = min_size
+        self._scratch = {}  # (key, shape, dtype) -> array
+        self._ping_pong = {}  # (key, shape, dtype) -> [array, array, index of the buffer handed out last]
+        self.allocations = 0  # number of arrays allocated by the pool
+        self.reuses = 0  # number of requests served with an existing array
+
+    def scratch(self, key, shape, dtype):
+        """
+        Returns the scratch buffer of the given owner key. Every request with the same key, shape and dtype returns the same array.
+        The owner must not use a previous result after requesting the buffer again.
+        :param key: hashable key identifying the owner and purpose of the buffer
+        :param shape: shape of the array
+        :param dtype: NumPy data type
+        :return: uninitialized NumPy array
+        """
+        shape, dtype = _normalize(shape, dtype)
+        if int(np.prod(shape)) < self.min_size:
+            return np.empty(shape, dtype)
+        entry_key = key, shape, dtype
+        if entry_key in self._scratch:
+            self.reuses += 1
+        else:
+            self._scratch[entry_key] = np.empty(shape, dtype)
+            self.allocations += 1
+        return self._scratch[entry_key]
+
+    def ping_pong(self, key, shape, dtype, avoid=None):
+        """
+        Returns one of two buffers of the given owner key, alternating between calls.
+        The result of the previous request therefore stays valid until the key is requested twice more.
+        :param key: hashable key identifying the owner, e.g. the name of a state and field
+        :param shape: shape of the array
+        :param dtype: NumPy data type
+        :param avoid: (optional) array that is read while writing the result, e.g. the previous state. A buffer sharing memory with it is never returned.
+        :return: uninitialized NumPy array
+        """
+        shape, dtype = _normalize(shape, dtype)
+        if int(np.prod(shape)) < self.min_size:
+            return np.empty(shape, dtype)
+        entry_key = key, shape, dtype
+        if entry_key not in self._ping_pong:
+            self._ping_pong[entry_key] = [np.empty(shape, dtype), None, 0]
+            self.allocations += 1
+            return self._ping_pong[entry_key][0]
+        entry = self._ping_pong[entry_key]
+        index = 1 - entry[2]
+        if avoid is not None and entry[index] is not None and np.shares_memory(entry[index], avoid):
+            index = entry[2]
+        if entry[index] is None:
+            entry[index] = np.empty(shape, dtype)
+            self.allocations += 1
+        else:
+            self.reuses += 1
+        entry[2] = index
+        return entry[index]
+
+    @property
+    def nbytes(self):
+        """ Total size of all arrays held by the pool in bytes. """
+        return sum(buffer.nbytes for buffer in self._buffers())
+
+    def _buffers(self):
+        return list(self._scratch.values()) + [buffer for entry in self._ping_pong.values() for buffer in entry[:2] if buffer is not None]
+
+    def clear(self):
+        """ Releases all arrays held by the pool. Arrays that are still in use elsewhere stay valid. """
+        self._scratch = {}
+        self._ping_pong = {}
+
+    def __repr__(self):
+        return 'BufferPool(%d arrays, %.1f MB)' % (len(self._buffers()), self.nbytes / 1e6)
+
+
+def _normalize(shape, dtype):
+    return tuple(int(s) for s in shape), np.dtype(dtype)
+
+
+_BUFFER_POOLS = [None]  # global pool followed by the pools of active use_buffer_pool() contexts
+
+
+def buffer_pool():
+    """
+Returns the active buffer pool.
+    :return: BufferPool or None if buffers are not reused
+    """
+    return _BUFFER_POOLS[-1]
+
+
+def set_buffer_pool(pool):
+    """
+Sets the global buffer pool, used outside of `use_buffer_pool()` contexts.
+    :param pool: BufferPool or None to disable buffer reuse
+    """
+    assert pool is None or isinstance(pool, BufferPool), 'Not a BufferPool: %s' % type(pool)
+    _BUFFER_POOLS[0] = pool
+
+
+@contextmanager
+def use_buffer_pool(pool=None):
+    """
+Within this context, NumPy kernels write their results into buffers of the given pool.
+The pool should be kept across simulation steps so that its buffers can be reused.
+
+Usage: `pool = math.BufferPool()`, then `with math.use_buffer_pool(pool): world.step()`
+    :param pool: BufferPool or None to disable buffer reuse within the context
+    """
+    assert pool is None or isinstance(pool, BufferPool), 'Not a BufferPool: %s' % type(pool)
+    _BUFFER_POOLS.append(pool)
+    try:
+        yield pool
+    finally:
+        _BUFFER_POOLS.pop(-1)
+
+
+def scratch(key, shape, dtype):
+    """
+Returns the scratch buffer of the given owner key from the active BufferPool or a new array if no pool is active, see `BufferPool.scratch()`.
+    :return: uninitialized NumPy array
+    """
+    pool = _BUFFER_POOLS[-1]
+    return np.empty(shape, dtype) if pool is None else pool.scratch(key, shape, dtype)
+
+
+def ping_pong(key, shape, dtype, avoid=None):
+    """
+Returns a ping-pong buffer of the given owner key from the active BufferPool or a new array if no pool is active, see `BufferPool.ping_pong()`.
+    :return: uninitialized NumPy array
+    """
+    pool = _BUFFER_POOLS[-1]
+    return np.empty(shape, dtype) if pool is None else pool.ping_pong(key, shape, dtype, avoid)
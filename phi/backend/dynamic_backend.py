@@ -1,5 +1,15 @@
+from contextlib import contextmanager
+
+import numpy as np
+import six
+
 from .backend import Backend
 
+if six.PY2:
+    from collections import Iterable
+else:
+    from collections.abc import Iterable
+
 
 class NoBackendFound(Exception):
 
@@ -12,16 +22,51 @@ class DynamicBackend(Backend):
     def __init__(self):
         Backend.__init__(self, 'Dynamic')
         self.backends = []
+        self._backends_by_type = {}  # tuple of argument types -> Backend
+        self._pinned = []  # stack of backends set by use_backend()
 
     def choose_backend(self, values):
         # type: (list) -> Backend
-        if not isinstance(values, tuple) and not isinstance(values, list):
+        """
+    Finds the first registered backend that is applicable to all values.
+
+    The chosen backend is cached by the types of the values if these determine the choice, i.e. for NumPy arrays, numbers, None and structs but not lists or other iterables whose elements are inspected.
+    Within `use_backend()`, the pinned backend is returned without inspecting the values.
+        :param values: value or list/tuple of values
+        :return: Backend
+        """
+        if self._pinned:
+            return self._pinned[-1]
+        if isinstance(values, (tuple, list)):
+            key = tuple(map(type, values))
+        else:
+            key = type(values)  # single values such as one ndarray are looked up without building a tuple
             values = [values]
+        backend = self._backends_by_type.get(key)
+        if backend is not None:
+            return backend
         for backend in self.backends:
             if backend.is_applicable(values):
+                if all(_type_determines_backend(type(value)) for value in values):
+                    self._backends_by_type[key] = backend
                 return backend
         raise NoBackendFound('No backend found for values %s; registered backends are %s' % (values, self.backends))
 
+    @contextmanager
+    def use_backend(self, backend):
+        """
+    Pins `backend` for the enclosed scope so that all math functions dispatch to it without inspecting their arguments.
+    All arguments must be supported by `backend`, e.g. struct arguments are no longer broadcast.
+
+    Usage: `with math.use_backend(backend): ...`
+        :param backend: Backend to use
+        """
+        self._pinned.append(backend)
+        try:
+            yield backend
+        finally:
+            self._pinned.pop(-1)
+
     def add_backend(self, backend, priority=None):
         for existing in self.backends:
             if existing.name == backend.name:
@@ -30,6 +75,7 @@ class DynamicBackend(Backend):
             self.backends.append(backend)
         else:
             self.backends.insert(0, backend)
+        self._backends_by_type.clear()
         return True
 
     def is_applicable(self, values):
@@ -247,3 +293,11 @@ class DynamicBackend(Backend):
 
 
 DYNAMIC_BACKEND = DynamicBackend()
+
+
+def _type_determines_backend(value_type):
+    """
+Whether the applicability of backends to values of the given type is independent of the values themselves.
+This is not the case for iterables such as lists whose elements are inspected individually, except for NumPy arrays.
+    """
+    return issubclass(value_type, np.ndarray) or not issubclass(value_type, Iterable)
@@ -0,0 +1,77 @@
+"""
+Floating point precision policy.
+
+The active `Precision` determines the floating point types used when creating grids, converting values with `to_float`,
+storing solver results and accumulating inside iterative solvers.
+The default policy uses float32 everywhere.
+"""
+from contextlib import contextmanager
+
+import numpy as np
+
+
+class Precision(object):
+
+    def __init__(self, float_type=np.float32, accumulation_type=None, field_types=None):
+        """
+        Floating point types used for computations, solvers and field storage.
+
+        Example for large simulations where the marker density can be stored with half precision:
+        `Precision(np.float32, accumulation_type=np.float64, field_types={'density': np.float16})`
+
+        :param float_type: type of computation results, e.g. of `to_float`, convolutions and pressure solves.
+            This is also the storage type of all fields not listed in field_types.
+        :param accumulation_type: type in which iterative solvers such as `conjugate_gradient` iterate.
+            If None, solvers iterate in the type of their input.
+        :param field_types: dict mapping field names, e.g. 'density' or 'velocity', to their storage types
+        """
+        self.float_type = np.dtype(float_type).type
+        self.accumulation_type = None if accumulation_type is None else np.dtype(accumulation_type).type
+        self.field_types = {name: np.dtype(dtype).type for name, dtype in (field_types or {}).items()}
+
+    def field_type(self, name):
+        """
+        Storage type for the field with the given name.
+        :param name: field name or None
+        :return: NumPy type
+        """
+        return self.field_types.get(name, self.float_type)
+
+    def __repr__(self):
+        return 'Precision(%s, accumulation_type=%s, field_types=%s)' % (self.float_type.__name__, None if self.accumulation_type is None else self.accumulation_type.__name__, {name: dtype.__name__ for name, dtype in self.field_types.items()})
+
+
+_PRECISION = [Precision()]  # global policy followed by the policies of active use_precision() contexts
+
+
+def precision():
+    """
+Returns the active precision policy.
+    :return: Precision
+    """
+    return _PRECISION[-1]
+
+
+def set_precision(policy):
+    """
+Sets the global precision policy, used outside of `use_precision()` contexts.
+    :param policy: Precision
+    """
+    assert isinstance(policy, Precision), 'Not a Precision: %s' % type(policy)
+    _PRECISION[0] = policy
+
+
+@contextmanager
+def use_precision(policy):
+    """
+Within this context, `precision()` returns the given policy.
+
+Usage: `with math.use_precision(Precision(np.float64)): ...`
+    :param policy: Precision
+    """
+    assert isinstance(policy, Precision), 'Not a Precision: %s' % type(policy)
+    _PRECISION.append(policy)
+    try:
+        yield policy
+    finally:
+        _PRECISION.pop(-1)
@@ -1,13 +1,20 @@
 import collections
+import itertools
 import numbers
 import warnings
 
 import numpy as np
+import scipy.ndimage
 import scipy.signal
 import scipy.sparse
+import six
+from packaging import version
 
 from phi.backend.backend_helper import split_multi_mode_pad, PadSettings, general_grid_sample_nd
+from phi.backend.tensorop import collapse, collapsed_gather_nd
 from .backend import Backend
+from .buffer_pool import scratch
+from .precision import precision
 
 
 class SciPyBackend(Backend):
@@ -130,8 +137,14 @@ class SciPyBackend(Backend):
         return result
 
     def resample(self, inputs, sample_coords, interpolation='linear', boundary='constant', constant_values=0):
-        assert interpolation == 'linear'
-        return general_grid_sample_nd(inputs, sample_coords, boundary, constant_values, self)
+        constant = 0 if constant_values is None else collapse(constant_values)
+        if not isinstance(constant, numbers.Number):  # different constants per face
+            assert interpolation == 'linear'
+            return general_grid_sample_nd(inputs, sample_coords, boundary, constant_values, self)
+        if interpolation == 'linear':
+            return resample_linear(inputs, sample_coords, boundary, constant)
+        assert interpolation in SPLINE_ORDERS, 'Unsupported interpolation: %s' % interpolation
+        return resample_spline(inputs, sample_coords, SPLINE_ORDERS[interpolation], boundary, constant)
 
     def zeros_like(self, tensor):
         return np.zeros_like(tensor)
@@ -198,21 +211,14 @@ class SciPyBackend(Backend):
         return np.exp(x)
 
     def conv(self, tensor, kernel, padding="SAME"):
-        """ apply convolution of kernel on tensor """
+        """ apply convolution of kernel on tensor, processing all examples and channels at once, see `correlate_valid` """
         assert tensor.shape[-1] == kernel.shape[-2]
         # kernel = kernel[[slice(None)] + [slice(None, None, -1)] + [slice(None)]*(len(kernel.shape)-3) + [slice(None)]]
         if padding.lower() == "same":
-            result = np.zeros(tensor.shape[:-1] + (kernel.shape[-1],), np.float32)
-        elif padding.lower() == "valid":
-            valid = [tensor.shape[i + 1] - (kernel.shape[i] + 1) // 2 for i in range(tensor_spatial_rank(tensor))]
-            result = np.zeros([tensor.shape[0]] + valid + [kernel.shape[-1]], np.float32)
-        else:
+            tensor = np.pad(tensor, [[0, 0]] + [[k // 2, k - 1 - k // 2] for k in kernel.shape[:-2]] + [[0, 0]], mode='constant')
+        elif padding.lower() != "valid":
             raise ValueError("Illegal padding: %s" % padding)
-        for batch in range(tensor.shape[0]):
-            for o in range(kernel.shape[-1]):
-                for i in range(tensor.shape[-1]):
-                    result[batch, ..., o] += scipy.signal.correlate(tensor[batch, ..., i], kernel[..., i, o], padding.lower())
-        return result
+        return correlate_valid(tensor, kernel).astype(precision().float_type)
 
     def expand_dims(self, a, axis=0, number=1):
         for _i in range(number):
@@ -226,7 +232,7 @@ class SciPyBackend(Backend):
         return np.shape(tensor)
 
     def to_float(self, x, float64=False):
-        return np.array(x).astype(np.float64 if float64 else np.float32)
+        return np.array(x).astype(np.float64 if float64 else precision().float_type)
 
     def to_int(self, x, int64=False):
         return np.array(x).astype(np.int64 if int64 else np.int32)
@@ -279,19 +285,7 @@ class SciPyBackend(Backend):
         return np.all(boolean_tensor, axis=axis, keepdims=keepdims)
 
     def scatter(self, points, indices, values, shape, duplicates_handling='undefined'):
-        indices = self.unstack(indices, axis=-1)
-        array = np.zeros(shape, np.float32)
-        if duplicates_handling == 'add':
-            np.add.at(array, tuple(indices), values)
-        elif duplicates_handling == 'mean':
-            count = np.zeros(shape, np.int32)
-            np.add.at(array, tuple(indices), values)
-            np.add.at(count, tuple(indices), 1)
-            count = np.maximum(1, count)
-            return array / count
-        else:  # last, any, undefined
-            array[indices] = values
-        return array
+        return ParticleBins(indices, shape).scatter(values, duplicates_handling)
 
     def fft(self, x):
         rank = len(x.shape) - 2
@@ -334,6 +328,308 @@ class SciPyBackend(Backend):
         return scipy.sparse.csc_matrix((values, self.unstack(indices, -1)), shape=shape)
 
 
+FFT_CONV_MIN_TAPS = 64  # kernels with at least this many non-zero spatial entries are applied in frequency space
+
+
+def correlate_valid(tensor, kernel):
+    """
+Cross-correlates a batch of multi-channel tensors with a kernel without padding, like a 'VALID' convolution in TensorFlow.
+
+Rank-1 (separable) kernels are applied as a sequence of one-dimensional passes.
+Small stencils are applied directly by summing shifted views of the tensor, skipping zero weights.
+Large kernels are applied in frequency space using scipy.signal.fftconvolve.
+    :param tensor: NumPy array of shape (batch, spatial dimensions..., in channels)
+    :param kernel: NumPy array of shape (kernel dimensions..., in channels, out channels)
+    :return: NumPy array of shape (batch, spatial dimensions - kernel dimensions + 1..., out channels)
+    """
+    factors = _separable_factors(kernel)
+    if factors is not None:
+        channel_matrix, axis_weights = factors
+        result = np.dot(tensor, channel_matrix)
+        for axis, weights in enumerate(axis_weights):
+            result = _correlate_axis(result, weights, axis)
+        return result
+    if np.count_nonzero(np.any(kernel != 0, axis=(-2, -1))) < FFT_CONV_MIN_TAPS:
+        return _correlate_direct(tensor, kernel)
+    return _correlate_fft(tensor, kernel)
+
+
+def _correlate_direct(tensor, kernel):
+    """ Sums the shifted views of tensor weighted by the non-zero entries of kernel. """
+    kernel_shape = kernel.shape[:-2]
+    valid_shape = [n - k + 1 for n, k in zip(tensor.shape[1:-1], kernel_shape)]
+    result = np.zeros([tensor.shape[0]] + valid_shape + [kernel.shape[-1]], np.result_type(tensor, kernel))
+    for offset in zip(*np.nonzero(np.any(kernel != 0, axis=(-2, -1)))):
+        window = tensor[(slice(None),) + tuple(slice(o, o + n) for o, n in zip(offset, valid_shape))]
+        if kernel.shape[-2:] == (1, 1):
+            result += window * kernel[offset]
+        else:
+            result += np.dot(window, kernel[offset])
+    return result
+
+
+def _correlate_axis(tensor, weights, axis):
+    """ Correlates all channels of tensor with the one-dimensional weights along the given spatial axis. """
+    valid = tensor.shape[axis + 1] - len(weights) + 1
+    result = 0
+    for offset in np.nonzero(weights)[0]:
+        result = result + tensor[(slice(None),) * (axis + 1) + (slice(offset, offset + valid),)] * weights[offset]
+    return result
+
+
+def _correlate_fft(tensor, kernel):
+    """ Correlates every pair of input and output channels in frequency space, processing the whole batch at once. """
+    spatial_axes = tuple(range(1, len(tensor.shape) - 1))
+    flipped = kernel[tuple(slice(None, None, -1) for _ in spatial_axes)]  # correlation is convolution with the flipped kernel
+    outputs = []
+    for o in range(kernel.shape[-1]):
+        output = 0
+        for i in range(kernel.shape[-2]):
+            if np.any(flipped[..., i, o] != 0):
+                output = output + scipy.signal.fftconvolve(tensor[..., i], flipped[np.newaxis, ..., i, o], mode='valid', axes=spatial_axes)
+        if np.isscalar(output):
+            output = np.zeros([tensor.shape[0]] + [n - k + 1 for n, k in zip(tensor.shape[1:-1], kernel.shape[:-2])], tensor.dtype)
+        outputs.append(output)
+    return np.stack(outputs, -1)
+
+
+def _separable_factors(kernel):
+    """
+Tests whether kernel is the outer product of one weight vector per spatial axis and a channel matrix.
+    :return: (channel matrix of shape (in channels, out channels), list of weight vectors) or None if the kernel is not separable or gains nothing from separation
+    """
+    kernel_shape = kernel.shape[:-2]
+    if sum(k > 1 for k in kernel_shape) < 2:
+        return None
+    flat = np.reshape(kernel, [-1, kernel.shape[-2] * kernel.shape[-1]]).astype(np.float64)
+    channel_vector = flat[np.argmax(np.sum(flat ** 2, -1))]
+    if not np.any(channel_vector):
+        return None
+    spatial = np.reshape(np.dot(flat, channel_vector) / np.dot(channel_vector, channel_vector), kernel_shape)
+    center = np.unravel_index(np.argmax(np.abs(spatial)), kernel_shape)
+    axis_weights = [spatial[center[:axis] + (slice(None),) + center[axis + 1:]] for axis in range(len(kernel_shape))]
+    reconstructed = axis_weights[0]
+    for weights in axis_weights[1:]:
+        reconstructed = np.multiply.outer(reconstructed, weights)
+    reconstructed = np.multiply.outer(reconstructed / spatial[center] ** (len(kernel_shape) - 1), channel_vector)
+    if not np.allclose(reconstructed, np.reshape(flat, kernel_shape + (flat.shape[-1],)), rtol=1e-5, atol=1e-7 * np.max(np.abs(flat))):
+        return None
+    axis_weights[0] = axis_weights[0] / spatial[center] ** (len(kernel_shape) - 1)
+    return np.reshape(channel_vector, kernel.shape[-2:]).astype(kernel.dtype), [w.astype(kernel.dtype) for w in axis_weights]
+
+
+def resample_linear(grid, coords, boundary='constant', constant_value=0):
+    """
+Samples grid at the given coordinates using multi-linear interpolation, like `general_grid_sample_nd` but without padding the grid.
+See `linear_sample_plan` and `apply_linear_sample_plan`.
+    :param grid: NumPy array of shape (batch, spatial dims..., channels)
+    :param coords: NumPy array of shape (batch, ..., spatial_rank), batch may be 1 for grid or coords
+    :param boundary: 'zero'/'constant', 'replicate', 'circular', 'symmetric', 'reflect' or a list with one entry per dimension of grid, each a mode or a (lower, upper) pair
+    :param constant_value: scalar value used for constant boundaries
+    :return: NumPy array of shape (batch, ..., channels)
+    """
+    return apply_linear_sample_plan(grid, linear_sample_plan(grid.shape[1:-1], grid.shape[0], coords, boundary), constant_value)
+
+
+LinearSamplePlan = collections.namedtuple('LinearSamplePlan', ['resolution', 'batch_size', 'indices', 'weights', 'outside_weight'])
+
+
+def linear_sample_plan(resolution, batch_size, coords, boundary='constant'):
+    """
+Computes the flat indices and weights of the 2^d corners used to linearly interpolate grids at the given coordinates.
+The plan can be applied to any number of grids with the same resolution, batch size and boundary modes using `apply_linear_sample_plan`.
+
+Boundary modes are applied to the integer indices so that the grid never needs to be padded.
+Corners outside the grid with constant boundaries get weight zero, their total weight is stored as `outside_weight`.
+    :param resolution: spatial grid dimensions
+    :param batch_size: batch size of the grids, flat indices of batched grids include the batch offset
+    :param coords: NumPy array of shape (batch, ..., spatial_rank) in grid index coordinates
+    :param boundary: boundary modes, see `resample_linear`
+    :return: LinearSamplePlan
+    """
+    resolution = tuple(int(r) for r in resolution)
+    rank = len(resolution)
+    assert coords.shape[-1] == rank
+    index_dtype = np.int32 if batch_size * np.prod(resolution) < 2 ** 31 else np.int64
+    # --- Per-axis indices, validity and weights ---
+    axes = []  # for each axis: ((lo index, lo weight), (hi index, hi weight))
+    all_valid = True
+    stride = 1
+    for axis in reversed(range(rank)):
+        axis_coords = coords[..., axis]
+        floor = np.floor(axis_coords)
+        hi_weight = axis_coords - floor
+        lo = floor.astype(index_dtype)
+        corners = []
+        for index, weight in ((lo, 1 - hi_weight), (lo + 1, hi_weight)):
+            index, valid = _boundary_index(index, resolution[axis], boundary_face(boundary, axis - rank - 1, 0), boundary_face(boundary, axis - rank - 1, 1))
+            if valid is not True:
+                weight = np.where(valid, weight, 0)
+                all_valid = False
+            corners.append((index * stride if stride != 1 else index, weight))
+        axes.insert(0, corners)
+        stride *= resolution[axis]
+    # --- Combine corners ---
+    batch_offsets = 0 if batch_size == 1 else np.reshape(np.arange(batch_size, dtype=index_dtype) * stride, (-1,) + (1,) * (coords.ndim - 2))
+    indices, weights = [], []
+    for corner in itertools.product((0, 1), repeat=rank):
+        index, weight = batch_offsets, 1
+        for axis, hi in enumerate(corner):
+            axis_index, axis_weight = axes[axis][hi]
+            index = index + axis_index
+            weight = weight * axis_weight
+        indices.append(index)
+        weights.append(weight[..., np.newaxis])
+    outside_weight = None if all_valid else 1 - np.prod([lo[1] + hi[1] for lo, hi in axes], axis=0)[..., np.newaxis]
+    return LinearSamplePlan(resolution, batch_size, indices, weights, outside_weight)
+
+
+def apply_linear_sample_plan(grid, plan, constant_value=0, out=None):
+    """
+Linearly interpolates grid using the indices and weights of a LinearSamplePlan, gathering each corner with a single vectorized `take`.
+    :param grid: NumPy array of shape (batch, spatial dims..., channels) matching the resolution and batch size of the plan
+    :param plan: LinearSamplePlan
+    :param constant_value: scalar value used for constant boundaries
+    :param out: (optional) NumPy array to write the result into, must not share memory with grid.
+        Temporaries are then taken from the scratch buffers of the active BufferPool.
+    :return: NumPy array of shape (batch, ..., channels)
+    """
+    assert tuple(grid.shape[1:-1]) == plan.resolution and grid.shape[0] == plan.batch_size, 'Grid of shape %s does not match sample plan' % (grid.shape,)
+    grid_flat = np.reshape(grid, (-1, grid.shape[-1]))
+    if out is not None:
+        return _apply_linear_sample_plan_into(grid_flat, plan, constant_value, out)
+    result = 0
+    for index, weight in zip(plan.indices, plan.weights):
+        result = result + np.take(grid_flat, index, axis=0) * weight
+    if plan.outside_weight is not None and constant_value != 0:
+        result = result + plan.outside_weight * constant_value
+    return result
+
+
+def _apply_linear_sample_plan_into(grid_flat, plan, constant_value, result):
+    """ Like `apply_linear_sample_plan` but accumulates the corners in `result`, using scratch buffers for the temporaries. """
+    shape = np.shape(plan.indices[0]) + grid_flat.shape[-1:]
+    assert result.shape == shape, 'out has shape %s but the result has shape %s' % (result.shape, shape)
+    assert not np.shares_memory(result, grid_flat), 'out must not share memory with the sampled grid'
+    corner = scratch(('apply_linear_sample_plan', 'corner'), shape, grid_flat.dtype)
+    weighted = scratch(('apply_linear_sample_plan', 'weighted'), shape, result.dtype)
+    for i, (index, weight) in enumerate(zip(plan.indices, plan.weights)):
+        np.take(grid_flat, index, axis=0, out=corner, mode='clip')  # indices are valid, 'clip' avoids buffering the output
+        np.multiply(corner, weight, out=result if i == 0 else weighted)
+        if i > 0:
+            result += weighted
+    if plan.outside_weight is not None and constant_value != 0:
+        np.multiply(plan.outside_weight, constant_value, out=weighted)
+        result += weighted
+    return result
+
+
+def boundary_face(boundary, dim, upper):
+    """ Returns the boundary mode of one face from a mode string or a list with one entry (mode or (lower, upper)) per dimension of the grid. """
+    return collapsed_gather_nd(boundary, [dim, upper])
+
+
+def _boundary_index(index, size, lower_boundary, upper_boundary):
+    """
+Maps integer indices outside [0, size) back into the grid according to the boundary modes of the lower and upper face.
+    :return: mapped index, valid where valid is False for indices hitting a constant boundary or True if no such index exists
+    """
+    valid = True
+    if lower_boundary == upper_boundary:
+        mapped = _map_index(index, size, lower_boundary)
+    else:
+        mapped = np.where(index < 0, _map_index(index, size, lower_boundary), _map_index(index, size, upper_boundary))
+    for constant_boundary, outside in ((lower_boundary, index < 0), (upper_boundary, index >= size)):
+        if constant_boundary in ('zero', 'constant') and np.any(outside):
+            valid = valid & ~outside
+    return mapped, valid
+
+
+def _map_index(index, size, boundary):
+    if boundary in ('zero', 'constant', 'replicate'):
+        return np.clip(index, 0, size - 1)
+    elif boundary == 'circular':
+        return np.mod(index, size)
+    elif boundary == 'symmetric':
+        index = np.mod(index, 2 * size)
+        return ((2 * size - 1) - np.abs((2 * size - 1) - 2 * index)) // 2
+    elif boundary == 'reflect':
+        if size == 1:
+            return np.zeros_like(index)
+        index = np.mod(index, 2 * size - 2)
+        return (size - 1) - np.abs((size - 1) - index)
+    else:
+        raise ValueError('Invalid boundary: %s' % (boundary,))
+
+
+SPLINE_ORDERS = {'quadratic': 2, 'cubic': 3}
+_NDIMAGE_MODES = {'zero': 'grid-constant', 'constant': 'grid-constant', 'replicate': 'nearest', 'circular': 'grid-wrap', 'symmetric': 'reflect', 'reflect': 'mirror'}
+
+
+def resample_spline(grid, coords, order, boundary='constant', constant_value=0):
+    """
+Samples grid at the given coordinates using spline interpolation of the given order with scipy.ndimage.map_coordinates.
+All faces must have the same boundary mode.
+    :param grid: NumPy array of shape (batch, spatial dims..., channels)
+    :param coords: NumPy array of shape (batch, ..., spatial_rank), batch may be 1 for grid or coords
+    :param boundary: 'zero'/'constant', 'replicate', 'circular', 'symmetric' or 'reflect'. 'zero', 'constant' and 'circular' require SciPy >= 1.6.
+    :return: NumPy array of shape (batch, ..., channels)
+    """
+    mode = collapse(boundary)
+    if not isinstance(mode, six.string_types):
+        rank = coords.shape[-1]
+        mode = collapse([boundary_face(boundary, dim, upper) for dim in range(-rank - 1, -1) for upper in (0, 1)])
+    assert isinstance(mode, six.string_types), 'Spline interpolation requires the same boundary mode on all faces but got %s' % (boundary,)
+    if _NDIMAGE_MODES[mode].startswith('grid-') and version.parse(scipy.__version__) < version.parse('1.6.0'):
+        raise NotImplementedError("Spline interpolation with boundary '%s' only supported on SciPy >= 1.6" % mode)
+    batch_size = max(grid.shape[0], coords.shape[0])
+    result = []
+    for batch in range(batch_size):
+        batch_grid = grid[min(batch, grid.shape[0] - 1)]
+        batch_coords = np.moveaxis(coords[min(batch, coords.shape[0] - 1)], -1, 0)
+        result.append(np.stack([scipy.ndimage.map_coordinates(batch_grid[..., channel], batch_coords, order=order, mode=_NDIMAGE_MODES[mode], cval=constant_value)
+                                for channel in range(grid.shape[-1])], -1))
+    return np.stack(result)
+
+
+class ParticleBins(object):
+
+    def __init__(self, indices, shape):
+        """
+    Bins scattered values (e.g. particles) by the linear index of the grid cell they belong to.
+
+    Values are summed per cell with `np.bincount` which is much faster than `np.add.at`.
+    The bins only depend on the indices and can be reused to scatter any number of values with all duplicate handling modes.
+        :param indices: integer NumPy array of shape (batch, ..., len(shape) - 1) holding the batch and spatial indices of each value
+        :param shape: shape of the target grid, (batch, spatial dims..., channels)
+        """
+        self.shape = tuple(int(dim) for dim in shape)
+        indices = np.asarray(indices)
+        assert indices.shape[-1] == len(self.shape) - 1
+        self.value_shape = indices.shape[:-1]
+        self.cell_count = int(np.prod(self.shape[:-1]))
+        self.linear_index = np.ravel_multi_index(tuple(np.reshape(indices, (-1, indices.shape[-1])).T), self.shape[:-1])
+        self.counts = np.bincount(self.linear_index, minlength=self.cell_count)
+
+    def scatter(self, values, duplicates_handling='add'):
+        """
+    Scatters values into a grid of the binned shape.
+        :param values: scalar or NumPy array broadcastable to (batch, ..., channels) where the leading dimensions match the binned indices
+        :param duplicates_handling: 'add' sums values in the same cell, 'mean' averages them, all other modes ('any', 'last', 'undefined') assign one of the values
+        :return: NumPy array of the binned shape and type `precision().float_type`, zero in empty cells
+        """
+        channels = self.shape[-1]
+        values = np.reshape(np.broadcast_to(values, self.value_shape + (channels,)), (-1, channels))
+        if duplicates_handling in ('add', 'mean'):
+            array = np.stack([np.bincount(self.linear_index, weights=values[:, c], minlength=self.cell_count) for c in range(channels)], -1)
+            if duplicates_handling == 'mean':
+                array /= np.maximum(1, self.counts)[:, np.newaxis]
+        else:
+            array = np.zeros((self.cell_count, channels), precision().float_type)
+            array[self.linear_index] = values
+        return np.reshape(array, self.shape).astype(precision().float_type, copy=False)
+
+
 def clamp(coordinates, shape):
     assert coordinates.shape[-1] == len(shape)
     for i in range(len(shape)):
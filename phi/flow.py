@@ -13,9 +13,11 @@ from .physics.material import *
 from .physics.domain import *
 from .physics.field.effect import *
 from .physics.pressuresolver.solver_api import PoissonDomain, PoissonSolver
-from .physics.pressuresolver.sparse import SparseCG, SparseSciPy
+from .physics.pressuresolver.sparse import SparseCG, SparseSciPy, SparseLU
 from .physics.pressuresolver.geom import GeometricCG
 from .physics.pressuresolver.fourier import FourierSolver
+from .physics.pressuresolver.multigrid import MultigridSolver
+from .physics.pressuresolver.preconditioner import JacobiPreconditioner, IncompleteCholesky, MultigridPreconditioner
 
 from .data.fluidformat import *
 from .data.dataset import *
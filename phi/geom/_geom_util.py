@@ -18,3 +18,16 @@ def _rank(rank):
     else:
         rank = math.spatial_rank(rank)
     return None if rank == 0 else rank
+
+
+def same_geometry(geometry1, geometry2):
+    """
+Tests whether two geometries are identical or equal by value.
+Unlike `==`, geometries with differently shaped values, e.g. different batch sizes, are considered different instead of raising an error.
+    """
+    if geometry1 is geometry2:
+        return True
+    try:
+        return geometry1 == geometry2
+    except ValueError:
+        return False
@@ -24,7 +24,11 @@ class Union(Geometry):
         return self.geometries[0].rank
 
     def lies_inside(self, location):
-        return math.any([geometry.lies_inside(location) for geometry in self.geometries], axis=0)
+        # Accumulate into one tensor instead of stacking the results of all geometries
+        inside = self.geometries[0].lies_inside(location)
+        for geometry in self.geometries[1:]:
+            inside = inside | geometry.lies_inside(location)
+        return inside
 
     def approximate_signed_distance(self, location):
         return math.min([geometry.approximate_signed_distance(location) for geometry in self.geometries], axis=0)
@@ -1,5 +1,7 @@
 from phi.backend.dynamic_backend import DYNAMIC_BACKEND
 from phi.backend.scipy_backend import SciPyBackend
+from phi.backend.precision import Precision, precision, set_precision, use_precision
+from phi.backend.buffer_pool import BufferPool, buffer_pool, set_buffer_pool, use_buffer_pool
 from phi.struct.struct_backend import StructBroadcastBackend
 from .math_util import types, is_static_shape, zeros, ones, randn, randfreq
 from .helper import is_scalar, axes
@@ -23,6 +25,7 @@ DYNAMIC_BACKEND.add_backend(StructBroadcastBackend(DYNAMIC_BACKEND))
 
 # Enable importing methods directly from math
 choose_backend = DYNAMIC_BACKEND.choose_backend
+use_backend = DYNAMIC_BACKEND.use_backend
 
 abs = DYNAMIC_BACKEND.abs
 add = DYNAMIC_BACKEND.add
@@ -1,19 +1,31 @@
 # coding=utf-8
+import numpy as np
+
 from phi.backend.dynamic_backend import DYNAMIC_BACKEND as math
+from phi.backend.precision import precision
 
 
-def conjugate_gradient(k, apply_A, initial_x=None, accuracy=1e-5, max_iterations=1024, back_prop=False):
+def conjugate_gradient(k, apply_A, initial_x=None, accuracy=1e-5, max_iterations=1024, back_prop=False, compact=False):
     """
     Solve the linear system of equations Ax=k using the conjugate gradient (CG) algorithm.
     The implementation is based on https://nvlpubs.nist.gov/nistpubs/jres/049/jresv49n6p409_A1b.pdf
 
+    Convergence is tracked per example. Once |Ax-k| ≤ accuracy for all elements of an example, its solution is frozen while the remaining examples continue to iterate.
+
     :param k: Right-hand-side vector
     :param apply_A: function that takes x and calculates Ax
     :param initial_x: initial guess for the value of x
     :param accuracy: the algorithm terminates once |Ax-k| ≤ accuracy for every element. If None, the algorithm runs until max_iterations is reached.
     :param max_iterations: maximum number of CG iterations to perform
-    :return: Pair containing the result for x and the number of iterations performed
+    :param compact: if True, apply_A is only evaluated for examples that have not converged yet.
+        This requires apply_A to act on each example independently of the batch size and is only used with NumPy arrays.
+    :return: Pair containing the result for x and the number of iterations performed for each example, shaped (batch size,).
+        This used to be a scalar holding the number of loop iterations which equals `math.max(iterations)`.
+
+    If the active `Precision` defines an accumulation_type, all vectors are converted to that type for the iteration and x is converted back to the type of k.
     """
+    result_type = math.dtype(k)
+    k, initial_x = _to_accumulation_type(k, initial_x)
     k = math.copy(k, only_mutable=True)
     # Get momentum = k - Ax
     if initial_x is None:
@@ -22,12 +34,13 @@ def conjugate_gradient(k, apply_A, initial_x=None, accuracy=1e-5, max_iterations
     else:
         x = math.copy(initial_x, only_mutable=True)
         momentum = k - apply_A(x)
+    non_batch_dims = tuple(range(1, len(k.shape)))
     # Further Variables
     residual = momentum  # residual is previous momentum
     laplace_momentum = apply_A(momentum)  # = A*momentum
-    loop_index = 0  # initial
+    iterations = _zero_iterations(k, non_batch_dims)  # initial, per example
     # Pack Variables for loop
-    variables = [x, momentum, laplace_momentum, residual, loop_index]
+    variables = [x, momentum, laplace_momentum, residual, iterations]
     # Ensure to run until desired accuracy is achieved
     if accuracy is not None:
         def loop_condition(_1, _2, _3, residual, _i):
@@ -37,9 +50,7 @@ def conjugate_gradient(k, apply_A, initial_x=None, accuracy=1e-5, max_iterations
         def loop_condition(*_args):
             return True
 
-    non_batch_dims = tuple(range(1, len(k.shape)))
-
-    def loop_body(pressure, momentum, A_times_momentum, residual, loop_index):
+    def loop_body(pressure, momentum, A_times_momentum, residual, iterations):
         """
         iteratively solve for:
         x : pressure
@@ -47,18 +58,122 @@ def conjugate_gradient(k, apply_A, initial_x=None, accuracy=1e-5, max_iterations
         laplace_momentum : A_times_momentum
         residual : residual
         """
-        tmp = math.sum(momentum * A_times_momentum, axis=non_batch_dims, keepdims=True)  # t = sum(mAm)
-        a = math.divide_no_nan(math.sum(momentum * residual, axis=non_batch_dims, keepdims=True), tmp)  # a = sum(mr)/sum(mAm)
-        pressure += a * momentum  # p += am
-        residual -= a * A_times_momentum  # r -= aAm
-        momentum = residual - math.divide_no_nan(math.sum(residual * A_times_momentum, axis=non_batch_dims, keepdims=True) * momentum, tmp)  # m = r-sum(rAm)*m/t = r-sum(rAm)*m/sum(mAm)
-        A_times_momentum = apply_A(momentum)  # Am = A*m
-        return [pressure, momentum, A_times_momentum, residual, loop_index + 1]
-
-    x, momentum, laplace_momentum, residual, loop_index = math.while_loop(loop_condition, loop_body, variables,
+        active = _active_examples(residual, accuracy, non_batch_dims)  # 0 for converged examples which are not updated anymore
+        tmp = math.sum(math.mul(momentum, A_times_momentum), axis=non_batch_dims, keepdims=True)  # t = sum(mAm)
+        a = active * math.divide_no_nan(math.sum(math.mul(momentum, residual), axis=non_batch_dims, keepdims=True), tmp)  # a = sum(mr)/sum(mAm)
+        pressure += math.mul(a, momentum)  # p += am
+        residual -= math.mul(a, A_times_momentum)  # r -= aAm
+        momentum = math.sub(residual, math.mul(active * math.divide_no_nan(math.sum(math.mul(residual, A_times_momentum), axis=non_batch_dims, keepdims=True), tmp), momentum))  # m = r-sum(rAm)*m/t = r-sum(rAm)*m/sum(mAm)
+        A_times_momentum = _apply_active(apply_A, momentum, active, compact)  # Am = A*m
+        return [pressure, momentum, A_times_momentum, residual, iterations + _count(active, non_batch_dims)]
+
+    x, momentum, laplace_momentum, residual, iterations = math.while_loop(loop_condition, loop_body, variables,
                                                                           parallel_iterations=2, back_prop=back_prop,
                                                                           swap_memory=False,
                                                                           name="pressure_solve_loop",
                                                                           maximum_iterations=max_iterations)
 
-    return x, loop_index
+    return _to_result_type(x, result_type), iterations
+
+
+def preconditioned_conjugate_gradient(k, apply_A, apply_M_inv, initial_x=None, accuracy=1e-5, max_iterations=1024, back_prop=False, compact=False):
+    """
+    Solve the linear system of equations Ax=k using the preconditioned conjugate gradient (PCG) algorithm.
+
+    The preconditioner M approximates A and must be symmetric and definite with the same sign as A.
+    A good preconditioner drastically reduces the number of iterations, at the cost of one application of M^-1 per iteration.
+    Like `conjugate_gradient`, converged examples are frozen while the remaining examples continue to iterate.
+
+    :param k: Right-hand-side vector
+    :param apply_A: function that takes x and calculates Ax
+    :param apply_M_inv: function that takes a residual r and approximates the solution z of Mz=r
+    :param initial_x: initial guess for the value of x
+    :param accuracy: the algorithm terminates once |Ax-k| ≤ accuracy for every element. If None, the algorithm runs until max_iterations is reached.
+    :param max_iterations: maximum number of CG iterations to perform
+    :param compact: if True, apply_A and apply_M_inv are only evaluated for examples that have not converged yet, see `conjugate_gradient`.
+    :return: Pair containing the result for x and the number of iterations performed for each example, shaped (batch size,).
+        Use `math.max(iterations)` to obtain the total number of loop iterations that was returned before convergence was tracked per example.
+
+    Like `conjugate_gradient`, the iteration uses the accumulation_type of the active `Precision` if defined.
+    """
+    result_type = math.dtype(k)
+    k, initial_x = _to_accumulation_type(k, initial_x)
+    k = math.copy(k, only_mutable=True)
+    if initial_x is None:
+        x = math.zeros_like(k)
+        residual = k
+    else:
+        x = math.copy(initial_x, only_mutable=True)
+        residual = k - apply_A(x)
+    non_batch_dims = tuple(range(1, len(k.shape)))
+    direction = apply_M_inv(residual)
+    residual_dot_z = math.sum(residual * direction, axis=non_batch_dims, keepdims=True)
+    iterations = _zero_iterations(k, non_batch_dims)
+    variables = [x, direction, residual, residual_dot_z, iterations]
+    if accuracy is not None:
+        def loop_condition(_1, _2, residual, _3, _i):
+            """continue if the maximum deviation from zero is bigger than desired accuracy"""
+            return math.max(math.abs(residual)) >= accuracy
+    else:
+        def loop_condition(*_args):
+            return True
+
+    def loop_body(x, direction, residual, residual_dot_z, iterations):
+        active = _active_examples(residual, accuracy, non_batch_dims)  # 0 for converged examples which are not updated anymore
+        A_times_direction = _apply_active(apply_A, direction, active, compact)
+        a = active * math.divide_no_nan(residual_dot_z, math.sum(math.mul(direction, A_times_direction), axis=non_batch_dims, keepdims=True))  # a = rz / pAp
+        x += math.mul(a, direction)
+        residual -= math.mul(a, A_times_direction)
+        z = _apply_active(apply_M_inv, residual, active, compact)  # z = 0 for converged examples, their direction is kept below
+        new_residual_dot_z = math.sum(math.mul(residual, z), axis=non_batch_dims, keepdims=True)
+        new_direction = math.add(z, math.mul(math.divide_no_nan(new_residual_dot_z, residual_dot_z), direction))  # p = z + (r'z' / rz) p
+        direction = math.add(math.mul(active, new_direction), math.mul(1 - active, direction))
+        return [x, direction, residual, new_residual_dot_z, iterations + _count(active, non_batch_dims)]
+
+    x, direction, residual, residual_dot_z, iterations = math.while_loop(loop_condition, loop_body, variables,
+                                                                         parallel_iterations=2, back_prop=back_prop,
+                                                                         swap_memory=False,
+                                                                         name="pressure_solve_loop",
+                                                                         maximum_iterations=max_iterations)
+    return _to_result_type(x, result_type), iterations
+
+
+def _to_accumulation_type(k, initial_x):
+    """ Converts floating point k and initial_x to the accumulation_type of the active `Precision`, if defined. """
+    accumulation_type = precision().accumulation_type
+    if accumulation_type is None or not np.issubdtype(math.dtype(k), np.floating) or math.dtype(k) == accumulation_type:
+        return k, initial_x
+    return math.cast(k, accumulation_type), None if initial_x is None else math.cast(initial_x, accumulation_type)
+
+
+def _to_result_type(x, result_type):
+    return x if math.dtype(x) == result_type else math.cast(x, result_type)
+
+
+def _active_examples(residual, accuracy, non_batch_dims):
+    """ Returns a mask shaped like the per-example sums of residual that is 1 for examples that have not converged yet and 0 otherwise. """
+    max_residual = math.max(math.abs(residual), axis=non_batch_dims, keepdims=True)
+    if accuracy is None:
+        return math.ones_like(max_residual)
+    return math.cast(max_residual >= accuracy, math.dtype(residual))
+
+
+def _zero_iterations(k, non_batch_dims):
+    return math.to_int(math.sum(math.zeros_like(k), axis=non_batch_dims))
+
+
+def _count(active, non_batch_dims):
+    return math.to_int(math.sum(active, axis=non_batch_dims))
+
+
+def _apply_active(apply_A, x, active, compact):
+    """ Evaluates apply_A(x), skipping converged examples if `compact` is True and x is a NumPy array. The result for converged examples is zero in that case. """
+    if not compact or not isinstance(x, np.ndarray):
+        return apply_A(x)
+    indices = np.flatnonzero(np.reshape(active, [-1]))
+    if len(indices) == x.shape[0]:
+        return apply_A(x)
+    result = np.zeros_like(x)
+    if len(indices) > 0:
+        result[indices] = apply_A(x[indices])
+    return result
@@ -8,6 +8,7 @@ from phi.struct.functions import mappable
 
 from phi.backend.dynamic_backend import DYNAMIC_BACKEND as math
 from phi.backend.dynamic_backend import NoBackendFound
+from phi.backend.precision import precision
 from .nd import fftfreq
 
 
@@ -35,18 +36,18 @@ def _none_to_one(shape):
 
 
 @mappable(leaf_condition=is_static_shape)
-def zeros(shape, dtype=np.float32):
-    return np.zeros(_none_to_one(shape), dtype=dtype)
+def zeros(shape, dtype=None):
+    return np.zeros(_none_to_one(shape), dtype=precision().float_type if dtype is None else dtype)
 
 
 @mappable(leaf_condition=is_static_shape)
-def ones(shape, dtype=np.float32):
-    return np.ones(_none_to_one(shape), dtype)
+def ones(shape, dtype=None):
+    return np.ones(_none_to_one(shape), precision().float_type if dtype is None else dtype)
 
 
 @mappable(leaf_condition=is_static_shape)
-def randn(shape, dtype=np.float32):
-    return np.random.randn(*_none_to_one(shape)).astype(dtype)
+def randn(shape, dtype=None):
+    return np.random.randn(*_none_to_one(shape)).astype(precision().float_type if dtype is None else dtype)
 
 
 def randfreq(shape, dtype=np.float32, power=8):
@@ -90,7 +90,7 @@ Runs a blur kernel over the given tensor.
         raise ValueError("Unknown kernel: %s" % kernel)
     weights /= math.sum(weights)
     weights = math.reshape(weights, list(weights.shape) + [1, 1])
-    return math.conv(field, weights)
+    return _conv_components(field, weights, padding='SAME')
 
 
 def l1_loss(tensor, batch_norm=True, reduce_batches=True):
@@ -234,10 +234,7 @@ def laplace(tensor, padding='replicate', axes=None, use_fft_for_periodic=False):
 def _conv_laplace_2d(tensor):
     kernel = np.array([[0., 1., 0.], [1., -4., 1.], [0., 1., 0.]], dtype=np.float32)
     kernel = kernel.reshape((3, 3, 1, 1))
-    if tensor.shape[-1] == 1:
-        return math.conv(tensor, kernel, padding='VALID')
-    else:
-        return math.concat([math.conv(tensor[..., i:i + 1], kernel, padding='VALID') for i in range(tensor.shape[-1])], -1)
+    return _conv_components(tensor, kernel, padding='VALID')
 
 
 def _conv_laplace_3d(tensor):
@@ -261,11 +258,20 @@ def _conv_laplace_3d(tensor):
                        [[0., 0., 0.], [0., 1., 0.], [0., 0., 0.]]],
                       dtype=np.float32)
     kernel = kernel.reshape((3, 3, 3, 1, 1))
-    if tensor.shape[-1] == 1:
-        return math.conv(tensor, kernel, padding='VALID')
-    else:
-        return math.concat([math.conv(tensor[..., i:i + 1], kernel, padding='VALID')
-                            for i in range(tensor.shape[-1])], -1)
+    return _conv_components(tensor, kernel, padding='VALID')
+
+
+def _conv_components(tensor, kernel, padding):
+    """
+    Convolves each component of tensor with the single-channel kernel.
+    The components are moved into the batch dimension so that all of them are processed by a single convolution.
+    """
+    components = tensor.shape[-1]
+    if components == 1:
+        return math.conv(tensor, kernel, padding=padding)
+    batch_size = math.shape(tensor)[0]
+    result = math.conv(math.concat([tensor[..., i:i + 1] for i in range(components)], 0), kernel, padding=padding)
+    return math.concat([result[i * batch_size:(i + 1) * batch_size] for i in range(components)], -1)
 
 
 def _sliced_laplace_nd(tensor, axes=None):
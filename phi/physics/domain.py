@@ -125,9 +125,11 @@ class Domain(struct.Struct):
         from phi.physics.field import StaggeredGrid
         return StaggeredGrid(grids, age=age, box=self.box, name=name, batch_size=batch_size, extrapolation=extrapolation, flags=(), content_type=struct.Struct.shape)
 
-    def centered_grid(self, data, components=1, dtype=np.float32, name=None, batch_size=None, extrapolation=None):
+    def centered_grid(self, data, components=1, dtype=None, name=None, batch_size=None, extrapolation=None):
         warnings.warn("Domain.centered_shape and Domain.centered_grid are deprecated. Use CenteredGrid.sample() instead.", DeprecationWarning)
         from phi.physics.field import CenteredGrid
+        if dtype is None:
+            dtype = math.precision().field_type(name)
         if callable(data):  # data is an initializer
             shape = self.centered_shape(components, batch_size=batch_size, name=name, extrapolation=extrapolation, age=())
             try:
@@ -147,9 +149,11 @@ class Domain(struct.Struct):
             grid = grid.copied_with(extrapolation=extrapolation)
         return grid
 
-    def _centered_grid(self, data, components=1, dtype=np.float32, name=None, batch_size=None, extrapolation=None):
+    def _centered_grid(self, data, components=1, dtype=None, name=None, batch_size=None, extrapolation=None):
         warnings.warn("Domain.centered_shape and Domain.centered_grid are deprecated. Use CenteredGrid.sample() instead.", DeprecationWarning)
         from phi.physics.field import CenteredGrid
+        if dtype is None:
+            dtype = math.precision().field_type(name)
         if extrapolation is None:
             extrapolation = Material.extrapolation_mode(self.boundaries)
         if callable(data):  # data is an initializer
@@ -175,7 +179,19 @@ class Domain(struct.Struct):
             grid = CenteredGrid(data, box=self.box, extrapolation=extrapolation, name=name)
         return grid
 
-    def staggered_grid(self, data, dtype=np.float32, name=None, batch_size=None, extrapolation=None):
+    def staggered_grid(self, data, dtype=None, name=None, batch_size=None, extrapolation=None):
+        """
+        Samples data to a staggered grid matching this domain.
+
+        :param data: initializer function, Field, number or staggered tensor
+        :param dtype: floating point type of the components. If None, uses the type of the active `math.Precision` for the given name.
+        :param name: field name
+        :param batch_size: batch size
+        :param extrapolation: extrapolation mode. If None, it is determined from the boundaries.
+        :return: StaggeredGrid
+        """
+        if dtype is None:
+            dtype = math.precision().field_type(name)
         if extrapolation is None:
             extrapolation = Material.extrapolation_mode(self.boundaries)
         if callable(data):  # data is an initializer
@@ -202,12 +218,19 @@ class Domain(struct.Struct):
         else:
             from .field import StaggeredGrid
             grid = StaggeredGrid(data, self.box, name, batch_size=None, extrapolation=extrapolation)
-        return grid
+        return _cast_staggered(grid, dtype)
 
     def surface_material(self, axis=0, upper_boundary=False):
         return collapsed_gather_nd(self.boundaries, axis, upper_boundary)
 
 
+def _cast_staggered(grid, dtype):
+    """ Converts the floating point components of a StaggeredGrid to dtype. """
+    if all(not np.issubdtype(math.dtype(c.data), np.floating) or math.dtype(c.data) == dtype for c in grid.data):
+        return grid
+    return grid.with_data([math.cast(c.data, dtype) if np.issubdtype(math.dtype(c.data), np.floating) else c.data for c in grid.data])
+
+
 def _friction_mask(masks_and_multipliers):
     for mask, multiplier in masks_and_multipliers:
         return mask
@@ -238,10 +261,10 @@ class DomainState(State):
     def rank(self):
         return self.domain.rank
 
-    def centered_grid(self, name, value, components=1, dtype=np.float32):
+    def centered_grid(self, name, value, components=1, dtype=None):
         extrapolation = Material.extrapolation_mode(self.domain.boundaries)
         return self.domain.centered_grid(value, dtype=dtype, name=name, components=components, batch_size=self._batch_size, extrapolation=extrapolation)
 
-    def staggered_grid(self, name, value, dtype=np.float32):
+    def staggered_grid(self, name, value, dtype=None):
         extrapolation = Material.vector_extrapolation_mode(self.domain.boundaries)
         return self.domain.staggered_grid(value, dtype=dtype, name=name, batch_size=self._batch_size, extrapolation=extrapolation)
@@ -6,6 +6,7 @@ from .staggered_grid import StaggeredGrid, unstack_staggered_tensor
 from .sampled import SampledField
 from .analytic import AnalyticField, SymbolicFieldBackend
 from .mask import GeometryMask, mask, union_mask
+from .expression import FieldExpression, lazy_evaluation
 from .noise import Noise
 from . import advect
 from . import manta
@@ -1,8 +1,17 @@
+from numbers import Number
+
+import numpy as np
+
+from phi import math
+from phi.backend.buffer_pool import buffer_pool
+from phi.backend.scipy_backend import linear_sample_plan, apply_linear_sample_plan, resample_linear
 from phi.physics.field import SampledField, ConstantField, StaggeredGrid, CenteredGrid
+from phi.struct.tensorop import collapse
 from .field import StaggeredSamplePoints, Field
+from .grid import _pad_mode
 
 
-def advect(field, velocity, dt):
+def advect(field, velocity, dt, scheme='semi_lagrangian'):
     """
 Advect `field` along the `velocity` vectors using the default advection method.
     :param field: any built-in Field
@@ -10,6 +19,7 @@ Advect `field` along the `velocity` vectors using the default advection method.
     :param velocity: any Field
     :type velocity: Field
     :param dt: time increment
+    :param scheme: advection scheme for grids, one of SCHEMES
     :return: Advected field of same type as `field`
     """
     if isinstance(field, SampledField):
@@ -17,27 +27,181 @@ Advect `field` along the `velocity` vectors using the default advection method.
     if isinstance(field, ConstantField):
         return field
     if isinstance(field, (CenteredGrid, StaggeredGrid)):
-        return semi_lagrangian(field, velocity, dt=dt)
+        return AdvectionPlan(velocity, dt, scheme=scheme).advect(field)
     raise NotImplementedError(field)
 
 
+SCHEMES = ('semi_lagrangian', 'maccormack', 'bfecc')
+
+
 def semi_lagrangian(field, velocity_field, dt):
     """
 Semi-Lagrangian advection with simple backward lookup.
+To advect multiple fields with the same velocity, use an AdvectionPlan.
         :param field: Field to be advected
         :param velocity_field: Field, need not be compatible with field.
         :param dt: time increment
         :return: Field compatible with input field
     """
-    try:
+    return AdvectionPlan(velocity_field, dt).advect(field)
+
+
+def maccormack(field, velocity_field, dt, clamp=True):
+    """
+MacCormack advection.
+A semi-Lagrangian step is followed by a backward semi-Lagrangian step and half of the resulting error is added to the forward result.
+This is second-order accurate in smooth regions and much less diffusive than `semi_lagrangian()`.
+        :param field: CenteredGrid or StaggeredGrid to be advected
+        :param velocity_field: Field, need not be compatible with field.
+        :param dt: time increment
+        :param clamp: if True, limits the result to the range of the values that the forward step interpolates between, preventing new extrema
+        :return: Field compatible with input field
+    """
+    return AdvectionPlan(velocity_field, dt, scheme='maccormack', clamp=clamp).advect(field)
+
+
+def bfecc(field, velocity_field, dt, clamp=True):
+    """
+Back and Forth Error Compensation and Correction (BFECC) advection.
+The error of a forward and backward semi-Lagrangian step is used to correct the field before a final semi-Lagrangian step.
+This requires three semi-Lagrangian steps; the first and the last one share their sample positions and weights.
+        :param field: CenteredGrid or StaggeredGrid to be advected
+        :param velocity_field: Field, need not be compatible with field.
+        :param dt: time increment
+        :param clamp: if True, limits the result to the range of the values that the forward step interpolates between, preventing new extrema
+        :return: Field compatible with input field
+    """
+    return AdvectionPlan(velocity_field, dt, scheme='bfecc', clamp=clamp).advect(field)
+
+
+class AdvectionPlan(object):
+
+    def __init__(self, velocity_field, dt, scheme='semi_lagrangian', clamp=True):
+        """
+    Advection of any number of fields with a fixed velocity field and time increment.
+
+    The back-traced sample positions are computed once per grid layout (box and resolution) and reused for all fields sharing that layout,
+    e.g. density and other markers or the components of staggered grids with coinciding sample points.
+    For NumPy grids, the interpolation indices and weights are also computed once per layout and boundary condition.
+
+        :param velocity_field: Field, need not be compatible with the advected fields.
+        :param dt: time increment
+        :param scheme: one of SCHEMES, see `semi_lagrangian()`, `maccormack()` and `bfecc()`. Higher-order schemes fall back to semi-Lagrangian advection for fields other than grids.
+        :param clamp: whether higher-order schemes limit the result to the values interpolated by the forward step
+        """
+        assert scheme in SCHEMES, 'Unknown advection scheme: %s' % scheme
+        self.velocity_field = velocity_field
+        self.dt = dt
+        self.scheme = scheme
+        self.clamp = clamp
+        self._positions = []  # list of (box, resolution, back-traced sample positions)
+        self._sample_plans = []  # list of (box, resolution, boundary, batch size, LinearSamplePlan)
+        self._backward = None
+
+    @property
+    def backward(self):
+        """ Semi-Lagrangian AdvectionPlan with reversed time increment, used by the higher-order schemes. """
+        if self._backward is None:
+            self._backward = AdvectionPlan(self.velocity_field, -self.dt)
+        return self._backward
+
+    def advect(self, field, buffer_key=None):
+        """
+    Advects field using the scheme of this plan.
+        :param field: Field to be advected
+        :param buffer_key: (optional) hashable key identifying the advected state field, e.g. (state name, field name).
+            While a BufferPool is active, semi-Lagrangian results of NumPy grids are written into the ping-pong buffers of this key.
+            The result then stays valid for one more step of the same field.
+        :return: Field compatible with input field
+        """
+        if isinstance(field, StaggeredGrid):
+            return field.with_data([self.advect(component, None if buffer_key is None else buffer_key + (i,)) for i, component in enumerate(field.unstack())])
+        if self.scheme == 'semi_lagrangian' or not isinstance(field, CenteredGrid):
+            return self.semi_lagrangian(field, buffer_key)
+        forward = self.semi_lagrangian(field)
+        error = field.data - self.backward.semi_lagrangian(forward).data
+        if self.scheme == 'maccormack':
+            data = forward.data + 0.5 * error
+        else:
+            data = self.semi_lagrangian(field.with_data(field.data + 0.5 * error)).data
+        if self.clamp:
+            minimum, maximum = self._interpolated_extrema(field)
+            data = math.maximum(math.minimum(data, maximum), minimum)
+        return field.with_data(_storage_type(data, field))
+
+    def semi_lagrangian(self, field, buffer_key=None):
+        """
+    Semi-Lagrangian advection with simple backward lookup, see `semi_lagrangian()`.
+        :param field: Field to be advected
+        :param buffer_key: (optional) key of the ping-pong buffers to write NumPy results into, see `advect()`
+        :return: Field compatible with input field
+        """
+        try:
+            positions = self.positions(field)
+        except StaggeredSamplePoints:
+            advected = [self.semi_lagrangian(component, None if buffer_key is None else buffer_key + (i,)) for i, component in enumerate(field.unstack())]
+            return field.with_data(advected)
+        constant = collapse(field.extrapolation_value) if isinstance(field, CenteredGrid) else None
+        if isinstance(constant, Number) and field.interpolation == 'linear' and math.choose_backend([field.data, positions.data]).matches_name('SciPy'):
+            plan = self._sample_plan(field, positions)
+            out = None
+            if buffer_key is not None and buffer_pool() is not None:
+                out = buffer_pool().ping_pong(buffer_key, np.shape(plan.indices[0]) + np.shape(field.data)[-1:], np.result_type(field.data, *plan.weights), avoid=field.data)
+            data = apply_linear_sample_plan(field.data, plan, constant, out=out)
+        else:
+            data = field.sample_at(positions.data)
+        return field.with_data(_storage_type(data, field))
+
+    def positions(self, field):
+        """
+    Traces the sample points of field back along the velocity.
+        :param field: Field with sample points
+        :return: Field holding the back-traced positions
+        """
+        if not isinstance(field, CenteredGrid):
+            x0 = field.points
+            return x0 - self.velocity_field.at(x0) * self.dt
+        for box, resolution, positions in self._positions:
+            if box == field.box and resolution == tuple(field.resolution):
+                return positions
         x0 = field.points
-        v = velocity_field.at(x0)
-        x = x0 - v * dt
-        data = field.sample_at(x.data)
-        return field.with_data(data)
-    except StaggeredSamplePoints:
-        advected = [semi_lagrangian(component, velocity_field, dt) for component in field.unstack()]
-        return field.with_data(advected)
+        positions = x0 - self.velocity_field.at(x0) * self.dt
+        self._positions.append((field.box, tuple(field.resolution), positions))
+        return positions
+
+    def _interpolated_extrema(self, grid):
+        """
+    Computes the minimum and maximum of the 2^d grid values that are interpolated between at the back-traced positions.
+        :return: minimum, maximum as tensors
+        """
+        minimum = maximum = grid.padded(1).data
+        for axis in range(1, grid.rank + 1):
+            lower = tuple(slice(None, -1) if i == axis else slice(None) for i in range(grid.rank + 2))
+            upper = tuple(slice(1, None) if i == axis else slice(None) for i in range(grid.rank + 2))
+            minimum = math.minimum(minimum[lower], minimum[upper])
+            maximum = math.maximum(maximum[lower], maximum[upper])
+        # entry i+1 of minimum / maximum holds the extremum of the cells i and i+1 along each axis
+        cell_index = math.floor(grid.index_coordinates(self.positions(grid).data)) + 1
+        return math.resample(minimum, cell_index, boundary='replicate'), math.resample(maximum, cell_index, boundary='replicate')
+
+    def _sample_plan(self, grid, positions):
+        boundary, batch_size = _pad_mode(grid.extrapolation), grid.data.shape[0]
+        for box, resolution, plan_boundary, plan_batch_size, plan in self._sample_plans:
+            if box == grid.box and resolution == tuple(grid.resolution) and plan_boundary == boundary and plan_batch_size == batch_size:
+                return plan
+        plan = linear_sample_plan(grid.resolution, batch_size, grid.index_coordinates(positions.data), boundary)
+        self._sample_plans.append((grid.box, tuple(grid.resolution), boundary, batch_size, plan))
+        return plan
+
+
+def _storage_type(data, grid):
+    """ Converts advected data back to the floating point type of grid, so that e.g. float16 grids are interpolated with higher precision but keep their storage type. """
+    if not isinstance(grid, CenteredGrid):
+        return data
+    dtype = math.dtype(grid.data)
+    if not np.issubdtype(dtype, np.floating) or math.dtype(data) == dtype:
+        return data
+    return math.cast(data, dtype)
 
 
 def runge_kutta_4(field, velocity, dt):
@@ -50,15 +214,86 @@ Lagrangian advection of particles.
     :param dt: time increment
     :return: SampledField with same data as `field` but advected points
     """
+    return advect_points(field, velocity, dt, integrator='rk4')
+
+
+INTEGRATORS = ('euler', 'rk2', 'rk4')
+
+
+def advect_points(field, velocity, dt, integrator='rk4', chunk_size=None):
+    """
+Lagrangian advection of particles using an explicit integrator.
+The velocity is sampled with a `VelocitySampler` which prepares all components once and reuses them for all integrator stages.
+    :param field: SampledField with any number of components
+    :type field: SampledField
+    :param velocity: Vector field
+    :type velocity: Field
+    :param dt: time increment
+    :param integrator: 'euler', 'rk2' (midpoint) or 'rk4'
+    :param chunk_size: if set, particles are integrated in chunks of at most this many points to bound the memory of intermediate tensors. Defaults to `field.chunk_size`.
+    :return: SampledField with same data as `field` but advected points
+    """
     assert isinstance(field, SampledField)
     assert isinstance(velocity, Field)
-    points = field.points
+    assert integrator in INTEGRATORS, 'Unknown integrator: %s' % integrator
+    sampler = VelocitySampler(velocity)
+    points = field.sample_points
+    chunks = list(field.chunks(chunk_size))
+    if len(chunks) == 1:
+        new_points = _integrate(sampler, points, dt, integrator)
+    else:
+        new_points = math.concat([_integrate(sampler, points[:, chunk], dt, integrator) for chunk in chunks], axis=1)
+    return SampledField(new_points, field.data, mode=field.mode, point_count=field._point_count, chunk_size=field.chunk_size, name=field.name)
+
+
+def _integrate(sampler, points, dt, integrator):
+    vel_k1 = sampler(points)
+    if integrator == 'euler':
+        return points + dt * vel_k1
+    if integrator == 'rk2':
+        return points + dt * sampler(points + 0.5 * dt * vel_k1)
     # --- Sample velocity at intermediate points ---
-    vel_k1 = velocity.at(points)
-    vel_k2 = velocity.at(points + 0.5 * dt * vel_k1)
-    vel_k3 = velocity.at(points + 0.5 * dt * vel_k2)
-    vel_k4 = velocity.at(points + dt * vel_k3)
+    vel_k2 = sampler(points + 0.5 * dt * vel_k1)
+    vel_k3 = sampler(points + 0.5 * dt * vel_k2)
+    vel_k4 = sampler(points + dt * vel_k3)
     # --- Combine points with RK4 scheme ---
-    new_points = points + dt * (1/6.) * (vel_k1 + 2 * (vel_k2 + vel_k3) + vel_k4)
-    result = SampledField(new_points.data, field.data, mode=field.mode, point_count=field._point_count, name=field.name)
-    return result
+    return points + dt * (1/6.) * (vel_k1 + 2 * (vel_k2 + vel_k3) + vel_k4)
+
+
+class VelocitySampler(object):
+
+    def __init__(self, velocity):
+        """
+    Samples a velocity field at arbitrary points, equivalent to `velocity.sample_at(points)`.
+
+    For grids, the components of staggered grids, the affine transformations from world to index coordinates and the boundary conditions are prepared once.
+    Linearly interpolated NumPy components are sampled directly with `resample_linear` which applies the boundary conditions to the indices instead of padding the grid.
+        :param velocity: Field, typically a CenteredGrid or StaggeredGrid
+        """
+        self.velocity = velocity
+        if isinstance(velocity, StaggeredGrid):
+            self.components = [_component_sampler(component) for component in velocity.unstack()]
+        elif isinstance(velocity, CenteredGrid):
+            self.components = [_component_sampler(velocity)]
+        else:
+            self.components = None
+
+    def __call__(self, points):
+        """
+        :param points: tensor of shape (batch, ..., rank) holding world-space positions
+        :return: velocity tensor of shape (batch, ..., components)
+        """
+        if self.components is None:
+            return self.velocity.sample_at(points)
+        values = [sample(points) for sample in self.components]
+        return values[0] if len(values) == 1 else math.concat(values, axis=-1)
+
+
+def _component_sampler(grid):
+    scale = math.to_float(grid.resolution) / grid.box.size
+    offset = -grid.box.lower * scale - 0.5
+    constant = collapse(grid.extrapolation_value)
+    if isinstance(constant, Number) and grid.interpolation == 'linear' and math.choose_backend(grid.data).matches_name('SciPy'):
+        boundary = _pad_mode(grid.extrapolation)
+        return lambda points: resample_linear(grid.data, points * scale + offset, boundary, constant)
+    return grid.sample_at
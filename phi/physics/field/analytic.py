@@ -2,6 +2,7 @@ from phi.backend.backend import Backend
 from phi import math, struct
 from phi.geom.geometry import assert_same_rank
 
+from .expression import lazy_operation, FieldExpression
 from .field import Field
 
 
@@ -46,31 +47,33 @@ class AnalyticField(Field):
         return True
 
     def __mul__(self, other):
-        return _SymbolicOpField(lambda x1, x2: x1 * x2, [self, other])
+        return self.__dataop__(other, True, lambda x1, x2: x1 * x2)
 
     __rmul__ = __mul__
 
     def __div__(self, other):
-        return _SymbolicOpField(lambda x1, x2: x1 / x2, [self, other])
+        return self.__dataop__(other, True, lambda x1, x2: x1 / x2)
 
     def __truediv__(self, other):
-        return _SymbolicOpField(lambda x1, x2: x1 / x2, [self, other])
+        return self.__dataop__(other, True, lambda x1, x2: x1 / x2)
 
     def __sub__(self, other):
-        return _SymbolicOpField(lambda x1, x2: x1 - x2, [self, other])
+        return self.__dataop__(other, False, lambda x1, x2: x1 - x2)
 
     def __rsub__(self, other):
-        return _SymbolicOpField(lambda x1, x2: x2 - x1, [self, other])
+        return self.__dataop__(other, False, lambda x1, x2: x2 - x1)
 
     def __add__(self, other):
-        return _SymbolicOpField(lambda x1, x2: x1 + x2, [self, other])
+        return self.__dataop__(other, False, lambda x1, x2: x1 + x2)
 
     __radd__ = __add__
 
     def __pow__(self, power, modulo=None):
-        return _SymbolicOpField(lambda x1, x2: x1 ** x2, [self, power])
+        return self.__dataop__(power, False, lambda x1, x2: x1 ** x2)
 
     def __dataop__(self, other, linear_if_scalar, data_operator):
+        if lazy_operation(other):
+            return FieldExpression(data_operator, [self, other])
         return _SymbolicOpField(data_operator, [self, other])
 
     @struct.constant(default=None)
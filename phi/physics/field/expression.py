@@ -0,0 +1,207 @@
+"""
+Lazy arithmetic on fields.
+
+Within `lazy_evaluation()`, arithmetic operations on fields build a `FieldExpression` instead of computing the result.
+The expression is evaluated when it is resampled with `at()` or its `data` is requested.
+Each field in the expression is then resampled only once and all operations are evaluated in a single pass.
+"""
+from contextlib import contextmanager
+
+import numpy as np
+
+from phi import math
+
+
+_LAZY_EVALUATION = []  # stack of active lazy_evaluation() contexts
+
+CHUNK_SIZE = 2 ** 15
+"""Approximate number of values per operand that are processed at once when evaluating expressions with NumPy."""
+
+
+@contextmanager
+def lazy_evaluation():
+    """
+Within this context, arithmetic operations on fields return a `FieldExpression` instead of computing the result.
+
+Usage: `with lazy_evaluation(): velocity = (mask * velocity + (1 - mask) * 2).at(velocity)`
+    """
+    _LAZY_EVALUATION.append(True)
+    try:
+        yield None
+    finally:
+        _LAZY_EVALUATION.pop(-1)
+
+
+def lazy_operation(other):
+    """
+Determines whether a field operation with `other` should build a FieldExpression.
+This is the case inside `lazy_evaluation()` or if `other` is a FieldExpression.
+    :param other: second operand
+    :return: bool
+    """
+    return bool(_LAZY_EVALUATION) or isinstance(other, FieldExpression)
+
+
+class FieldExpression(object):
+
+    def __init__(self, function, operands):
+        """
+        Element-wise operation on fields, tensors and numbers that is evaluated lazily.
+
+        Operations on expressions build larger expressions.
+        Evaluation resamples each distinct field once at the target sample points and evaluates the whole expression tree at once.
+        With NumPy, the tree is evaluated in chunks of `CHUNK_SIZE` values so that intermediate results stay small.
+
+        :param function: element-wise function taking one tensor per operand
+        :param operands: Fields, FieldExpressions, tensors or numbers
+        """
+        self.function = function
+        self.operands = tuple(operands)
+
+    @property
+    def fields(self):
+        """
+        All distinct fields in this expression, ordered by first occurrence.
+        :return: list of Fields
+        """
+        from .field import Field
+        result = []
+        for operand in self.operands:
+            if isinstance(operand, FieldExpression):
+                candidates = operand.fields
+            elif isinstance(operand, Field):
+                candidates = [operand]
+            else:
+                candidates = []
+            for field in candidates:
+                if not any(field is existing for existing in result):
+                    result.append(field)
+        return result
+
+    @property
+    def rank(self):
+        return self.fields[0].rank
+
+    def at(self, other_field):
+        """
+        Evaluates this expression at the sample points of `other_field`.
+        :param other_field: Field to sample at
+        :return: Field compatible with other_field
+        """
+        from .field import StaggeredSamplePoints
+        resampled = [(field, field.at(other_field)) for field in self.fields]
+        try:
+            other_field.points
+            return other_field.with_data(self._evaluate([(field, resampled_field.data) for field, resampled_field in resampled], None))
+        except StaggeredSamplePoints:
+            components = []
+            for i in range(other_field.component_count):
+                components.append(self._evaluate([(field, resampled_field.unstack()[i].data) for field, resampled_field in resampled], i))
+            return other_field.with_data(components)
+
+    def evaluate(self):
+        """
+        Evaluates this expression at the sample points of the first field in the expression that has sample points.
+        :return: Field
+        """
+        for field in self.fields:
+            if field.has_points:
+                return self.at(field)
+        raise AssertionError('Cannot evaluate %s because it contains no field with sample points. Use at() instead.' % self)
+
+    @property
+    def data(self):
+        return self.evaluate().data
+
+    def _evaluate(self, field_values, component):
+        """
+        Evaluates the expression tree for one set of sample points.
+        :param field_values: list of (Field, tensor) pairs holding the resampled values of all fields
+        :param component: index of the staggered component to evaluate or None to evaluate all components at once
+        :return: tensor
+        """
+        values = [value for _, value in field_values]
+        if not math.choose_backend(values).matches_name('SciPy'):
+            return self._apply(field_values, component, None, None)
+        shape = np.broadcast(*values).shape if values else ()
+        if len(shape) < 3:  # no spatial axis to split
+            return self._apply(field_values, component, None, None)
+        rows = max(1, CHUNK_SIZE * shape[1] // max(1, int(np.prod(shape))))
+        if rows >= shape[1]:
+            return self._apply(field_values, component, None, None)
+        result = None
+        for start in range(0, shape[1], rows):
+            chunk = self._apply(field_values, component, slice(start, start + rows), shape)
+            if result is None:
+                result = np.empty(np.shape(chunk)[:1] + (shape[1],) + np.shape(chunk)[2:], np.asarray(chunk).dtype)
+            result[:, start:start + rows] = chunk
+        return result
+
+    def _apply(self, field_values, component, rows, shape):
+        """
+        Evaluates the expression tree, optionally for a range of rows along the first spatial axis.
+        :param rows: slice of the first spatial axis to evaluate or None to evaluate all values
+        :param shape: shape of the resampled field values, required if rows is not None
+        """
+        args = []
+        for operand in self.operands:
+            if isinstance(operand, FieldExpression):
+                args.append(operand._apply(field_values, component, rows, shape))  # pylint: disable-msg = protected-access
+            else:
+                value = _operand_value(operand, field_values, component)
+                if rows is not None and _has_rows(value, shape):
+                    value = value[:, rows]
+                args.append(value)
+        return self.function(*args)
+
+    def __mul__(self, other):
+        return FieldExpression(lambda d1, d2: math.mul(d1, d2), [self, other])
+
+    def __rmul__(self, other):
+        return FieldExpression(lambda d1, d2: math.mul(d1, d2), [other, self])
+
+    def __div__(self, other):
+        return FieldExpression(lambda d1, d2: math.div(d1, d2), [self, other])
+
+    __truediv__ = __div__
+
+    def __rdiv__(self, other):
+        return FieldExpression(lambda d1, d2: math.div(d1, d2), [other, self])
+
+    __rtruediv__ = __rdiv__
+
+    def __sub__(self, other):
+        return FieldExpression(lambda d1, d2: math.sub(d1, d2), [self, other])
+
+    def __rsub__(self, other):
+        return FieldExpression(lambda d1, d2: math.sub(d1, d2), [other, self])
+
+    def __add__(self, other):
+        return FieldExpression(lambda d1, d2: math.add(d1, d2), [self, other])
+
+    def __radd__(self, other):
+        return FieldExpression(lambda d1, d2: math.add(d1, d2), [other, self])
+
+    def __pow__(self, power, modulo=None):
+        return FieldExpression(lambda f, p: math.pow(f, p), [self, power])
+
+    def __neg__(self):
+        return FieldExpression(lambda d: -d, [self])
+
+    def __repr__(self):
+        return 'FieldExpression(%s)' % ', '.join(repr(operand) for operand in self.operands)
+
+
+def _has_rows(value, shape):
+    """ Tests whether value extends along the first spatial axis of values shaped like `shape`. Lower-rank tensors, e.g. shaped (batch, channels), broadcast along all spatial axes. """
+    return math.ndims(value) == len(shape) and math.staticshape(value)[1] == shape[1]
+
+
+def _operand_value(operand, field_values, component):
+    for field, value in field_values:
+        if operand is field:
+            return value
+    if component is not None and math.ndims(operand) > 0 and math.staticshape(operand)[-1] > 1:
+        # tensors hold one channel per staggered component
+        return math.unstack(math.as_tensor(operand), axis=-1, keepdims=True)[component]
+    return operand
@@ -5,6 +5,8 @@ from phi.geom import Geometry
 from phi.physics import State
 from phi.physics.field.flag import _PROPAGATOR
 
+from .expression import lazy_operation, FieldExpression
+
 
 def _to_valid_data(data):
     if data is None:
@@ -182,6 +184,8 @@ class Field(State):
         return self.__dataop__(power, False, lambda f, p: math.pow(f, p))
 
     def __dataop__(self, other, linear_if_scalar, data_operator):
+        if lazy_operation(other):
+            return FieldExpression(data_operator, [self, other])
         if isinstance(other, Field):
             assert self.compatible(other), 'Fields are not compatible: %s and %s' % (self, other)
             flags = propagate_flags_operation(self.flags+other.flags, False, self.rank, self.component_count)
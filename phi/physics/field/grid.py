@@ -40,8 +40,20 @@ class CenteredGrid(Field):
         self._sample_points = None
 
     @staticmethod
-    def sample(value, domain, batch_size=None, name=None):
+    def sample(value, domain, batch_size=None, name=None, dtype=None):
+        """
+        Samples the value at the cell centers of a grid matching the domain.
+
+        :param value: constant, tensor or Field
+        :param domain: Domain defining resolution and physical size of the grid
+        :param batch_size: batch size
+        :param name: field name
+        :param dtype: floating point type of the data. If None, uses the type of the active `math.Precision` for the given name.
+        :return: CenteredGrid
+        """
         assert isinstance(domain, Domain)
+        if dtype is None:
+            dtype = math.precision().field_type(name)
         if isinstance(value, Field):
             assert_same_rank(value.rank, domain.rank, 'rank of value (%s) does not match domain (%s)' % (value.rank, domain.rank))
             if isinstance(value, CenteredGrid) and value.box == domain.box and np.all(value.resolution == domain.resolution):
@@ -52,7 +64,9 @@ class CenteredGrid(Field):
                 data = value.at(point_field).data
         else:  # value is constant
             components = math.staticshape(value)[-1] if math.ndims(value) > 0 else 1
-            data = math.add(math.zeros((batch_size,) + tuple(domain.resolution) + (components,)), value)
+            data = math.add(math.zeros((batch_size,) + tuple(domain.resolution) + (components,), dtype), value)
+        if np.issubdtype(math.dtype(data), np.floating) and math.dtype(data) != dtype:
+            data = math.cast(data, dtype)
         return CenteredGrid(data, box=domain.box, extrapolation=Material.extrapolation_mode(domain.boundaries), name=name)
 
     @struct.variable()
@@ -107,11 +121,19 @@ class CenteredGrid(Field):
         return interpolation
 
     def sample_at(self, points):
-        local_points = self.box.global_to_local(points)
-        local_points = math.mul(local_points, math.to_float(self.resolution)) - 0.5
+        local_points = self.index_coordinates(points)
         resampled = math.resample(self.data, local_points, boundary=_pad_mode(self.extrapolation), interpolation=self.interpolation, constant_values=_pad_value(self.extrapolation_value))
         return resampled
 
+    def index_coordinates(self, points):
+        """
+    Converts global coordinates to continuous grid indices in which the cell centers lie at integer positions.
+        :param points: tensor of shape (batch, ..., rank)
+        :return: tensor of same shape as points
+        """
+        local_points = self.box.global_to_local(points)
+        return math.mul(local_points, math.to_float(self.resolution)) - 0.5
+
     def at(self, other_field):
         if self.compatible(other_field):
             return self
@@ -1,9 +1,14 @@
 import warnings
 
+import numpy as np
+
 from phi import struct, math, geom
+from phi.geom._union import Union
 
-from .field import Field
+from .field import Field, propagate_flags_resample
 from .analytic import AnalyticField
+from .grid import CenteredGrid
+from .sdf import SIGNED_DISTANCE_CACHE, fraction_inside
 
 
 @struct.definition()
@@ -43,6 +48,18 @@ If True, field values smoothly go from 0 to 1 at the surface and the field is di
     def sample_at(self, points):
         return math.to_float(self.geometry.lies_inside(points))
 
+    def at(self, other_field):
+        if isinstance(other_field, CenteredGrid) and math.choose_backend(struct.flatten(self.geometry)).matches_name('SciPy'):
+            if not self.antialias:
+                data = rasterize(self.geometry, other_field.box, other_field.resolution, other_field.points.data)
+            elif type(self.geometry).approximate_fraction_inside == geom.Geometry.approximate_fraction_inside:
+                distance = SIGNED_DISTANCE_CACHE.signed_distance(self.geometry, other_field.box, other_field.resolution, other_field.points.data)
+                data = fraction_inside(distance, other_field.dx)
+            else:
+                return AnalyticField.at(self, other_field)
+            return other_field.copied_with(data=data, flags=propagate_flags_resample(self, other_field.flags, other_field.rank))
+        return AnalyticField.at(self, other_field)
+
     @property
     def component_count(self):
         return 1
@@ -54,3 +71,46 @@ mask = GeometryMask
 def union_mask(geometries):
     warnings.warn("union_mask() is deprecated, use mask(union()) instead.", DeprecationWarning)
     return mask(geom.union(*geometries))
+
+
+def rasterize(geometry, box, resolution, points=None):
+    """
+Samples `geometry.lies_inside` at the cell centers of a grid.
+Each geometry (each element of a Union) is only evaluated on the cells within its footprint and accumulated into a single buffer.
+For scenes with many small geometries, the cost scales with the summed footprints instead of the number of geometries times the number of cells.
+    :param geometry: Geometry defined by NumPy arrays or numbers
+    :param box: physical dimensions of the grid
+    :param resolution: grid resolution
+    :param points: (optional) cell centers of the grid as computed by `CenteredGrid.getpoints()`
+    :return: NumPy array of type `math.precision().float_type` and shape (batch, resolution..., 1)
+    """
+    resolution = tuple(int(r) for r in resolution)
+    if points is None:
+        points = CenteredGrid.getpoints(box, resolution).data
+    result = np.zeros((1,) + resolution + (1,), math.precision().float_type)
+    for part in (geometry.geometries if isinstance(geometry, Union) else (geometry,)):
+        region = (slice(None),) + footprint(part, box, resolution) + (slice(None),)
+        part_mask = math.to_float(part.lies_inside(points[region]))
+        if part_mask.shape[0] > result.shape[0]:
+            result = np.tile(result, (part_mask.shape[0],) + (1,) * (len(resolution) + 1))
+        result[region] = np.maximum(result[region], part_mask)
+    return result
+
+
+def footprint(geometry, box, resolution):
+    """
+Determines the grid cells whose centers may lie inside geometry from its bounding box, padded by one cell.
+    :return: tuple of slices, one per spatial dimension. Covers the whole grid if geometry has no bounding box.
+    """
+    rank = len(resolution)
+    try:
+        center, extent = geometry.center, geometry.bounding_half_extent()
+    except NotImplementedError:
+        return tuple(slice(None) for _ in resolution)
+    lower = np.min(np.reshape(np.zeros(rank) + center - extent, (-1, rank)), axis=0)
+    upper = np.max(np.reshape(np.zeros(rank) + center + extent, (-1, rank)), axis=0)
+    local_lower = (lower - box.lower) / box.size * resolution
+    local_upper = (upper - box.lower) / box.size * resolution
+    start = np.clip(np.floor(local_lower - 0.5), 0, resolution).astype(int)
+    stop = np.clip(np.ceil(local_upper - 0.5) + 1, 0, resolution).astype(int)
+    return tuple(slice(a, b) for a, b in zip(start, stop))
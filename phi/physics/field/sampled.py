@@ -1,6 +1,7 @@
 import numpy as np
 
 from phi import struct, math
+from phi.backend.scipy_backend import ParticleBins
 from phi.geom import Sphere
 from phi.physics.domain import Domain
 
@@ -14,9 +15,10 @@ from .util import extrapolate
 @struct.definition()
 class SampledField(Field):
 
-    def __init__(self, sample_points, data=1, mode='mean', point_count=None, **kwargs):
+    def __init__(self, sample_points, data=1, mode='mean', point_count=None, chunk_size=None, **kwargs):
         Field.__init__(self, **struct.kwargs(locals(), ignore=['point_count']))
         self._point_count = point_count
+        self._particle_bins = None  # (sample_points, ((target key, ParticleBins), ...)), inherited by copies with the same sample points
 
     def sample_at(self, points):
         raise NotImplementedError()
@@ -41,16 +43,17 @@ class SampledField(Field):
         :param resolution: grid resolution
         :return: CenteredGrid
         """
-        sample_indices_nd = math.to_int(math.round(box.global_to_local(self.sample_points) * resolution))
-        sample_indices_nd = math.minimum(math.maximum(0, sample_indices_nd), resolution - 1)  # Snap outside points to edges, otherwise scatter raises an error
-        # Correct format for math.scatter
-        valid_indices = _batch_indices(sample_indices_nd)
+        def indices(points):
+            sample_indices_nd = math.to_int(math.round(box.global_to_local(points) * resolution))
+            sample_indices_nd = math.minimum(math.maximum(0, sample_indices_nd), resolution - 1)  # Snap outside points to edges, otherwise scatter raises an error
+            # Correct format for math.scatter
+            return _batch_indices(sample_indices_nd)
         if batch_size is None:
             batch_size = self._batch_size
         if batch_size is None:
             batch_size = 1
         shape = (batch_size,) + tuple(resolution) + (self.data.shape[-1],)
-        scattered = math.scatter(self.sample_points, valid_indices, self.data, shape, duplicates_handling=self.mode)
+        scattered = self._scatter(('centered', box, shape[:-1]), indices, self.data, shape, self.mode)
         return CenteredGrid(data=scattered, box=box, extrapolation='constant', name=self.name+'_centered')
 
     def _stagger_sample(self, box, resolution):
@@ -62,36 +65,31 @@ class SampledField(Field):
         :return: StaggeredGrid
         """
         resolution = np.array(resolution)
-        valid_indices = math.to_int(math.floor(self.sample_points))
-        valid_indices = math.minimum(math.maximum(0, valid_indices), resolution - 1)
-        # Correct format for math.scatter
-        valid_indices = _batch_indices(valid_indices)
 
-        active_mask = math.scatter(self.sample_points, valid_indices, 1, math.concat([[valid_indices.shape[0]], resolution, [1]], axis=-1), duplicates_handling='any')
+        def cell_indices(points):
+            valid_indices = math.to_int(math.floor(points))
+            valid_indices = math.minimum(math.maximum(0, valid_indices), resolution - 1)
+            # Correct format for math.scatter
+            return _batch_indices(valid_indices)
+        batch_size = math.staticshape(self.sample_points)[0]
+        active_mask = self._scatter(('cells', tuple(resolution)), cell_indices, 1, [batch_size] + list(resolution) + [1], 'any')
 
         mask = math.pad(active_mask, [[0, 0]] + [[1, 1]] * self.rank + [[0, 0]], "constant")
 
-        if isinstance(self.data, (int, float, np.ndarray)):
-            values = math.zeros_like(self.sample_points) + self.data
-        else:
-            values = self.data
-        
         result = []
-        ones_1d = math.unstack(math.ones_like(values), axis=-1)[0]
-        staggered_shape = [i + 1 for i in resolution]
+        staggered_shape = [batch_size] + [i + 1 for i in resolution] + [1]
         dx = box.size / resolution
 
         dims = range(len(resolution))
-        for d in dims: 
-            staggered_offset = math.stack([(0.5 * dx[i] * ones_1d if i == d else 0.0 * ones_1d) for i in dims], axis=-1)
+        for d in dims:
+            def staggered_indices(points, d=d):
+                staggered_offset = np.array([0.5 * dx[i] if i == d else 0.0 for i in dims], np.float32)
+                indices = math.to_int(math.floor(points + staggered_offset))
+                valid_indices = math.maximum(0, math.minimum(indices, resolution))
+                return _batch_indices(valid_indices)
 
-            indices = math.to_int(math.floor(self.sample_points + staggered_offset))
-            
-            valid_indices = math.maximum(0, math.minimum(indices, resolution))
-            valid_indices = _batch_indices(valid_indices)
-
-            values_d = math.expand_dims(math.unstack(values, axis=-1)[d], axis=-1)
-            result.append(math.scatter(self.sample_points, valid_indices, values_d, [indices.shape[0]] + staggered_shape + [1], duplicates_handling=self.mode))
+            values_d = self.data[..., d:d + 1] if self.component_count > 1 else self.data
+            result.append(self._scatter(('staggered', d, box, tuple(resolution)), staggered_indices, values_d, staggered_shape, self.mode))
 
             d_slice = tuple([(slice(0, -2) if i == d else slice(1,-1)) for i in dims])
             u_slice = tuple([(slice(2, None) if i == d else slice(1,-1)) for i in dims])
@@ -104,6 +102,64 @@ class SampledField(Field):
         grid_values, _ = extrapolate(grid_values, active_mask, voxel_distance=2)
         return grid_values
 
+    def _scatter(self, target, indices, values, shape, mode):
+        """
+    Scatters values of the sample points to a grid.
+    With NumPy, the sample points are binned once per target using ParticleBins.
+    The bins are stored on this field and inherited by copies with the same sample points that are created afterwards, e.g. fields with different data or the mask.
+    If `chunk_size` is set, the points are streamed in chunks instead, see `_scatter_chunked()`.
+        :param target: key describing the target grid, bins are reused for equal keys
+        :param indices: function mapping sample points to their batch and spatial indices on the target grid
+        :param values: values to scatter
+        :param shape: shape of the resulting grid
+        :param mode: duplicate handling, 'add', 'mean' or 'any'
+        :return: tensor of the given shape
+        """
+        if not math.choose_backend(self.sample_points).matches_name('SciPy'):
+            return math.scatter(self.sample_points, indices(self.sample_points), values, shape, duplicates_handling=mode)
+        if self.chunk_size is not None and self.chunk_size < math.staticshape(self.sample_points)[1]:
+            return self._scatter_chunked(indices, values, shape, mode)
+        entries = self._particle_bins[1] if self._particle_bins is not None and self._particle_bins[0] is self.sample_points else ()
+        for bins_target, bins in entries:
+            if bins_target == target:
+                return bins.scatter(values, mode)
+        bins = ParticleBins(indices(self.sample_points), shape)
+        self._particle_bins = (self.sample_points, entries + ((target, bins),))  # replaced, not modified, so that earlier copies are unaffected
+        return bins.scatter(values, mode)
+
+    def _scatter_chunked(self, indices, values, shape, mode):
+        """
+    Scatters NumPy values chunk by chunk, accumulating sums and counts into the grid.
+    Temporary arrays are bounded by `chunk_size` points instead of the total number of points.
+        """
+        total, counts = np.zeros(shape, math.precision().float_type), np.zeros(tuple(shape[:-1]) + (1,), np.int64)
+        for chunk in self.chunks():
+            chunk_values = values[:, chunk] if np.ndim(values) == 3 and np.shape(values)[1] != 1 else values
+            bins = ParticleBins(indices(self.sample_points[:, chunk]), shape)
+            chunk_counts = np.reshape(bins.counts, counts.shape)
+            if mode in ('add', 'mean'):
+                total += bins.scatter(chunk_values, 'add')
+            else:
+                total = np.where(chunk_counts > 0, bins.scatter(chunk_values, mode), total)
+            counts += chunk_counts
+        if mode == 'mean':
+            total /= np.maximum(1, counts)
+        return total
+
+    def chunks(self, chunk_size=None):
+        """
+    Generates slices of the point dimension with at most `chunk_size` points each.
+    If no chunk size is given and `self.chunk_size` is None or the number of points is unknown, a single slice covering all points is generated.
+        :param chunk_size: overrides `self.chunk_size`
+        """
+        point_count = math.staticshape(self.sample_points)[1]
+        chunk_size = self.chunk_size if chunk_size is None else chunk_size
+        if chunk_size is None or point_count is None:
+            yield slice(None)
+            return
+        for start in range(0, point_count, chunk_size):
+            yield slice(start, start + chunk_size)
+
     @struct.variable()
     def data(self, data):
         assert math.is_tensor(data), data
@@ -120,10 +176,21 @@ class SampledField(Field):
         assert mode in ('add', 'mean', 'any')
         return mode
 
+    @struct.constant(default=None)
+    def chunk_size(self, chunk_size):
+        """
+    Maximum number of points processed at once by NumPy particle operations such as sampling on grids and advection.
+    If None, all points are processed at once.
+        """
+        assert chunk_size is None or chunk_size > 0, chunk_size
+        return chunk_size
+
     @struct.variable()
     def sample_points(self, sample_points):
         assert math.is_tensor(sample_points), sample_points
         assert math.ndims(sample_points) == 3, sample_points.shape
+        if getattr(self, '_particle_bins', None) is not None and self._particle_bins[0] is not sample_points:
+            self._particle_bins = None  # bins inherited from a copy with other sample points
         return sample_points
     sample_points.override(struct.staticshape, lambda self, data: (self._batch_size, self._point_count, self.rank))
 
@@ -0,0 +1,90 @@
+"""
+Signed distance fields sampled at the cell centers of grids.
+"""
+from collections import OrderedDict
+
+import numpy as np
+
+from phi import math
+from phi.geom._geom_util import same_geometry
+from phi.geom._union import Union
+
+from .grid import CenteredGrid
+
+
+class SignedDistanceCache(object):
+
+    def __init__(self, max_size=4):
+        """
+        Caches signed distance fields of geometries sampled at the cell centers of grids, see `GeometryMask.at()`.
+
+        One distance field is stored per grid, keyed on box, resolution and `math.precision().float_type`.
+        It is reused as long as the same or an equal geometry is passed for that grid, so static geometries are only evaluated once.
+        When the geometry moves, the distance field is computed again and replaces the previous one.
+
+        Call `clear()` to explicitly invalidate all cached distances.
+
+        :param max_size: maximum number of grids to keep distances for. The least recently used grid is discarded first.
+        """
+        assert max_size is None or max_size > 0, 'invalid max_size: %s' % max_size
+        self.max_size = max_size
+        self._grids = OrderedDict()  # (box, resolution, float type) -> (geometry, distance)
+
+    def signed_distance(self, geometry, box, resolution, points=None):
+        """
+    Returns the cached signed distance of geometry or computes it using `geometry_signed_distance()`.
+    The geometry must be defined by NumPy arrays or numbers.
+        :return: NumPy array of shape (batch, resolution..., 1)
+        """
+        resolution = tuple(int(r) for r in resolution)
+        key = box, resolution, np.dtype(math.precision().float_type)
+        entry = self._grids.pop(key, None)  # re-inserted below to mark as most recently used
+        if entry is None or (entry[0] is not geometry and not same_geometry(entry[0], geometry)):
+            entry = geometry, geometry_signed_distance(geometry, box, resolution, points)
+        self._grids[key] = entry
+        while self.max_size is not None and len(self._grids) > self.max_size:
+            self._grids.popitem(last=False)
+        return entry[1]
+
+    def clear(self):
+        """ Removes all cached distances. """
+        self._grids.clear()
+
+    def __len__(self):
+        return len(self._grids)
+
+    def __repr__(self):
+        return 'SignedDistanceCache(%d/%s grids)' % (len(self._grids), self.max_size)
+
+
+SIGNED_DISTANCE_CACHE = SignedDistanceCache()
+
+
+def geometry_signed_distance(geometry, box, resolution, points=None):
+    """
+Evaluates `geometry.approximate_signed_distance` at the cell centers of a grid.
+The elements of a Union are evaluated one at a time and accumulated into a single buffer.
+    :param geometry: Geometry defined by NumPy arrays or numbers
+    :param box: physical dimensions of the grid
+    :param resolution: grid resolution
+    :param points: (optional) cell centers of the grid as computed by `CenteredGrid.getpoints()`
+    :return: NumPy array of type `math.precision().float_type` and shape (batch, resolution..., 1), negative inside the geometry
+    """
+    if points is None:
+        points = CenteredGrid.getpoints(box, resolution).data
+    distance = None
+    for part in (geometry.geometries if isinstance(geometry, Union) else (geometry,)):
+        part_distance = part.approximate_signed_distance(points)
+        distance = part_distance if distance is None else np.minimum(distance, part_distance)
+    return np.asarray(distance, math.precision().float_type)
+
+
+def fraction_inside(distance, dx):
+    """
+Converts signed distances at cell centers to approximate fractions of the cells lying inside, like `Geometry.approximate_fraction_inside()` for cell-sized boxes.
+    :param distance: signed distance tensor
+    :param dx: cell size, scalar or one value per spatial dimension
+    :return: tensor of same shape as distance with values between 0 and 1
+    """
+    radius = math.max(dx) * 1.414214  # bounding radius of a cell
+    return math.clip(0.5 - distance / radius, 0, 1)
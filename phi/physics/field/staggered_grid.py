@@ -7,6 +7,7 @@ from phi import math, struct
 from phi.geom import AABox
 from phi.geom.geometry import assert_same_rank
 from phi.struct.tensorop import collapse
+from .expression import lazy_operation, FieldExpression
 from .field import Field, propagate_flags_children, IncompatibleFieldTypes, broadcast_at, StaggeredSamplePoints, propagate_flags_resample, propagate_flags_operation
 from .grid import CenteredGrid
 from ..domain import Domain
@@ -60,7 +61,7 @@ class StaggeredGrid(Field):
         Field.__init__(self, **struct.kwargs(locals()))
 
     @staticmethod
-    def sample(value, domain, batch_size=None, name=None):
+    def sample(value, domain, batch_size=None, name=None, dtype=None):
         """
         Sampmles the value to a staggered grid.
 
@@ -69,10 +70,11 @@ class StaggeredGrid(Field):
         :type domain: Domain
         :param batch_size: batch size
         :param name: field name
+        :param dtype: floating point type of the components. If None, uses the type of the active `math.Precision` for the given name.
         :return: Sampled values in staggered grid form matching domain resolution
         :rtype: StaggeredGrid
         """
-        return domain.staggered_grid(value, batch_size=batch_size, name=name)
+        return domain.staggered_grid(value, dtype=dtype, batch_size=batch_size, name=name)
 
     @struct.variable(dependencies=[Field.name, Field.flags])
     def data(self, data):
@@ -192,6 +194,8 @@ class StaggeredGrid(Field):
             return False
 
     def __dataop__(self, other, linear_if_scalar, data_operator):
+        if lazy_operation(other):
+            return FieldExpression(data_operator, [self, other])
         if isinstance(other, StaggeredGrid):
             assert self.compatible(other), 'Fields are not compatible: %s and %s' % (self, other)
             data = [data_operator(c1, c2) for c1, c2 in zip(self.data, other.data)]
@@ -2,6 +2,7 @@
 import itertools
 
 import numpy as np
+import scipy.ndimage
 from numpy import pi
 from phi import math, struct
 from phi.geom import AABox
@@ -72,7 +73,9 @@ def staggered_curl_2d(grid):
 def extrapolate(input_field, valid_mask, voxel_distance=10):
     """
     Create a signed distance field for the grid, where negative signs are fluid cells and positive signs are empty cells. The fluid surface is located at the points where the interpolated value is zero. Then extrapolate the input field into the air cells.
-        :param domain: Domain that can create new Fields
+
+    With NumPy, each empty cell takes the values of its closest surface cell, see `closest_point_extrapolation()`.
+    Other backends iteratively shift the field towards all neighbours, see `shift_extrapolation()`.
         :param input_field: Field to be extrapolated
         :param valid_mask: One dimensional binary mask indicating where fluid is present
         :param voxel_distance: Optional maximal distance (in number of grid cells) where signed distance should still be calculated / how far should be extrapolated.
@@ -80,11 +83,96 @@ def extrapolate(input_field, valid_mask, voxel_distance=10):
     """
     ext_data = input_field.data
     dx = input_field.dx
-    if isinstance(input_field, StaggeredGrid):
+    staggered = isinstance(input_field, StaggeredGrid)
+    if staggered:
         ext_data = input_field.staggered_tensor()
         valid_mask = math.pad(valid_mask, [[0, 0]] + [[0, 1]] * input_field.rank + [[0, 0]], "constant")
 
-    dims = range(input_field.rank)
+    if math.choose_backend([ext_data, valid_mask]).matches_name('SciPy'):
+        ext_data, s_distance = closest_point_extrapolation(ext_data, valid_mask, voxel_distance, dx, staggered)
+    else:
+        ext_data, s_distance = shift_extrapolation(ext_data, valid_mask, voxel_distance, dx, staggered)
+
+    if staggered:
+        ext_field = input_field.with_data(ext_data)
+        stagger_slice = tuple([slice(0, -1) for i in range(input_field.rank)])
+        s_distance = s_distance[(slice(None),) + stagger_slice + (slice(None),)]
+    else:
+        ext_field = input_field.copied_with(data=ext_data)
+
+    return ext_field, s_distance
+
+
+def closest_point_extrapolation(data, valid_mask, voxel_distance, dx, staggered=False):
+    """
+Extrapolates grid values into empty cells in a single pass, ordered by distance.
+Each empty cell within `voxel_distance` cells (along every axis) of the fluid surface takes the values of its closest surface cell.
+The closest surface cells and the signed distances are computed by exact Euclidean distance transforms.
+
+For staggered tensors, faces adjacent to a fluid cell keep their values, i.e. component i of an empty cell is kept if its lower neighbour along axis i contains fluid.
+The remaining faces take the value of the closest such face of the same component.
+    :param data: NumPy array of shape (batch, spatial dims..., channels)
+    :param valid_mask: NumPy array of shape (batch, spatial dims..., 1), non-zero where fluid is present
+    :param voxel_distance: maximal distance in cells
+    :param dx: cell size, scalar or one value per spatial dimension
+    :param staggered: whether data is a staggered tensor with one component per spatial dimension
+    :return: extrapolated data, signed distance of shape (batch, spatial dims..., 1)
+    """
+    rank = len(data.shape) - 2
+    dx = np.zeros(rank) + dx
+    valid = np.asarray(valid_mask)[..., 0] > 0
+    surface = np.asarray(create_surface_mask(valid_mask))[..., 0] > 0
+    result = np.array(data)
+    s_distance = np.where(valid, -voxel_distance, voxel_distance).astype(np.float32)[..., np.newaxis]
+    for batch in range(valid.shape[0]):
+        if not surface[batch].any():
+            continue
+        distance, closest = scipy.ndimage.distance_transform_edt(~surface[batch], sampling=dx, return_indices=True)
+        for component in range(data.shape[-1]):
+            if staggered:  # the lower face of a cell is also the upper face of its lower neighbour
+                component_valid = valid[batch].copy()
+                upper = tuple(slice(1, None) if i == component else slice(None) for i in range(rank))
+                lower = tuple(slice(None, -1) if i == component else slice(None) for i in range(rank))
+                component_valid[upper] |= valid[batch][lower]
+                _extrapolate_component(result[batch, ..., component], component_valid, voxel_distance, dx)
+            else:
+                _extrapolate_component(result[batch, ..., component], valid[batch], voxel_distance, dx, closest)
+        distance = np.where(valid[batch], -distance, distance)
+        # Cut off inaccurate values
+        s_distance[batch, ..., 0] = np.where(np.abs(distance) < voxel_distance, distance, s_distance[batch, ..., 0])
+    return result, s_distance
+
+
+def _extrapolate_component(values, valid, voxel_distance, dx, closest=None):
+    """
+Copies the values of the closest valid cells into all invalid cells within `voxel_distance` cells along every axis, in-place.
+    :param values: NumPy array of shape (spatial dims...)
+    :param valid: boolean NumPy array of same shape as values
+    :param closest: (optional) indices of the closest valid or surface cells as computed by `scipy.ndimage.distance_transform_edt`
+    """
+    if closest is None:
+        if not valid.any():
+            return
+        closest = scipy.ndimage.distance_transform_edt(~valid, sampling=dx, return_distances=False, return_indices=True)
+    in_range = np.max(np.abs(closest - np.indices(valid.shape)), axis=0) <= voxel_distance
+    update = ~valid & in_range
+    values[update] = values[tuple(closest)][update]
+
+
+def shift_extrapolation(data, valid_mask, voxel_distance, dx, staggered=False):
+    """
+Extrapolates grid values into empty cells by repeatedly shifting the grid towards all 3^d neighbours.
+Values travel one cell per iteration, so `voxel_distance` iterations are performed.
+This only requires basic tensor operations and works with all backends.
+    :param data: tensor of shape (batch, spatial dims..., channels)
+    :param valid_mask: tensor of shape (batch, spatial dims..., 1), 1 where fluid is present
+    :param voxel_distance: maximal distance in cells, also the number of iterations
+    :param dx: cell size, scalar or one value per spatial dimension
+    :param staggered: whether data is a staggered tensor with one component per spatial dimension
+    :return: extrapolated data, signed distance of shape (batch, spatial dims..., 1)
+    """
+    ext_data = data
+    dims = range(math.spatial_rank(data))
     # Larger than voxel_distance to be safe. It could start extrapolating velocities from outside voxel_distance into the field.
     signs = -1 * (2 * valid_mask - 1)
     s_distance = 2.0 * (voxel_distance + 1) * signs
@@ -100,7 +188,7 @@ def extrapolate(input_field, valid_mask, voxel_distance=10):
     )))
 
     # First make a move in every positive direction (StaggeredGrid velocities there are correct, we want to extrapolate these)
-    if isinstance(input_field, StaggeredGrid):
+    if staggered:
         for d in directions:
             if (d <= 0).all():
                 continue
@@ -163,14 +251,7 @@ def extrapolate(input_field, valid_mask, voxel_distance=10):
     distance_limit = -voxel_distance * (2 * valid_mask - 1)
     s_distance = math.where(math.abs(s_distance) < voxel_distance, s_distance, distance_limit)
 
-    if isinstance(input_field, StaggeredGrid):
-        ext_field = input_field.with_data(ext_data)
-        stagger_slice = tuple([slice(0, -1) for i in dims])
-        s_distance = s_distance[(slice(None),) + stagger_slice + (slice(None),)]
-    else:
-        ext_field = input_field.copied_with(data=ext_data)
-
-    return ext_field, s_distance
+    return ext_data, s_distance
 
 
 def create_surface_mask(liquid_mask):
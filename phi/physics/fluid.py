@@ -1,6 +1,7 @@
 """
 Definition of Fluid, IncompressibleFlow as well as fluid-related functions.
 """
+import time
 import warnings
 from numbers import Number
 
@@ -13,9 +14,10 @@ from phi.physics.field import Field, mask
 from phi.physics.field.angular_velocity import AngularVelocity
 
 from .domain import Domain, DomainState
-from .field import CenteredGrid, StaggeredGrid, advect, union_mask
+from .field import CenteredGrid, StaggeredGrid, advect, union_mask, lazy_evaluation
 from .field.effect import Gravity, effect_applied, gravity_tensor, FieldEffect, FieldPhysics
 from .material import OPEN, Material
+from .obstacle import OBSTACLE_MASK_CACHE
 from .physics import Physics, StateDependency
 from .pressuresolver.solver_api import FluidDomain, poisson_solve
 
@@ -72,6 +74,11 @@ def create_smoke(domain, density=0.0, velocity=0.0, buoyancy_factor=0.1):
     return (velocity_field, density_field, buoyancy_state), (velocity_physics, density_physics, buoyancy_physics)
 
 
+def _uses_guess(pressure_solver):
+    """ Whether the given solver may make use of an initial guess. The default solver (None) uses it with some backends. """
+    return pressure_solver is None or pressure_solver.supports_guess
+
+
 class IncompressibleFlow(Physics):
     """
 Physics modelling the incompressible Navier-Stokes equations.
@@ -79,7 +86,18 @@ Supports buoyancy proportional to the marker density.
 Supports obstacles, density effects, velocity effects, global gravity.
     """
 
-    def __init__(self, pressure_solver=None, make_input_divfree=False, make_output_divfree=True, conserve_density=True):
+    def __init__(self, pressure_solver=None, make_input_divfree=False, make_output_divfree=True, conserve_density=True, warm_start=True, advection='semi_lagrangian'):
+        """
+        :param pressure_solver: PoissonSolver used for the pressure solve, None for default
+        :param make_input_divfree: if True, projects the velocity before advection
+        :param make_output_divfree: if True, projects the velocity at the end of each step
+        :param conserve_density: if True, normalizes the density after advection in closed domains
+        :param warm_start: if True, the pressure of the previous step, stored in `Fluid.solve_info`, is used as initial guess for the pressure solve.
+            Only iterative solvers that support a guess (`PoissonSolver.supports_guess`), e.g. SparseCG, GeometricCG or MultigridSolver, converge faster this way.
+            Warm starting is disabled for solvers that do not support a guess, such as SparseSciPy, SparseLU or FourierSolver(fallback=SparseSciPy()).
+            The default solver (pressure_solver=None) solves NumPy simulations directly and only uses the guess with other backends on domains that cannot be solved in frequency space.
+        :param advection: advection scheme for density and velocity, one of 'semi_lagrangian', 'maccormack', 'bfecc'
+        """
         Physics.__init__(self, [StateDependency('obstacles', 'obstacle', blocking=True),
                                 StateDependency('gravity', 'gravity', single_state=True),
                                 StateDependency('density_effects', 'density_effect', blocking=True),
@@ -88,17 +106,22 @@ Supports obstacles, density effects, velocity effects, global gravity.
         self.make_input_divfree = make_input_divfree
         self.make_output_divfree = make_output_divfree
         self.conserve_density = conserve_density
+        self.warm_start = warm_start and _uses_guess(pressure_solver)
+        self.advection = advection
 
     def step(self, fluid, dt=1.0, obstacles=(), gravity=Gravity(), density_effects=(), velocity_effects=()):
         # pylint: disable-msg = arguments-differ
         gravity = gravity_tensor(gravity, fluid.rank)
         velocity = fluid.velocity
         density = fluid.density
+        pressure_guess = fluid.solve_info.get('pressure', None) if self.warm_start else None
         if self.make_input_divfree:
-            velocity, solve_info = divergence_free(velocity, fluid.domain, obstacles, pressure_solver=self.pressure_solver, return_info=True)
+            velocity, solve_info = divergence_free(velocity, fluid.domain, obstacles, pressure_solver=self.pressure_solver, return_info=True, pressure_guess=pressure_guess)
+            pressure_guess = solve_info['pressure'] if self.warm_start else None
         # --- Advection ---
-        density = advect.semi_lagrangian(density, velocity, dt=dt)
-        velocity = advected_velocity = advect.semi_lagrangian(velocity, velocity, dt=dt)
+        advection = advect.AdvectionPlan(velocity, dt, scheme=self.advection)
+        density = advection.advect(density, buffer_key=(fluid.name, 'density'))
+        velocity = advected_velocity = advection.advect(velocity, buffer_key=(fluid.name, 'velocity'))
         if self.conserve_density and np.all(Material.solid(fluid.domain.boundaries)):
             density = density.normalized(fluid.density)
         # --- Effects ---
@@ -110,7 +133,7 @@ Supports obstacles, density effects, velocity effects, global gravity.
         divergent_velocity = velocity
         # --- Pressure solve ---
         if self.make_output_divfree:
-            velocity, solve_info = divergence_free(velocity, fluid.domain, obstacles, pressure_solver=self.pressure_solver, return_info=True)
+            velocity, solve_info = divergence_free(velocity, fluid.domain, obstacles, pressure_solver=self.pressure_solver, return_info=True, pressure_guess=pressure_guess)
         solve_info['advected_velocity'] = advected_velocity
         solve_info['divergent_velocity'] = divergent_velocity
         return fluid.copied_with(density=density, velocity=velocity, age=fluid.age + dt, solve_info=solve_info)
@@ -118,19 +141,31 @@ Supports obstacles, density effects, velocity effects, global gravity.
 
 class IncompressibleVFlow(Physics):
 
-    def __init__(self, boundaries, pressure_solver=None):
+    def __init__(self, boundaries, pressure_solver=None, warm_start=True, advection='semi_lagrangian'):
+        """
+        :param boundaries: Material or list of Materials specifying the domain boundaries
+        :param pressure_solver: PoissonSolver used for the pressure solve, None for default
+        :param warm_start: if True, the pressure of the previous step is used as initial guess for the pressure solve, see `IncompressibleFlow`
+        :param advection: advection scheme for the velocity, one of 'semi_lagrangian', 'maccormack', 'bfecc'
+        """
         Physics.__init__(self, dependencies=[
             StateDependency('obstacles', 'obstacle'),
             StateDependency('velocity_effects', 'velocity_effect', blocking=True),
         ])
         self.boundaries =  boundaries
         self.pressure_solver = pressure_solver
+        self.warm_start = warm_start and _uses_guess(pressure_solver)
+        self._last_pressure = {}  # state name -> pressure of the previous step, used as initial guess
+        self.advection = advection
 
     def step(self, velocity, dt=1.0, obstacles=(), velocity_effects=()):
-        velocity = advect.semi_lagrangian(velocity, velocity, dt=dt)
+        velocity = advect.AdvectionPlan(velocity, dt, scheme=self.advection).advect(velocity, buffer_key=(velocity.name, 'velocity'))
         for effect in velocity_effects:  # this is where buoyancy is applied
             velocity = effect_applied(effect, velocity, dt)
-        velocity, _solve_info = divergence_free(velocity, Domain(velocity.resolution, self.boundaries, velocity.box), obstacles, pressure_solver=self.pressure_solver, return_info=True)
+        pressure_guess = self._last_pressure.get(velocity.name, None) if self.warm_start else None
+        velocity, solve_info = divergence_free(velocity, Domain(velocity.resolution, self.boundaries, velocity.box), obstacles, pressure_solver=self.pressure_solver, return_info=True, pressure_guess=pressure_guess)
+        if self.warm_start:
+            self._last_pressure[velocity.name] = solve_info['pressure']
         return velocity.copied_with(age=velocity.age + dt)
 
 
@@ -146,14 +181,15 @@ This Physics can be applied to all built-in Fields.
 The fields will then be advected with the velocity field each time step.
     """
 
-    def __init__(self, use_updated_velocity=False, conserve=True, velocity_field_name='velocity'):
+    def __init__(self, use_updated_velocity=False, conserve=True, velocity_field_name='velocity', advection='semi_lagrangian'):
         Physics.__init__(self, dependencies=[StateDependency('velocity', velocity_field_name, single_state=True, blocking=use_updated_velocity)])
         self.conserve = conserve
+        self.advection = advection
 
     def step(self, field, dt=1.0, velocity=None):
         if not isinstance(velocity, Field):
             velocity = velocity.velocity
-        advected = advect.advect(field, velocity, dt=dt).copied_with(age=field.age + dt)
+        advected = advect.advect(field, velocity, dt=dt, scheme=self.advection).copied_with(age=field.age + dt)
         if self.conserve and isinstance(field, (CenteredGrid, StaggeredGrid)) and np.all(~np.char.equal(struct.flatten(field.extrapolation), 'constant')):  # If field has zero extrapolation, it cannot be conserved
             advected = advected.normalized(field)
         return advected
@@ -200,6 +236,18 @@ def _is_div_free(velocity, is_div_free):
     return False
 
 
+def _pressure_guess(pressure, divergence, dx):
+    """
+Converts a pressure returned by divergence_free back to the units used by the Poisson solve.
+Returns None if there is no pressure or it cannot be used as a guess for the given divergence.
+    """
+    if not isinstance(pressure, CenteredGrid) or not pressure.compatible(divergence):
+        return None
+    if math.staticshape(pressure.data) != math.staticshape(divergence.data):
+        return None
+    return pressure.copied_with(data=pressure.data / dx, extrapolation=divergence.extrapolation)
+
+
 def solve_pressure(divergence, fluiddomain, pressure_solver=None, guess=None):
     """
 Computes the pressure from the given velocity divergence using the specified solver.
@@ -213,22 +261,31 @@ Computes the pressure from the given velocity divergence using the specified sol
     return poisson_solve(divergence, fluiddomain, solver=pressure_solver, guess=guess)
 
 
-def divergence_free(velocity, domain=None, obstacles=(), pressure_solver=None, return_info=False):
+def divergence_free(velocity, domain=None, obstacles=(), pressure_solver=None, return_info=False, pressure_guess=None, obstacle_mask_cache=None):
     """
 Projects the given velocity field by solving for and subtracting the pressure.
-    :param return_info: if True, returns a dict holding information about the solve as a second object
+    :param return_info: if True, returns a dict holding information about the solve as a second object.
+        The dict contains the keys 'pressure', 'iterations', 'divergence' and 'solve_time' (wall time of the pressure solve in seconds).
     :param velocity: StaggeredGrid
     :param domain: Domain matching the velocity field, used for boundary conditions
     :param obstacles: list of Obstacles
     :param pressure_solver: PressureSolver. Uses default solver if none provided.
+    :param pressure_guess: (optional) pressure of a previous solve, as returned in the info dict, used as initial guess by solvers that support it.
+        Ignored if it does not match the shape of the velocity field or if the solver does not support a guess (`PoissonSolver.supports_guess`).
+    :param obstacle_mask_cache: ObstacleMaskCache used to rasterize NumPy obstacles, defaults to OBSTACLE_MASK_CACHE
     :return: divergence-free velocity as StaggeredGrid
     """
     assert isinstance(velocity, StaggeredGrid)
     # --- Set up FluidDomain ---
     if domain is None:
         domain = Domain(velocity.resolution, OPEN)
-    obstacle_mask = mask(union([obstacle.geometry for obstacle in obstacles]), antialias=False)
-    if obstacle_mask is not None:
+    geometries = [obstacle.geometry for obstacle in obstacles]
+    obstacle_mask = mask(union(geometries), antialias=False)
+    if geometries and math.choose_backend(struct.flatten(geometries)).matches_name('SciPy'):
+        obstacle_mask_cache = obstacle_mask_cache if obstacle_mask_cache is not None else OBSTACLE_MASK_CACHE
+        obstacle_grid = CenteredGrid(obstacle_mask_cache.obstacle_mask(geometries, velocity.box, velocity.resolution, domain.boundaries), velocity.box, extrapolation='constant')
+        active_mask = 1 - obstacle_grid
+    elif obstacle_mask is not None:
         obstacle_grid = obstacle_mask.at(velocity.center_points).copied_with(extrapolation='constant')
         active_mask = 1 - obstacle_grid
     else:
@@ -241,12 +298,16 @@ Projects the given velocity field by solving for and subtracting the pressure.
         if not obstacle.is_stationary:
             obs_mask = mask(obstacle.geometry, antialias=True)
             angular_velocity = AngularVelocity(location=obstacle.geometry.center, strength=obstacle.angular_velocity, falloff=None)
-            velocity = ((1 - obs_mask) * velocity + obs_mask * (angular_velocity + obstacle.velocity)).at(velocity)
+            with lazy_evaluation():
+                velocity = ((1 - obs_mask) * velocity + obs_mask * (angular_velocity + obstacle.velocity)).at(velocity)
     divergence_field = velocity.divergence(physical_units=False)
     if not struct.any(Material.open(domain.boundaries)):  # has no open boundary
         divergence_field = divergence_field - math.mean(divergence_field.data, axis=tuple(range(1, 1 + divergence_field.rank)), keepdims=True)  # Subtract mean divergence
-    pressure, iterations = solve_pressure(divergence_field, fluiddomain, pressure_solver=pressure_solver)
+    solve_start = time.time()
+    guess = _pressure_guess(pressure_guess, divergence_field, velocity.dx[0]) if _uses_guess(pressure_solver) else None
+    pressure, iterations = solve_pressure(divergence_field, fluiddomain, pressure_solver=pressure_solver, guess=guess)
+    solve_time = time.time() - solve_start
     pressure *= velocity.dx[0]
     gradp = StaggeredGrid.gradient(pressure)
     velocity -= fluiddomain.with_hard_boundary_conditions(gradp)
-    return velocity if not return_info else (velocity, {'pressure': pressure, 'iterations': iterations, 'divergence': divergence_field})
+    return velocity if not return_info else (velocity, {'pressure': pressure, 'iterations': iterations, 'divergence': divergence_field, 'solve_time': solve_time})
@@ -1,7 +1,14 @@
-from phi import struct
+from collections import OrderedDict
+
+import numpy as np
+
+from phi import struct, math
 from phi.geom.geometry import Geometry
+from phi.geom._geom_util import same_geometry
+from phi.geom._union import Union
 
-from .field import GeometryMask
+from .field import GeometryMask, CenteredGrid
+from .field.mask import rasterize, footprint
 from .field.effect import FieldEffect
 from .material import CLOSED, Material
 from .physics import Physics, State
@@ -36,6 +43,101 @@ class Obstacle(State):
         return self.velocity is 0 and self.angular_velocity is 0
 
 
+class ObstacleMaskCache(object):
+
+    def __init__(self, max_size=4):
+        """
+        Caches binary obstacle masks sampled at the cell centers of a grid, see `divergence_free()`.
+
+        Each obstacle geometry is rasterized once, only within its bounding box, and reused as long as an equal geometry is passed.
+        When obstacles move, only the geometries that changed since the last call are rasterized again.
+        Masks are discarded when their geometry is no longer passed for the same grid.
+
+        Masks are stored per grid, keyed on box, resolution and boundaries, so that simulations stepped alternately do not evict each other.
+        The key also includes `math.precision().float_type`, the data type of the masks.
+
+        All geometries must be defined by NumPy arrays or numbers.
+
+        :param max_size: maximum number of grids to keep masks for. The least recently used grid is discarded first.
+        """
+        assert max_size is None or max_size > 0, 'invalid max_size: %s' % max_size
+        self.max_size = max_size
+        self._grids = OrderedDict()  # (box, resolution, boundaries, float type) -> _GridMasks
+
+    def obstacle_mask(self, geometries, box, resolution, boundaries=None):
+        """
+    Computes the union of the geometry masks at the cell centers of the grid.
+        :param geometries: list of NumPy Geometries
+        :param box: physical dimensions of the grid
+        :param resolution: grid resolution
+        :param boundaries: (optional) boundaries of the simulation, used to keep masks of simulations sharing a grid apart
+        :return: NumPy array of shape (batch, resolution..., 1) with 1 inside any geometry and 0 elsewhere
+        """
+        resolution = tuple(int(r) for r in resolution)
+        key = box, resolution, repr(boundaries), np.dtype(math.precision().float_type)
+        if key in self._grids:
+            grid = self._grids.pop(key)  # re-inserted below to mark as most recently used
+        else:
+            grid = _GridMasks(CenteredGrid.getpoints(box, resolution).data)
+        self._grids[key] = grid
+        while self.max_size is not None and len(self._grids) > self.max_size:
+            self._grids.popitem(last=False)
+        entries = []
+        for geometry in geometries:
+            entry = next((e for e in grid.entries if e[0] is geometry), None) or next((e for e in grid.entries if same_geometry(e[0], geometry)), None)
+            if entry is None:
+                entry = (geometry,) + _rasterize(geometry, box, resolution, grid.points)
+            entries.append(entry)
+        grid.entries = entries
+        if len(grid.union[0]) != len(entries) or any(a is not b for a, b in zip(grid.union[0], entries)):
+            union = np.zeros((1,) + resolution + (1,), math.precision().float_type)
+            for _, slices, geometry_mask in entries:
+                if slices is None:
+                    union = np.maximum(union, geometry_mask)
+                else:
+                    union[slices] = np.maximum(union[slices], geometry_mask)
+            grid.union = entries, union
+        return grid.union[1]
+
+    def clear(self):
+        """ Removes all cached masks. """
+        self._grids.clear()
+
+    def __len__(self):
+        return len(self._grids)
+
+    def __repr__(self):
+        return 'ObstacleMaskCache(%d/%s grids)' % (len(self._grids), self.max_size)
+
+
+class _GridMasks(object):
+
+    def __init__(self, points):
+        """ Cached obstacle masks of one grid, see `ObstacleMaskCache`. """
+        self.points = points  # cell centers of the grid
+        self.entries = []  # list of (geometry, slices of the bounding box or None for the whole grid, mask)
+        self.union = (), None  # (entries, union of their masks)
+
+
+def _rasterize(geometry, box, resolution, points):
+    """
+Samples `geometry.lies_inside` at the cell centers within the footprint of geometry.
+    :return: slices of the footprint or None for the whole grid, mask of the footprint or the whole grid with type `math.precision().float_type`
+    """
+    if isinstance(geometry, Union):
+        return None, rasterize(geometry, box, resolution, points)
+    slices = (slice(None),) + footprint(geometry, box, resolution) + (slice(None),)
+    geometry_mask = math.to_float(geometry.lies_inside(points[slices]))
+    if geometry_mask.shape[0] == 1:
+        return slices, geometry_mask
+    full_mask = np.zeros(geometry_mask.shape[:1] + tuple(resolution) + (1,), geometry_mask.dtype)
+    full_mask[slices] = geometry_mask
+    return None, full_mask
+
+
+OBSTACLE_MASK_CACHE = ObstacleMaskCache()
+
+
 class GeometryMovement(Physics):
 
     def __init__(self, geometry_function):
@@ -1,18 +1,140 @@
+from collections import OrderedDict
+
+import numpy as np
+import six
+import scipy.fftpack
+try:
+    import scipy.fft as scipy_fft  # SciPy >= 1.4
+except ImportError:
+    scipy_fft = None
+
 from phi import math
-from .solver_api import PoissonSolver
+from phi.physics.material import Material
+from .solver_api import PoissonSolver, PoissonDomain
+
+
+SPECTRUM_CACHE = OrderedDict()  # (resolution, transforms) -> inverse spectrum, shared by all FourierSolvers by default, most recently used last
+SPECTRUM_CACHE_SIZE = 16
 
 
 class FourierSolver(PoissonSolver):
 
-    def __init__(self):
+    def __init__(self, fallback=None, spectrum_cache=SPECTRUM_CACHE):
         """
-        Computes the inverse laplace operation in Fourier space.
+        Solves the Poisson equation directly in frequency space.
 
-        This is computationally inexpensive compared to iterative solvers; the FFT is the most expensive step.
+        This is computationally inexpensive compared to iterative solvers; the transforms are the most expensive step, O(N log N).
+        The eigenvalues of the discrete Laplace stencil are used so that the result matches the iterative solvers.
 
-        While the result is only correct for periodic domains, it can be used as initial guess for other solvers, even for non-periodic domains.
+        The solver is applicable to domains without obstacles where each axis is either periodic (FFT), closed (DCT) or open (DST) on both sides.
+        DCT and DST require NumPy tensors, other backends only support fully periodic domains.
+        For all other domains, the solve is delegated to `fallback`.
+        Frequency-space solves are direct and ignore the initial guess, only the fallback makes use of it.
+
+        :param fallback: PoissonSolver for domains that cannot be solved in frequency space, defaults to SparseCG
+        :param spectrum_cache: OrderedDict in which inverse spectra are cached, shared between solvers by default.
+            At most SPECTRUM_CACHE_SIZE spectra are kept. Pass None to use a cache local to this solver.
         """
-        PoissonSolver.__init__(self, 'FFT', ('CPU', 'GPU'), supports_guess=False, supports_loop_counter=False, supports_continuous_masks=False)
+        PoissonSolver.__init__(self, 'FFT', ('CPU', 'GPU'), supports_guess=fallback is None or fallback.supports_guess, supports_loop_counter=False, supports_continuous_masks=False)
+        self.fallback = fallback
+        self._spectra = spectrum_cache if spectrum_cache is not None else OrderedDict()
 
     def solve(self, field, domain, guess):
-        return math.fourier_poisson(field), None
+        assert isinstance(domain, PoissonDomain)
+        transforms = fourier_transforms(domain)
+        if transforms is not None and (all(t == 'fft' for t in transforms) or math.choose_backend(field).matches_name('SciPy')):
+            return self._solve(field, transforms), None
+        if self.fallback is None:
+            from .sparse import SparseCG
+            self.fallback = SparseCG()
+        return self.fallback.solve(field, domain, guess)
+
+    def _solve(self, field, transforms):
+        resolution = tuple(int(r) for r in math.staticshape(field)[1:-1])
+        spectrum = self.inverse_spectrum(resolution, transforms)
+        if not math.choose_backend(field).matches_name('SciPy'):
+            return math.real(math.ifft(math.fft(math.to_complex(field)) * spectrum.astype(np.complex64)))
+        dtype = field.dtype
+        fft_axes = [axis + 1 for axis, t in enumerate(transforms) if t == 'fft']
+        for axis, transform in enumerate(transforms):
+            if transform != 'fft':
+                field = _REAL_TRANSFORMS[transform][0](field, axis=axis + 1)
+        if fft_axes:
+            field = np.real(_ifftn(_fftn(field, axes=fft_axes) * spectrum, axes=fft_axes))
+        else:
+            field = field * spectrum
+        for axis, transform in enumerate(transforms):
+            if transform != 'fft':
+                field = _REAL_TRANSFORMS[transform][1](field, axis=axis + 1)
+        return field.astype(dtype)
+
+    def inverse_spectrum(self, resolution, transforms):
+        """
+    Returns the inverse eigenvalues of the discrete Laplace operator for the given transforms.
+    The spectrum is cached per resolution and transform types in the spectrum cache of this solver. The inverse of zero eigenvalues is set to zero, resulting in a zero-mean solution.
+        :param resolution: tuple of ints
+        :param transforms: tuple of 'fft', 'dct' or 'dst', one per axis
+        :return: NumPy array of shape (1, resolution..., 1)
+        """
+        key = tuple(resolution), tuple(transforms)
+        if key in self._spectra:
+            self._spectra[key] = self._spectra.pop(key)  # mark as most recently used
+        else:
+            eigenvalues = 0
+            for axis, (n, transform) in enumerate(zip(resolution, transforms)):
+                k = np.arange(n)
+                phase = {'fft': 2 * np.pi * k / n, 'dct': np.pi * k / n, 'dst': np.pi * (k + 1) / (n + 1)}[transform]
+                shape = [1] * len(resolution)
+                shape[axis] = n
+                eigenvalues = eigenvalues + np.reshape(2 * np.cos(phase) - 2, shape)
+            eigenvalues = np.where(np.abs(eigenvalues) < 1e-10, np.inf, eigenvalues)
+            self._spectra[key] = (1 / eigenvalues)[np.newaxis, ..., np.newaxis]
+            while len(self._spectra) > SPECTRUM_CACHE_SIZE:
+                self._spectra.popitem(last=False)
+        return self._spectra[key]
+
+
+def _orthonormal_dst1(x, axis):
+    """ Orthonormal DST-I using scipy.fftpack which does not support norm='ortho' for this type in all versions. The transform is its own inverse. """
+    return scipy.fftpack.dst(x, type=1, axis=axis) * np.sqrt(0.5 / (np.shape(x)[axis] + 1))
+
+
+_FFTPACK_TRANSFORMS = {
+    'dct': (lambda x, axis: scipy.fftpack.dct(x, type=2, axis=axis, norm='ortho'), lambda x, axis: scipy.fftpack.idct(x, type=2, axis=axis, norm='ortho')),
+    'dst': (_orthonormal_dst1, _orthonormal_dst1),
+}
+
+if scipy_fft is not None:
+    _fftn, _ifftn = scipy_fft.fftn, scipy_fft.ifftn
+    _REAL_TRANSFORMS = {
+        'dct': (lambda x, axis: scipy_fft.dct(x, type=2, axis=axis, norm='ortho'), lambda x, axis: scipy_fft.idct(x, type=2, axis=axis, norm='ortho')),
+        'dst': (lambda x, axis: scipy_fft.dst(x, type=1, axis=axis, norm='ortho'), lambda x, axis: scipy_fft.idst(x, type=1, axis=axis, norm='ortho')),
+    }
+else:  # SciPy < 1.4, e.g. on Python 2.7
+    _fftn, _ifftn = np.fft.fftn, np.fft.ifftn
+    _REAL_TRANSFORMS = _FFTPACK_TRANSFORMS
+
+
+def fourier_transforms(domain):
+    """
+Determines whether the Poisson equation on the given domain can be solved in frequency space and with which transform.
+This requires that the domain contains no obstacles, i.e. the active and accessible masks are one everywhere, and that each axis has the same boundary type on both sides.
+Masks that are not NumPy arrays cannot be inspected and are considered ineligible.
+    :param domain: PoissonDomain
+    :return: tuple of 'fft' (periodic), 'dct' (closed) or 'dst' (open), one per axis, or None if the domain is not eligible
+    """
+    for mask in (domain.active.data, domain.accessible.data):
+        if not isinstance(mask, (np.ndarray, np.number, float, int)) or not np.all(mask == 1):
+            return None
+    extrapolation = Material.extrapolation_mode(domain.domain.boundaries)
+    if isinstance(extrapolation, six.string_types):
+        extrapolation = [extrapolation] * domain.rank
+    transforms = []
+    for axis_extrapolation in extrapolation:
+        if not isinstance(axis_extrapolation, six.string_types):
+            lower, upper = axis_extrapolation
+            if lower != upper:
+                return None
+            axis_extrapolation = lower
+        transforms.append({'periodic': 'fft', 'boundary': 'dct', 'constant': 'dst'}[axis_extrapolation])
+    return tuple(transforms)
@@ -1,9 +1,9 @@
 from numbers import Number
 
 from phi import math
-from phi.math.blas import conjugate_gradient
+from phi.math.blas import conjugate_gradient, preconditioned_conjugate_gradient
 from phi.math.helper import _dim_shifted
-from phi.physics.field import CenteredGrid
+from phi.physics.field.grid import _pad_mode
 from .solver_api import PoissonDomain, PoissonSolver
 
 
@@ -11,7 +11,7 @@ class GeometricCG(PoissonSolver):
 
     def __init__(self, accuracy=1e-5, gradient_accuracy='same',
                  max_iterations=2000, max_gradient_iterations='same',
-                 autodiff=False):
+                 autodiff=False, preconditioner=None):
         """
 Conjugate gradient solver that geometrically calculates laplace pressure in each iteration.
 Unlike most other solvers, this algorithm is TPU compatible but usually performs worse than SparseCG.
@@ -28,6 +28,8 @@ Obstacles are allowed to vary between examples but the same number of iterations
             The intermediate results of each loop iteration will be permanently stored if backpropagation is used.
             If False, replaces autodiff by a forward pressure solve in reverse accumulation backpropagation.
             This requires less memory but is only accurate if the solution is fully converged.
+        :param preconditioner: (optional) Preconditioner, e.g. JacobiPreconditioner or MultigridPreconditioner.
+            If given, the preconditioned conjugate gradient algorithm is used.
         """
         PoissonSolver.__init__(self, 'Single-Phase Conjugate Gradient',
                                supported_devices=('CPU', 'GPU', 'TPU'),
@@ -46,38 +48,67 @@ Obstacles are allowed to vary between examples but the same number of iterations
             self.max_gradient_iterations = max_gradient_iterations
             assert not autodiff, 'Cannot specify max_gradient_iterations when autodiff=True'
         self.autodiff = autodiff
+        self.preconditioner = preconditioner
 
     def solve(self, divergence, domain, guess):
         assert isinstance(domain, PoissonDomain)
         fluid_mask = domain.accessible_tensor(extend=1)
+        preconditioner = self.preconditioner.build(domain) if self.preconditioner is not None else None
 
         if self.autodiff:
-            return solve_pressure_forward(divergence, fluid_mask, self.max_iterations, guess, self.accuracy, domain, back_prop=True)
+            return solve_pressure_forward(divergence, fluid_mask, self.max_iterations, guess, self.accuracy, domain, back_prop=True, preconditioner=preconditioner)
         else:
             def pressure_gradient(op, grad):
-                return solve_pressure_forward(grad, fluid_mask, max_gradient_iterations, None, self.gradient_accuracy, domain)[0]
+                return solve_pressure_forward(grad, fluid_mask, max_gradient_iterations, None, self.gradient_accuracy, domain, preconditioner=preconditioner)[0]
 
             pressure, iteration = math.with_custom_gradient(
                 solve_pressure_forward,
-                [divergence, fluid_mask, self.max_iterations, guess, self.accuracy, domain],
+                [divergence, fluid_mask, self.max_iterations, guess, self.accuracy, domain, False, preconditioner],
                 pressure_gradient,
                 input_index=0, output_index=0, name_base='geom_solve'
             )
 
-            max_gradient_iterations = iteration if self.max_gradient_iterations == 'mirror' else self.max_gradient_iterations
+            max_gradient_iterations = math.max(iteration) if self.max_gradient_iterations == 'mirror' else self.max_gradient_iterations
             return pressure, iteration
 
 
-def solve_pressure_forward(divergence, fluid_mask, max_iterations, guess, accuracy, domain, back_prop=False):
+def solve_pressure_forward(divergence, fluid_mask, max_iterations, guess, accuracy, domain, back_prop=False, preconditioner=None):
     from phi.physics.material import Material
     extrapolation = Material.extrapolation_mode(domain.domain.boundaries)
 
     def apply_A(pressure):
-        pressure = CenteredGrid(pressure, extrapolation=extrapolation)
-        pressure_padded = pressure.padded([[1, 1]] * pressure.rank)
-        return _weighted_sliced_laplace_nd(pressure_padded.data, weights=fluid_mask)
-
-    return conjugate_gradient(divergence, apply_A, guess, accuracy, max_iterations, back_prop=back_prop)
+        return geometric_laplace(pressure, fluid_mask, extrapolation)
+
+    if preconditioner is None:
+        return conjugate_gradient(divergence, apply_A, guess, accuracy, max_iterations, back_prop=back_prop)
+    else:
+        return preconditioned_conjugate_gradient(divergence, apply_A, preconditioner, guess, accuracy, max_iterations, back_prop=back_prop)
+
+
+def geometric_laplace(pressure, fluid_mask, extrapolation):
+    """
+Computes the Laplace of the pressure tensor, weighting the stencil by the fluid mask.
+    :param pressure: tensor of shape (batch size, spatial dimensions..., 1)
+    :param fluid_mask: accessible tensor extended by one cell in every direction
+    :param extrapolation: extrapolation mode of the pressure, used to pad the tensor
+    :return: tensor of same shape as `pressure`
+    """
+    pressure_padded = math.pad(pressure, [[0, 0]] + [[1, 1]] * math.spatial_rank(pressure) + [[0, 0]], _pad_mode(extrapolation))
+    return _weighted_sliced_laplace_nd(pressure_padded, weights=fluid_mask)
+
+
+def geometric_laplace_diagonal(fluid_mask):
+    """
+Computes the central stencil weights of `geometric_laplace`, i.e. the diagonal of the corresponding matrix.
+To avoid division by zero, values are capped at -1.
+    :param fluid_mask: accessible tensor extended by one cell in every direction
+    :return: tensor of shape (batch size, spatial dimensions..., 1)
+    """
+    components = []
+    for dimension in range(math.spatial_rank(fluid_mask)):
+        lower_weights, upper_weights = _dim_shifted(fluid_mask, dimension, (-1, 1), diminish_others=(1, 1))
+        components.append(- lower_weights - upper_weights)
+    return math.minimum(math.sum(components, 0), -1)
 
 
 def _weighted_sliced_laplace_nd(tensor, weights):
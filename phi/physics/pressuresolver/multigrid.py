@@ -0,0 +1,332 @@
+from numbers import Number
+
+import numpy as np
+
+from phi import math, struct
+from phi.math.blas import preconditioned_conjugate_gradient, _active_examples, _count, _zero_iterations
+from phi.physics.domain import Domain
+from phi.physics.field import CenteredGrid
+from phi.physics.field.grid import _pad_mode
+from phi.physics.material import Material
+from .geom import geometric_laplace, geometric_laplace_diagonal
+from .solver_api import PoissonDomain, PoissonSolver
+
+
+class MultigridSolver(PoissonSolver):
+
+    def __init__(self, accuracy=1e-5, max_iterations=100, cycle='V', smoother='jacobi', pre_smoothing=2, post_smoothing=2,
+                 coarse_iterations=32, omega=None, min_resolution=4, max_levels=None, krylov=True,
+                 gradient_accuracy='same', max_gradient_iterations='same', autodiff=False):
+        """
+        Geometric multigrid solver.
+
+        Each multigrid cycle smoothes the residual, restricts it to a coarser grid where the error is corrected recursively,
+        and interpolates the correction back where it is smoothed again.
+        The number of iterations required to reach a given accuracy is nearly independent of the resolution.
+
+        All levels apply the geometric Laplace operator of `GeometricCG`, weighted by the downsampled accessible mask.
+        The solver works with all backends and supports continuous masks.
+
+        :param accuracy: the algorithm terminates once |Ap-d| ≤ accuracy for every element
+        :param max_iterations: maximum number of iterations
+        :param cycle: 'V' to visit each coarser level once per cycle, 'W' to visit it twice
+        :param smoother: 'jacobi' for weighted Jacobi or 'gauss-seidel' for red-black Gauss-Seidel
+        :param pre_smoothing: number of smoothing iterations before the coarse-grid correction
+        :param post_smoothing: number of smoothing iterations after the coarse-grid correction
+        :param coarse_iterations: number of smoothing iterations on the coarsest grid
+        :param omega: relaxation factor of the smoother or None for the default (2/3 for Jacobi, 1 for Gauss-Seidel)
+        :param min_resolution: coarsening stops before any dimension drops below this number of cells
+        :param max_levels: maximum number of levels including the finest or None
+        :param krylov: If True, each iteration is a conjugate gradient step preconditioned by one multigrid cycle (MGPCG).
+            If False, iterates multigrid cycles only. This is cheaper per iteration but can stall next to obstacles in closed domains
+            where the coarse grids cannot represent the geometry of the fine grid.
+        :param gradient_accuracy: accuracy applied during backpropagation, number of 'same' to use forward accuracy
+        :param max_gradient_iterations: maximum cycles during backpropagation, number or 'same' to use max_iterations
+        :param autodiff: If autodiff=True, use the built-in autodiff for backpropagation.
+            If False, replaces autodiff by a forward solve in reverse accumulation backpropagation.
+        """
+        PoissonSolver.__init__(self, 'Multigrid', supported_devices=('CPU', 'GPU', 'TPU'),
+                               supports_guess=True, supports_loop_counter=True, supports_continuous_masks=True)
+        assert isinstance(accuracy, Number), 'invalid accuracy: %s' % accuracy
+        assert cycle in ('V', 'W'), 'invalid cycle: %s' % cycle
+        assert smoother in SMOOTHERS, 'invalid smoother: %s' % smoother
+        assert gradient_accuracy == 'same' or isinstance(gradient_accuracy, Number), 'invalid gradient_accuracy: %s' % gradient_accuracy
+        assert max_gradient_iterations == 'same' or isinstance(max_gradient_iterations, Number), 'invalid max_gradient_iterations: %s' % max_gradient_iterations
+        self.accuracy = accuracy
+        self.max_iterations = max_iterations
+        self.cycle = cycle
+        self.smoother = smoother
+        self.pre_smoothing = pre_smoothing
+        self.post_smoothing = post_smoothing
+        self.coarse_iterations = coarse_iterations
+        self.omega = SMOOTHERS[smoother] if omega is None else omega
+        self.min_resolution = min_resolution
+        self.max_levels = max_levels
+        self.krylov = krylov
+        self.gradient_accuracy = accuracy if gradient_accuracy == 'same' else gradient_accuracy
+        self.max_gradient_iterations = max_iterations if max_gradient_iterations == 'same' else max_gradient_iterations
+        self.autodiff = autodiff
+
+    def solve(self, divergence, domain, guess):
+        assert isinstance(domain, PoissonDomain)
+        levels = multigrid_levels(domain, min_resolution=self.min_resolution, max_levels=self.max_levels)
+
+        if self.autodiff:
+            return self._solve_forward(divergence, levels, guess, self.accuracy, self.max_iterations, back_prop=True)
+
+        def pressure_gradient(op, grad):
+            return self._solve_forward(grad, levels, None, self.gradient_accuracy, self.max_gradient_iterations)[0]
+
+        return math.with_custom_gradient(self._solve_forward,
+                                         [divergence, levels, guess, self.accuracy, self.max_iterations],
+                                         pressure_gradient,
+                                         input_index=0, output_index=0,
+                                         name_base='multigrid_solve')
+
+    def _solve_forward(self, divergence, levels, guess, accuracy, max_iterations, back_prop=False):
+        if self.krylov:
+            apply_M_inv = multigrid_preconditioner(levels, 1, self.cycle, self.smoother, self.pre_smoothing, self.coarse_iterations, self.omega)
+            return preconditioned_conjugate_gradient(divergence, levels[0].apply_A, apply_M_inv, guess, accuracy, max_iterations, back_prop=back_prop)
+
+        non_batch_dims = tuple(range(1, len(divergence.shape)))
+
+        def loop_condition(_pressure, residual, _i):
+            return math.max(math.abs(residual)) >= accuracy
+
+        def loop_body(pressure, residual, iterations):
+            active = _active_examples(residual, accuracy, non_batch_dims)  # converged examples are not updated anymore
+            new_pressure = multigrid_cycle(levels, divergence, pressure, self.cycle, self.smoother, self.pre_smoothing, self.post_smoothing, self.coarse_iterations, self.omega)
+            pressure = active * new_pressure + (1 - active) * pressure
+            return [pressure, divergence - levels[0].apply_A(pressure), iterations + _count(active, non_batch_dims)]
+
+        if guess is None:
+            pressure, residual = math.zeros_like(divergence), divergence
+        else:
+            pressure = guess
+            residual = divergence - levels[0].apply_A(pressure)
+        pressure, _residual, iterations = math.while_loop(loop_condition, loop_body, [pressure, residual, _zero_iterations(divergence, non_batch_dims)],
+                                                          back_prop=back_prop, name='multigrid_loop',
+                                                          maximum_iterations=max_iterations)
+        return pressure, iterations
+
+
+SMOOTHERS = {'jacobi': 2. / 3, 'gauss-seidel': 1.}  # smoother name -> default relaxation factor
+
+
+class MultigridLevel(object):
+
+    def __init__(self, domain, dirichlet_distance=1.):
+        """
+        One grid of a multigrid hierarchy.
+        Holds the masks and stencil weights required to apply the Laplace operator and smoothers on this grid.
+
+        :param domain: PoissonDomain of this level
+        :type domain: PoissonDomain
+        :param dirichlet_distance: distance between open boundaries (where the pressure is zero) and the outermost cell centers, in cells of this level.
+            The fine grid places the boundary one cell outside the domain. On coarse levels it lies closer to the outermost cells.
+            The stencil weight towards the boundary is scaled by its inverse.
+        """
+        assert isinstance(domain, PoissonDomain)
+        self.domain = domain
+        self.extrapolation = Material.extrapolation_mode(domain.domain.boundaries)
+        self.pad_mode = _pad_mode(self.extrapolation)
+        self.closed = not struct.any(Material.open(domain.domain.boundaries))
+        self.fluid_mask = domain.accessible_tensor(extend=1)
+        if dirichlet_distance != 1:
+            padded_ones = CenteredGrid(math.ones_like(domain.accessible.data), extrapolation=self.extrapolation).padded(1).data
+            self.fluid_mask = self.fluid_mask * (1 + (1. / dirichlet_distance - 1) * (1 - padded_ones))
+        self.diagonal = geometric_laplace_diagonal(self.fluid_mask)
+        self.accessible = domain.accessible_tensor(extend=0)
+        self.red = (np.sum(np.indices(self.resolution), 0) % 2 == 0).astype(np.float32)[np.newaxis, ..., np.newaxis]
+        self.black = 1 - self.red
+
+    @property
+    def resolution(self):
+        return self.domain.domain.resolution
+
+    def apply_A(self, pressure):
+        return geometric_laplace(pressure, self.fluid_mask, self.extrapolation)
+
+    def smooth(self, pressure, rhs, iterations, smoother='jacobi', omega=2. / 3, reverse=False):
+        """
+    Applies `iterations` steps of the given smoother, see `jacobi` and `red_black_gauss_seidel`.
+        """
+        if smoother == 'jacobi':
+            return self.jacobi(pressure, rhs, iterations, omega)
+        elif smoother == 'gauss-seidel':
+            return self.red_black_gauss_seidel(pressure, rhs, iterations, omega, reverse)
+        else:
+            raise ValueError('Unknown smoother: %s' % smoother)
+
+    def jacobi(self, pressure, rhs, iterations, omega=2. / 3):
+        """
+    Performs weighted Jacobi iterations, x ← x + ω D^-1 (b - Ax).
+        :param pressure: initial guess or None to start from zero
+        :param rhs: right-hand side b
+        :param iterations: number of iterations
+        :param omega: relaxation factor
+        :return: smoothed pressure
+        """
+        for _ in range(iterations):
+            if pressure is None:
+                pressure = omega * rhs / self.diagonal
+            else:
+                pressure = pressure + omega * (rhs - self.apply_A(pressure)) / self.diagonal
+        return pressure
+
+    def red_black_gauss_seidel(self, pressure, rhs, iterations, omega=1., reverse=False):
+        """
+    Performs Gauss-Seidel iterations, updating all cells of one color of a checkerboard pattern at once.
+    As the Laplace stencil only couples cells of different color, this is equivalent to lexicographic Gauss-Seidel with a different ordering.
+        :param pressure: initial guess or None to start from zero
+        :param rhs: right-hand side b
+        :param iterations: number of iterations, each updating both colors
+        :param omega: relaxation factor, values above 1 result in successive over-relaxation (SOR)
+        :param reverse: if True, updates black cells before red cells. Used in post-smoothing to keep multigrid cycles symmetric.
+        :return: smoothed pressure
+        """
+        colors = (self.black, self.red) if reverse else (self.red, self.black)
+        for _ in range(iterations):
+            for color in colors:
+                if pressure is None:
+                    pressure = color * omega * rhs / self.diagonal
+                else:
+                    pressure = pressure + color * omega * (rhs - self.apply_A(pressure)) / self.diagonal
+        return pressure
+
+    def __repr__(self):
+        return 'MultigridLevel(%s)' % ('x'.join(str(r) for r in self.resolution),)
+
+
+def coarsened(domain):
+    """
+Creates a PoissonDomain with half the resolution, downsampling the active and accessible masks.
+Odd dimensions are rounded up.
+    :param domain: PoissonDomain
+    :return: PoissonDomain
+    """
+    resolution = (domain.domain.resolution + 1) // 2
+    coarse_domain = Domain(resolution, boundaries=domain.domain.boundaries, box=domain.domain.box)
+    active = CenteredGrid(math.downsample2x(domain.active.data), box=coarse_domain.box, extrapolation=domain.active.extrapolation)
+    accessible = CenteredGrid(math.downsample2x(domain.accessible.data), box=coarse_domain.box, extrapolation=domain.accessible.extrapolation)
+    return PoissonDomain(coarse_domain, active=active, accessible=accessible)
+
+
+def multigrid_levels(domain, min_resolution=4, max_levels=None):
+    """
+Builds the grid hierarchy for a multigrid method by successively coarsening the domain.
+Coarsening stops once any dimension would drop below `min_resolution` or `max_levels` is reached.
+    :param domain: finest PoissonDomain
+    :param min_resolution: minimum number of cells along any axis
+    :param max_levels: maximum number of levels including the finest or None
+    :return: list of MultigridLevel, finest first
+    """
+    levels = [MultigridLevel(domain)]
+    while max_levels is None or len(levels) < max_levels:
+        resolution = levels[-1].resolution
+        if np.any((resolution + 1) // 2 < min_resolution):
+            break
+        # the fine-grid boundary is half a fine cell outside the domain, i.e. (1 + 2^-level) / 2 cells from the outermost cell centers on a coarse level
+        levels.append(MultigridLevel(coarsened(levels[-1].domain), dirichlet_distance=(1 + 0.5 ** len(levels)) / 2))
+    return levels
+
+
+def restrict(residual, coarse_resolution, pad_mode='replicate'):
+    """
+Transfers a residual to the next coarser grid using the transpose of the linear interpolation in `prolong`.
+This keeps the multigrid cycle symmetric as required for preconditioning conjugate gradient.
+As all levels use the unit-spacing Laplace stencil, the result is scaled by 4 / 2^rank to account for the doubled cell size.
+    :param residual: tensor on the fine grid
+    :param coarse_resolution: resolution of the coarse grid, i.e. fine resolution / 2 rounded up
+    :param pad_mode: padding mode of the pressure as passed to `prolong`
+    """
+    rank = math.spatial_rank(residual)
+    fine_resolution = residual.shape[1:-1]
+    residual = math.pad(residual, [[0, 0]] + [[0, 2 * int(c) - int(f)] for c, f in zip(coarse_resolution, fine_resolution)] + [[0, 0]], 'constant')
+    residual = math.pad(residual, [[0, 0]] + [[1, 1]] * rank + [[0, 0]], pad_mode)
+    for axis, coarse in enumerate(coarse_resolution):
+        def shifted(offset):
+            return residual[(slice(None),) * (axis + 1) + (slice(offset, offset + 2 * int(coarse), 2),)]
+        residual = 0.25 * shifted(0) + 0.75 * shifted(1) + 0.75 * shifted(2) + 0.25 * shifted(3)
+    return residual if rank == 2 else residual * (4. / 2 ** rank)
+
+
+def prolong(correction, fine_resolution, pad_mode='replicate'):
+    """
+Interpolates a coarse-grid correction linearly to the next finer grid, cropping the result to odd fine resolutions.
+Unlike `math.upsample2x`, the boundary values are extrapolated according to `pad_mode` so that corrections vanish towards open boundaries.
+    :param correction: tensor on the coarse grid
+    :param fine_resolution: resolution of the fine grid
+    :param pad_mode: padding mode of the pressure, e.g. 'constant' for open, 'replicate' for closed and 'circular' for periodic boundaries
+    """
+    rank = math.spatial_rank(correction)
+    correction = math.pad(correction, [[0, 0]] + [[1, 1]] * rank + [[0, 0]], pad_mode)
+    for axis in range(rank):
+        def shifted(offset):
+            return correction[(slice(None),) * (axis + 1) + (slice(offset, offset + int(correction.shape[axis + 1]) - 2),)]
+        lower, center, upper = shifted(0), shifted(1), shifted(2)
+        interleaved = math.stack([0.25 * lower + 0.75 * center, 0.75 * center + 0.25 * upper], axis=axis + 2)
+        shape = list(center.shape)
+        shape[axis + 1] *= 2
+        correction = math.reshape(interleaved, [-1] + [int(dim) for dim in shape[1:]])
+    return correction[(slice(None),) + tuple(slice(0, int(r)) for r in fine_resolution) + (slice(None),)]
+
+
+def multigrid_preconditioner(levels, cycles=1, cycle='V', smoother='jacobi', smoothing=2, coarse_iterations=32, omega=None):
+    """
+Creates a function that approximately solves the Poisson equation for a residual using multigrid cycles starting from zero.
+The function is a symmetric operator as required for preconditioning conjugate gradient.
+    :param levels: list of MultigridLevel as created by `multigrid_levels`
+    :param cycles: number of multigrid cycles per application
+    :param smoothing: number of pre- and post-smoothing iterations
+    :param coarse_iterations: number of smoothing iterations on the coarsest grid, must be even for Gauss-Seidel
+    :param omega: relaxation factor of the smoother or None for the default
+    :return: function mapping a residual to an approximate solution
+    """
+    omega = SMOOTHERS[smoother] if omega is None else omega
+    closed = levels[0].closed
+
+    def apply(residual):
+        if closed:
+            residual = _remove_mean(residual)
+        pressure = None
+        for _ in range(cycles):
+            pressure = multigrid_cycle(levels, residual, pressure, cycle, smoother, smoothing, smoothing, coarse_iterations, omega)
+        return _remove_mean(pressure) if closed else pressure
+    return apply
+
+
+def _remove_mean(tensor):
+    # Without open boundaries, the pressure is only determined up to a constant. Projecting out the constant keeps CG stable in single precision.
+    return tensor - math.mean(tensor, axis=tuple(range(1, math.ndims(tensor) - 1)), keepdims=True)
+
+
+def multigrid_cycle(levels, rhs, pressure=None, cycle='V', smoother='jacobi', pre_smoothing=2, post_smoothing=2, coarse_iterations=32, omega=2. / 3, level=0):
+    """
+Performs one multigrid cycle.
+The cycle is a symmetric operator if pre_smoothing == post_smoothing and coarse_iterations is even.
+    :param levels: list of MultigridLevel as created by `multigrid_levels`
+    :param rhs: right-hand side on the grid of `levels[level]`
+    :param pressure: initial guess or None to start from zero
+    :param cycle: 'V' or 'W'
+    :param smoother: 'jacobi' or 'gauss-seidel'
+    :param coarse_iterations: number of smoothing iterations on the coarsest grid
+    :return: improved pressure
+    """
+    grid = levels[level]
+    if level == len(levels) - 1:
+        if grid.closed:
+            rhs = _remove_mean(rhs)
+        pressure = grid.smooth(pressure, rhs, coarse_iterations // 2, smoother, omega)
+        pressure = grid.smooth(pressure, rhs, coarse_iterations - coarse_iterations // 2, smoother, omega, reverse=True)
+        return _remove_mean(pressure) if grid.closed else pressure
+    pressure = grid.smooth(pressure, rhs, pre_smoothing, smoother, omega)
+    residual = rhs if pressure is None else rhs - grid.apply_A(pressure)
+    # Obstacle cells are decoupled from the fluid and solved by the smoother. Masking keeps their residual from polluting the coarse grids.
+    coarse_rhs = restrict(residual * grid.accessible, levels[level + 1].resolution, grid.pad_mode)
+    correction = None
+    for _ in range(1 if cycle == 'V' else 2):
+        correction = multigrid_cycle(levels, coarse_rhs, correction, cycle, smoother, pre_smoothing, post_smoothing, coarse_iterations, omega, level + 1)
+    correction = prolong(correction, grid.resolution, grid.pad_mode) * grid.accessible
+    pressure = correction if pressure is None else pressure + correction
+    return grid.smooth(pressure, rhs, post_smoothing, smoother, omega, reverse=True)
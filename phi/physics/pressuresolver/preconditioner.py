@@ -0,0 +1,147 @@
+import numpy as np
+import scipy.sparse.linalg
+
+from phi import math
+from phi.physics.material import Material
+from .geom import geometric_laplace_diagonal
+from .multigrid import multigrid_levels, multigrid_preconditioner
+from .solver_api import PoissonDomain
+from .sparse import PRESSURE_MATRIX_CACHE, geometry_key, pin_singular_regions, closed_region_labels
+
+
+class Preconditioner(object):
+    """
+    Base class for preconditioners that can be passed to iterative solvers such as SparseCG and GeometricCG.
+
+    A preconditioner approximates the inverse of the Laplace operator.
+    It must be symmetric and, like the Laplace operator, negative definite.
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def build(self, domain):
+        """
+        Prepares the preconditioner for the geometry of the given domain.
+
+        :param domain: PoissonDomain specifying boundary conditions and active/accessible masks
+        :return: function mapping a residual of shape (batch size, spatial dimensions..., 1) to an approximate solution of the Poisson equation
+        """
+        raise NotImplementedError(self)
+
+    def __repr__(self):
+        return self.name
+
+
+class JacobiPreconditioner(Preconditioner):
+
+    def __init__(self):
+        """
+        Divides the residual by the diagonal of the Laplace operator.
+        Cheap to apply and backend-independent but only reduces the iteration count moderately.
+        """
+        Preconditioner.__init__(self, 'Jacobi')
+
+    def build(self, domain):
+        assert isinstance(domain, PoissonDomain)
+        diagonal = geometric_laplace_diagonal(domain.accessible_tensor(extend=1))
+        return lambda residual: residual / diagonal
+
+
+class IncompleteCholesky(Preconditioner):
+
+    def __init__(self, drop_tol=1e-4, fill_factor=10, matrix_cache=None):
+        """
+        Incomplete Cholesky (LDLᵀ) factorization of the negated pressure matrix.
+
+        The unit lower factor L and the pivots D are taken from a threshold incomplete LU factorization (scipy.sparse.linalg.spilu)
+        computed with a symmetric fill-reducing ordering P and without pivoting. The upper factor is discarded and the preconditioner
+        applies M⁻¹ = P L⁻ᵀ D⁻¹ L⁻¹ Pᵀ which is symmetric by construction, as required by preconditioned CG.
+        Only available with NumPy masks. The factorization of the last geometry is kept and reused in subsequent solves.
+
+        :param drop_tol: drop tolerance for the incomplete factorization, smaller values produce more accurate but denser factors
+        :param fill_factor: upper bound on the ratio of nonzeros in the factors to the nonzeros in the matrix
+        :param matrix_cache: SparseMatrixCache to obtain the pressure matrix from, defaults to PRESSURE_MATRIX_CACHE
+        """
+        Preconditioner.__init__(self, 'Incomplete Cholesky')
+        self.drop_tol = drop_tol
+        self.fill_factor = fill_factor
+        self.matrix_cache = matrix_cache
+        self._factorization = None, None
+
+    def build(self, domain):
+        assert isinstance(domain, PoissonDomain)
+        active_mask, fluid_mask = domain.active_tensor(extend=1), domain.accessible_tensor(extend=1)
+        assert math.choose_backend([active_mask, fluid_mask]).matches_name('SciPy'), 'IncompleteCholesky requires NumPy masks'
+        dimensions = domain.domain.resolution
+        periodic = Material.periodic(domain.domain.boundaries)
+        key = geometry_key(dimensions, active_mask, fluid_mask, periodic)
+        if self._factorization[0] != key:
+            matrix_cache = self.matrix_cache if self.matrix_cache is not None else PRESSURE_MATRIX_CACHE
+            A = matrix_cache.pressure_matrix(dimensions, active_mask, fluid_mask, periodic)
+            ilu = scipy.sparse.linalg.spilu(-pin_singular_regions(A), drop_tol=self.drop_tol, fill_factor=self.fill_factor,
+                                            permc_spec='MMD_AT_PLUS_A', diag_pivot_thresh=0., options=dict(SymmetricMode=True))
+            self._factorization = key, (_ldl_factors(ilu), closed_region_labels(A))
+        (L, inverse_pivots, permutation), (labels, region_count) = self._factorization[1]
+
+        def remove_constant(vec):
+            # Pinning makes the factorization add an arbitrary constant per closed region which slows down convergence.
+            if region_count == 0:
+                return vec
+            closed = labels >= 0
+            counts = np.bincount(labels[closed], minlength=region_count)
+            means = np.stack([np.bincount(labels[closed], weights=column[closed], minlength=region_count) / counts for column in vec.T], -1)
+            vec = vec.copy()
+            vec[closed] -= means[labels[closed]]
+            return vec
+
+        def apply(residual):
+            residual_vec = np.transpose(np.reshape(residual, [-1, L.shape[0]])).astype(np.float64)
+            permuted = np.empty_like(residual_vec)
+            permuted[permutation] = remove_constant(residual_vec)  # Pᵀ r
+            z = L.solve(L.solve(permuted) * inverse_pivots, trans='T')[permutation]  # P L⁻ᵀ D⁻¹ L⁻¹ Pᵀ r
+            z = -remove_constant(z)
+            return np.reshape(np.transpose(z), np.shape(residual)).astype(residual.dtype)
+        return apply
+
+
+def _ldl_factors(ilu):
+    """
+Extracts a symmetric LDLᵀ factorization from an incomplete LU factorization computed with a symmetric ordering.
+    :param ilu: scipy.sparse.linalg.SuperLU returned by spilu
+    :return: SuperLU solving with the unit lower factor L, inverse pivots 1/D, column permutation
+    """
+    pivots = np.abs(ilu.U.diagonal())  # positive for the negated pressure matrix, abs keeps M definite if dropping produced a negative pivot
+    inverse_pivots = np.where(pivots > 0, 1 / np.where(pivots > 0, pivots, 1), 1)[:, np.newaxis]
+    L = scipy.sparse.linalg.splu(scipy.sparse.csc_matrix(ilu.L), permc_spec='NATURAL', diag_pivot_thresh=0., options=dict(SymmetricMode=True))
+    return L, inverse_pivots, ilu.perm_c
+
+
+class MultigridPreconditioner(Preconditioner):
+
+    def __init__(self, cycles=1, smoothing=2, coarse_iterations=32, min_resolution=4, cycle='V', smoother='jacobi'):
+        """
+        Geometric multigrid preconditioner performing symmetric multigrid cycles, see `MultigridSolver`.
+
+        The iteration count of preconditioned CG becomes nearly independent of the resolution.
+        This preconditioner is backend-independent and supports batches with varying obstacles.
+
+        :param cycles: number of multigrid cycles per application
+        :param smoothing: number of pre- and post-smoothing iterations (equal to keep the preconditioner symmetric)
+        :param coarse_iterations: number of smoothing iterations on the coarsest grid, must be even for Gauss-Seidel
+        :param min_resolution: coarsening stops before any dimension drops below this number of cells
+        :param cycle: 'V' or 'W'
+        :param smoother: 'jacobi' or 'gauss-seidel'
+        """
+        Preconditioner.__init__(self, 'Multigrid %s-cycle' % cycle)
+        self.cycles = cycles
+        self.smoothing = smoothing
+        self.coarse_iterations = coarse_iterations
+        self.min_resolution = min_resolution
+        self.cycle = cycle
+        self.smoother = smoother
+
+    def build(self, domain):
+        assert isinstance(domain, PoissonDomain)
+        levels = multigrid_levels(domain, min_resolution=self.min_resolution)
+        return multigrid_preconditioner(levels, self.cycles, self.cycle, self.smoother, self.smoothing, self.coarse_iterations)
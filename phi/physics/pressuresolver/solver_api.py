@@ -28,7 +28,8 @@ class PoissonSolver(object):
         :param field: scalar input field to the solve, e.g. the divergence of the velocity channel, ∇·v
         :param domain: DomainState object specifying boundary conditions and active/fluid masks. The domain must be equal for all examples (batch dimension equal to 1).
         :param guess: (Optional) Pressure channel which can be used as an initial state for the solver
-        :return: pressure tensor (same shape as divergence tensor), number of iterations (integer, 1D integer tensor or None if unknown)
+        :return: pressure tensor (same shape as divergence tensor), number of iterations (integer, 1D integer tensor or None if unknown).
+            Iterative solvers return one count per example, shaped (batch size,). Use `math.max(iterations)` for the total number of loop iterations.
         """
         raise NotImplementedError(self.__class__)
 
@@ -136,8 +137,8 @@ Solves the Poisson equation Δp = input_field for p.
     :param poisson_domain: PoissonDomain instance
     :param solver: PoissonSolver to use, None for default
     :param guess: CenteredGrid with same size and resolution as input_field
-    :return: p as CenteredGrid, iteration count as int or None if not available
-    :rtype: CenteredGrid, int
+    :return: p as CenteredGrid, iteration count as int, per-example iteration counts of shape (batch size,) for iterative solvers or None if not available
+    :rtype: CenteredGrid, int or ndarray
     """
     assert isinstance(input_field, CenteredGrid)
     if guess is not None:
@@ -148,11 +149,11 @@ Solves the Poisson equation Δp = input_field for p.
         poisson_domain = PoissonDomain(poisson_domain)
     if solver is None:
         from .sparse import SparseSciPy, SparseCG
+        from .fourier import FourierSolver
         if math.choose_backend([input_field.data, poisson_domain.active.data, poisson_domain.accessible.data]).matches_name('SciPy'):
-            solver = SparseSciPy()
+            solver = FourierSolver(fallback=SparseSciPy())
         else:
-            from phi.physics.pressuresolver.fourier import FourierSolver
-            solver = FourierSolver() & SparseCG()
+            solver = FourierSolver(fallback=SparseCG())
     pressure, iteration = solver.solve(input_field.data, poisson_domain, guess=guess)
     pressure = CenteredGrid(pressure, input_field.box, extrapolation=input_field.extrapolation, name='pressure')
     return pressure, iteration
@@ -1,45 +1,227 @@
+import hashlib
+from collections import OrderedDict
+
 import numpy as np
 import scipy
 import scipy.sparse
+import scipy.sparse.csgraph
 import scipy.sparse.linalg
 
 from phi import math
-from phi.math.blas import conjugate_gradient
+from phi.backend.buffer_pool import ping_pong, scratch
+from phi.math.blas import conjugate_gradient, preconditioned_conjugate_gradient
 from phi.math.helper import _dim_shifted
 from phi.physics.material import Material
 from phi.struct.tensorop import collapsed_gather_nd
 from .solver_api import PoissonSolver, FluidDomain
 
 
+class SparseMatrixCache(object):
+
+    def __init__(self, max_size=2):
+        """
+        Least-recently-used cache for Laplace matrices assembled by `sparse_pressure_matrix`, their LU factorizations and index arrays created by `sparse_indices`.
+
+        Matrices are keyed on the resolution, the periodicity and a fingerprint of the active and accessible masks.
+        As long as obstacles and boundaries do not change between time steps, the matrix is only assembled once.
+        With moving obstacles, the fingerprint changes every step, so the cache is kept small by default to avoid holding on to stale matrices and factorizations.
+
+        Call `clear()` to explicitly invalidate all cached matrices.
+
+        :param max_size: maximum number of matrices (and factorizations) to keep. The least recently used entry is discarded first.
+            Increase this when alternately solving on more than two geometries, e.g. for several simulations with static obstacles.
+        """
+        assert max_size is None or max_size > 0, 'invalid max_size: %s' % max_size
+        self.max_size = max_size
+        self._matrices = OrderedDict()
+        self._factorizations = OrderedDict()
+        self._indices = OrderedDict()
+
+    def pressure_matrix(self, dimensions, extended_active_mask, extended_fluid_mask, periodic=False):
+        """
+    Returns the cached matrix for the given geometry and the active floating point precision or assembles it using `sparse_pressure_matrix`.
+    All masks must be NumPy arrays. See `sparse_pressure_matrix` for a description of the parameters.
+        """
+        key = geometry_key(dimensions, extended_active_mask, extended_fluid_mask, periodic) + (np.dtype(math.precision().float_type).str,)
+        if key in self._matrices:
+            self._matrices[key] = matrix = self._matrices.pop(key)  # mark as most recently used
+            return matrix
+        matrix = sparse_pressure_matrix(dimensions, extended_active_mask, extended_fluid_mask, periodic)
+        self._put(self._matrices, key, matrix)
+        return matrix
+
+    def factorization(self, dimensions, extended_active_mask, extended_fluid_mask, periodic=False):
+        """
+    Returns the cached LU factorization of the pressure matrix for the given geometry, computing it if necessary.
+    The factorization is computed in double precision using scipy.sparse.linalg.splu.
+        :return: scipy.sparse.linalg.SuperLU
+        """
+        key = geometry_key(dimensions, extended_active_mask, extended_fluid_mask, periodic)
+        if key in self._factorizations:
+            self._factorizations[key] = factorization = self._factorizations.pop(key)
+            return factorization
+        A = self.pressure_matrix(dimensions, extended_active_mask, extended_fluid_mask, periodic)
+        factorization = scipy.sparse.linalg.splu(pin_singular_regions(A))
+        self._put(self._factorizations, key, factorization)
+        return factorization
+
+    def sparse_indices(self, dimensions, periodic=False):
+        """
+    Returns the cached result of `sparse_indices`.
+    The indices only depend on the resolution and periodicity, not on the masks.
+        """
+        key = (tuple(int(dim) for dim in dimensions), repr(periodic))
+        if key in self._indices:
+            self._indices[key] = indices = self._indices.pop(key)
+            return indices
+        indices = sparse_indices(dimensions, periodic)
+        self._put(self._indices, key, indices)
+        return indices
+
+    def _put(self, entries, key, value):
+        entries[key] = value
+        while self.max_size is not None and len(entries) > self.max_size:
+            entries.popitem(last=False)
+
+    def clear(self):
+        """ Removes all cached matrices, factorizations and indices. Call this after changing geometry in-place. """
+        self._matrices.clear()
+        self._factorizations.clear()
+        self._indices.clear()
+
+    def __len__(self):
+        return len(self._matrices)
+
+    def __repr__(self):
+        return 'SparseMatrixCache(%d/%s matrices)' % (len(self._matrices), self.max_size)
+
+
+PRESSURE_MATRIX_CACHE = SparseMatrixCache()
+
+
+def pin_singular_regions(A, tolerance=1e-6):
+    """
+Makes a pressure matrix invertible by fixing the pressure of one cell in every closed region.
+Regions without open boundaries (pure Neumann or periodic) only determine the pressure up to a constant.
+For consistent right-hand sides (zero divergence sum per region), the solution of the modified system is a valid solution of the original one.
+    :param A: pressure matrix as built by `sparse_pressure_matrix`
+    :return: CSC matrix of type float64
+    """
+    A = scipy.sparse.csc_matrix(A, dtype=np.float64)
+    labels, region_count = closed_region_labels(A, tolerance)
+    if region_count == 0:
+        return A
+    _labels, first_cells = np.unique(labels, return_index=True)
+    pinned = np.zeros(A.shape[0])
+    pinned[first_cells[_labels >= 0]] = -1
+    return scipy.sparse.csc_matrix(A + scipy.sparse.diags(pinned))
+
+
+def closed_region_labels(A, tolerance=1e-6):
+    """
+Finds the connected regions of a pressure matrix that have no open boundary, i.e. in which the pressure is only determined up to a constant.
+    :param A: pressure matrix as built by `sparse_pressure_matrix`
+    :return: labels (int array assigning each cell its closed region index or -1), number of closed regions
+    """
+    _region_count, regions = scipy.sparse.csgraph.connected_components(A, directed=False)
+    open_cells = np.abs(np.asarray(A.sum(axis=1)).ravel()) > tolerance * np.abs(A.diagonal())
+    closed_regions = np.setdiff1d(regions, regions[open_cells])
+    labels = np.full(A.shape[0], -1, dtype=np.int64)
+    is_closed = np.isin(regions, closed_regions)
+    labels[is_closed] = np.searchsorted(closed_regions, regions[is_closed])
+    return labels, len(closed_regions)
+
+
+def geometry_key(dimensions, extended_active_mask, extended_fluid_mask, periodic):
+    """
+Computes a hashable key identifying the pressure matrix of a geometry, used by `SparseMatrixCache`.
+All masks must be NumPy arrays. See `sparse_pressure_matrix` for a description of the parameters.
+    :return: tuple
+    """
+    return tuple(int(dim) for dim in dimensions), repr(periodic), mask_fingerprint(extended_active_mask), mask_fingerprint(extended_fluid_mask)
+
+
+def mask_fingerprint(mask):
+    """
+Computes a hash of the shape, data type and content of a NumPy mask.
+    :param mask: NumPy array
+    :return: str
+    """
+    mask = np.ascontiguousarray(mask)
+    digest = hashlib.sha1(mask.view(np.uint8)).hexdigest()
+    return '%s%s:%s' % (mask.dtype.str, mask.shape, digest)
+
+
 class SparseSciPy(PoissonSolver):
 
-    def __init__(self):
+    def __init__(self, matrix_cache=PRESSURE_MATRIX_CACHE):
         """
         The SciPy solver uses the function scipy.sparse.linalg.spsolve to determine the pressure.
         It does not support initial guesses for the pressure and does not keep track of a loop counter.
+
+        :param matrix_cache: SparseMatrixCache used to reuse Laplace matrices between solves or None to assemble the matrix on every call
         """
         PoissonSolver.__init__(self, 'SciPy sparse solver', supported_devices=('CPU',), supports_guess=False, supports_loop_counter=False, supports_continuous_masks=True)
+        self.matrix_cache = matrix_cache
 
     def solve(self, field, domain, guess):
         assert isinstance(domain, FluidDomain)
         dimensions = list(field.shape[1:-1])
-        A = sparse_pressure_matrix(dimensions, domain.active_tensor(extend=1), domain.accessible_tensor(extend=1), Material.periodic(domain.domain.boundaries))
+        A = _pressure_matrix(self.matrix_cache, dimensions, domain.active_tensor(extend=1), domain.accessible_tensor(extend=1), Material.periodic(domain.domain.boundaries))
+        float_type = math.precision().float_type
 
         def np_solve_p(div):
             div_vec = div.reshape([-1, A.shape[0]])
             pressure = [scipy.sparse.linalg.spsolve(A, div_vec[i, ...]) for i in range(div_vec.shape[0])]
-            return np.array(pressure).reshape(div.shape).astype(np.float32)
+            return np.array(pressure).reshape(div.shape).astype(float_type)
+
+        def np_solve_p_gradient(op, grad_in):
+            return math.py_func(np_solve_p, [grad_in], float_type, field.shape)
+
+        pressure = math.py_func(np_solve_p, [field], float_type, field.shape, grad=np_solve_p_gradient)
+        return pressure, None
+
+
+class SparseLU(PoissonSolver):
+
+    def __init__(self, matrix_cache=PRESSURE_MATRIX_CACHE):
+        """
+        Direct solver that computes a sparse LU factorization of the pressure matrix using scipy.sparse.linalg.splu.
+
+        The factorization is stored in the matrix cache so that it is only computed when the geometry changes.
+        Subsequent solves only perform the forward and backward substitution for all examples of the batch in one call.
+        This is the fastest option for 2D simulations with static obstacles on the CPU.
+
+        :param matrix_cache: SparseMatrixCache holding the factorizations or None to factorize the matrix on every call
+        """
+        PoissonSolver.__init__(self, 'SciPy sparse LU solver', supported_devices=('CPU',), supports_guess=False, supports_loop_counter=False, supports_continuous_masks=True)
+        self.matrix_cache = matrix_cache
+
+    def solve(self, field, domain, guess):
+        assert isinstance(domain, FluidDomain)
+        dimensions = list(field.shape[1:-1])
+        active_mask, fluid_mask, periodic = domain.active_tensor(extend=1), domain.accessible_tensor(extend=1), Material.periodic(domain.domain.boundaries)
+        if self.matrix_cache is not None:
+            lu = self.matrix_cache.factorization(dimensions, active_mask, fluid_mask, periodic)
+        else:
+            lu = SparseMatrixCache(max_size=1).factorization(dimensions, active_mask, fluid_mask, periodic)
+        float_type = math.precision().float_type
+
+        def np_solve_p(div, trans='N'):
+            div_vec = div.reshape([-1, lu.shape[0]])
+            pressure = lu.solve(np.transpose(div_vec).astype(np.float64), trans=trans)
+            return np.transpose(pressure).reshape(div.shape).astype(float_type)
 
         def np_solve_p_gradient(op, grad_in):
-            return math.py_func(np_solve_p, [grad_in], np.float32, field.shape)
+            return math.py_func(lambda grad: np_solve_p(grad, trans='T'), [grad_in], float_type, field.shape)
 
-        pressure = math.py_func(np_solve_p, [field], np.float32, field.shape, grad=np_solve_p_gradient)
+        pressure = math.py_func(np_solve_p, [field], float_type, field.shape, grad=np_solve_p_gradient)
         return pressure, None
 
 
 class SparseCG(PoissonSolver):
 
-    def __init__(self, accuracy=1e-5, gradient_accuracy='same', max_iterations=2000, max_gradient_iterations='same', autodiff=False):
+    def __init__(self, accuracy=1e-5, gradient_accuracy='same', max_iterations=2000, max_gradient_iterations='same', autodiff=False, matrix_cache=PRESSURE_MATRIX_CACHE, preconditioner=None, matrix_free=False):
         """
         Conjugate gradient solver using sparse matrix multiplications.
 
@@ -53,6 +235,12 @@ class SparseCG(PoissonSolver):
             The intermediate results of each loop iteration will be permanently stored if backpropagation is used.
             If False, replaces autodiff by a forward pressure solve in reverse accumulation backpropagation.
             This requires less memory but is only accurate if the solution is fully converged.
+        :param matrix_cache: SparseMatrixCache used to reuse Laplace matrices between solves or None to assemble the matrix on every call.
+            With non-NumPy masks, only the sparse indices are cached.
+        :param preconditioner: (optional) Preconditioner, e.g. JacobiPreconditioner, IncompleteCholesky or MultigridPreconditioner.
+            If given, the preconditioned conjugate gradient algorithm is used.
+        :param matrix_free: if True, NumPy solves apply the Laplace stencil directly to the pressure grid using a LaplaceStencil instead of assembling a sparse matrix.
+            This processes the whole batch at once and only stores one coefficient array per stencil direction.
         """
         PoissonSolver.__init__(self, 'Sparse Conjugate Gradient', supported_devices=('CPU', 'GPU'), supports_guess=True, supports_loop_counter=True, supports_continuous_masks=True)
         assert math.is_scalar(accuracy), 'invalid accuracy: %s' % accuracy
@@ -69,6 +257,9 @@ class SparseCG(PoissonSolver):
             self.max_gradient_iterations = max_gradient_iterations
             assert not autodiff, 'Cannot specify max_gradient_iterations when autodiff=True'
         self.autodiff = autodiff
+        self.matrix_cache = matrix_cache
+        self.preconditioner = preconditioner
+        self.matrix_free = matrix_free
 
     def solve(self, field, domain, guess):
         assert isinstance(domain, FluidDomain)
@@ -78,97 +269,194 @@ class SparseCG(PoissonSolver):
         N = int(np.prod(dimensions))
         periodic = Material.periodic(domain.domain.boundaries)
 
-        if math.choose_backend([field, active_mask, fluid_mask]).matches_name('SciPy'):
-            A = sparse_pressure_matrix(dimensions, active_mask, fluid_mask, periodic)
+        if math.choose_backend([field, active_mask, fluid_mask]).matches_name('SciPy') and self.matrix_free:
+            A = LaplaceStencil(dimensions, active_mask, fluid_mask, periodic)
+        elif math.choose_backend([field, active_mask, fluid_mask]).matches_name('SciPy'):
+            A = _pressure_matrix(self.matrix_cache, dimensions, active_mask, fluid_mask, periodic)
         else:
-            sidx, sorting = sparse_indices(dimensions, periodic)
+            sidx, sorting = sparse_indices(dimensions, periodic) if self.matrix_cache is None else self.matrix_cache.sparse_indices(dimensions, periodic)
             sval_data = sparse_values(dimensions, active_mask, fluid_mask, sorting, periodic)
             backend = math.choose_backend(field)
             sval_data = backend.cast(sval_data, field.dtype)
             A = backend.sparse_tensor(indices=sidx, values=sval_data, shape=[N, N])
+        preconditioner = self.preconditioner.build(domain) if self.preconditioner is not None else None
 
         if self.autodiff:
-            return sparse_cg(field, A, self.max_iterations, guess, self.accuracy, back_prop=True)
+            return sparse_cg(field, A, self.max_iterations, guess, self.accuracy, back_prop=True, preconditioner=preconditioner)
         else:
             def pressure_gradient(op, grad):
-                return sparse_cg(grad, A, max_gradient_iterations, None, self.gradient_accuracy)[0]
+                return sparse_cg(grad, A, max_gradient_iterations, None, self.gradient_accuracy, preconditioner=preconditioner)[0]
 
             pressure, iteration = math.with_custom_gradient(sparse_cg,
-                                                            [field, A, self.max_iterations, guess, self.accuracy],
+                                                            [field, A, self.max_iterations, guess, self.accuracy, False, preconditioner],
                                                             pressure_gradient, input_index=0, output_index=0,
                                                             name_base='scg_pressure_solve')
 
-            max_gradient_iterations = iteration if self.max_gradient_iterations == 'mirror' else self.max_gradient_iterations
+            max_gradient_iterations = math.max(iteration) if self.max_gradient_iterations == 'mirror' else self.max_gradient_iterations
             return pressure, iteration
 
 
-def sparse_cg(field, A, max_iterations, guess, accuracy, back_prop=False):
+def _pressure_matrix(matrix_cache, dimensions, extended_active_mask, extended_fluid_mask, periodic):
+    if matrix_cache is None:
+        return sparse_pressure_matrix(dimensions, extended_active_mask, extended_fluid_mask, periodic)
+    return matrix_cache.pressure_matrix(dimensions, extended_active_mask, extended_fluid_mask, periodic)
+
+
+def sparse_cg(field, A, max_iterations, guess, accuracy, back_prop=False, preconditioner=None):
+    """
+Solves Ap = field for p using (preconditioned) conjugate gradient on flattened tensors.
+    :param A: sparse matrix or LaplaceStencil
+    :param preconditioner: None or function created by `Preconditioner.build()`, operating on tensors shaped like `field`
+    """
     div_vec = math.reshape(field, [-1, int(np.prod(field.shape[1:]))])
     if guess is not None:
         guess = math.reshape(guess, [-1, int(np.prod(field.shape[1:]))])
-    apply_A = lambda pressure: math.matmul(A, pressure)
-    result_vec, iterations = conjugate_gradient(div_vec, apply_A, guess, accuracy, max_iterations, back_prop)
+    apply_A = A if isinstance(A, LaplaceStencil) else lambda pressure: math.matmul(A, pressure)
+    compact = scipy.sparse.issparse(A) or isinstance(A, LaplaceStencil)  # A is shared by all examples, skip the products of converged examples
+    if preconditioner is None:
+        result_vec, iterations = conjugate_gradient(div_vec, apply_A, guess, accuracy, max_iterations, back_prop, compact=compact)
+    else:
+        grid_shape = [-1] + [int(d) for d in field.shape[1:]]
+        apply_M_inv = lambda residual: math.reshape(preconditioner(math.reshape(residual, grid_shape)), math.shape(residual))
+        result_vec, iterations = preconditioned_conjugate_gradient(div_vec, apply_A, apply_M_inv, guess, accuracy, max_iterations, back_prop, compact=compact)
     return math.reshape(result_vec, math.shape(field)), iterations
 
 
-def sparse_pressure_matrix(dimensions, extended_active_mask, extended_fluid_mask, periodic=False):
+class LaplaceStencil(object):
+
+    def __init__(self, dimensions, extended_active_mask, extended_fluid_mask, periodic=False):
+        """
+    Matrix-free equivalent of the pressure matrix built by `sparse_pressure_matrix` for NumPy arrays.
+
+    Instead of storing the matrix, the stencil coefficients are stored on the grid, one array for the diagonal and two per dimension.
+    Calling the stencil applies it to a batch of flattened pressure channels using vectorized slicing without padding.
+    Like the sparse matrix, the stencil is shared by all examples of a batch and its coefficients have the type `math.precision().float_type`.
+
+        :param dimensions: valid simulation dimensions. Pressure channel should be of shape (batch size, dimensions..., 1)
+        :param extended_active_mask: Binary NumPy array with 2 more entries in every dimension than 'dimensions'.
+        :param extended_fluid_mask: Binary NumPy array with 2 more entries in every dimension than 'dimensions'.
+        :param periodic: bool or structure matching Material.periodic(boundaries)
+        """
+        self.dimensions = tuple(int(d) for d in dimensions)
+        self.shape = (int(np.prod(self.dimensions)),) * 2
+        float_type = math.precision().float_type
+        diagonal = np.zeros(self.dimensions, float_type)
+        self.neighbours = []  # (dim, lower coefficients, upper coefficients, lower periodic, upper periodic)
+        for dim in range(len(self.dimensions)):
+            lower_active, self_active, upper_active = _dim_shifted(extended_active_mask, dim, (-1, 0, 1), diminish_others=(1, 1))
+            lower_accessible, upper_accessible = _dim_shifted(extended_fluid_mask, dim, (-1, 1), diminish_others=(1, 1))
+            diagonal -= np.reshape(lower_accessible, self.dimensions)
+            diagonal -= np.reshape(upper_accessible, self.dimensions)
+            lower = np.reshape(lower_active * self_active, self.dimensions).astype(float_type)
+            upper = np.reshape(upper_active * self_active, self.dimensions).astype(float_type)
+            self.neighbours.append((dim, lower, upper, bool(collapsed_gather_nd(periodic, [dim, 0])), bool(collapsed_gather_nd(periodic, [dim, 1]))))
+        self.diagonal = np.minimum(diagonal, -1)  # avoid 0, could lead to NaN
+
+    def __call__(self, vec):
+        """
+    Computes the Laplace of flattened pressure channels.
+
+    While a BufferPool is active, the result is written into a ping-pong buffer owned by the stencil and stays valid until the stencil is applied twice more.
+    This suffices for the conjugate gradient solvers which only keep the latest product.
+        :param vec: NumPy array of shape (batch size, cell count)
+        :return: NumPy array of same shape as vec
+        """
+        x = np.reshape(vec, (-1,) + self.dimensions)
+        dtype = np.result_type(x, self.diagonal)
+        result = np.multiply(x, self.diagonal, out=ping_pong(('LaplaceStencil', 'result'), x.shape, dtype, avoid=x))
+        for dim, lower, upper, lower_periodic, upper_periodic in self.neighbours:
+            _add_product(result, _slice(dim, 0, -1), upper[_slice(dim, 0, -1, batch=False)], x[_slice(dim, 1, None)])
+            _add_product(result, _slice(dim, 1, None), lower[_slice(dim, 1, None, batch=False)], x[_slice(dim, 0, -1)])
+            if upper_periodic:
+                _add_product(result, _slice(dim, -1, None), upper[_slice(dim, -1, None, batch=False)], x[_slice(dim, 0, 1)])
+            if lower_periodic:
+                _add_product(result, _slice(dim, 0, 1), lower[_slice(dim, 0, 1, batch=False)], x[_slice(dim, -1, None)])
+        return np.reshape(result, np.shape(vec))
+
+
+def _add_product(result, index, coefficients, values):
+    """ Adds coefficients * values to result[index], computing the product in a scratch buffer of the active BufferPool. """
+    target = result[index]
+    target += np.multiply(coefficients, values, out=scratch(('LaplaceStencil', 'product'), target.shape, target.dtype))
+
+
+def _slice(dim, start, stop, batch=True):
+    """ Index selecting start:stop along spatial dimension `dim` of an array with (batch=True) or without leading batch dimension. """
+    return (slice(None),) * (dim + int(batch)) + (slice(start, stop),)
+
+
+def sparse_pressure_matrix(dimensions, extended_active_mask, extended_fluid_mask, periodic=False, index_dtype=np.int64):
     """
 Builds a sparse matrix such that when applied to a flattened pressure channel, it calculates the laplace
 of that channel, taking into account obstacles and empty cells.
 
+The matrix is assembled in coordinate (COO) format from vectorized row, column and value arrays and converted to CSR.
+
     :param dimensions: valid simulation dimensions. Pressure channel should be of shape (batch size, dimensions..., 1)
     :param extended_active_mask: Binary tensor with 2 more entries in every dimension than 'dimensions'.
     :param extended_fluid_mask: Binary tensor with 2 more entries in every dimension than 'dimensions'.
-    :return: SciPy sparse matrix that acts as a laplace on a flattened pressure channel given obstacles and empty cells
+    :param index_dtype: integer type of the row and column index arrays used during assembly. np.int32 halves the index memory but requires fewer than 2^31 cells.
+    :return: SciPy sparse matrix (CSR) that acts as a laplace on a flattened pressure channel given obstacles and empty cells
     """
     N = int(np.prod(dimensions))
-    d = len(dimensions)
-    A = scipy.sparse.lil_matrix((N, N), dtype=np.float32)
-    dims = range(d)
+    assert np.iinfo(index_dtype).max >= N, 'index_dtype %s cannot index %d cells' % (np.dtype(index_dtype).name, N)
+    rows, cols, values = sparse_pressure_coo(dimensions, extended_active_mask, extended_fluid_mask, periodic, index_dtype)
+    A = scipy.sparse.coo_matrix((values, (rows, cols)), shape=(N, N)).tocsr()
+    A.eliminate_zeros()
+    return A
 
-    diagonal_entries = np.zeros(N, extended_active_mask.dtype)  # diagonal matrix entries
 
-    gridpoints_linear = np.arange(N)
-    gridpoints = np.stack(np.unravel_index(gridpoints_linear, dimensions))  # d * (N^2) array mapping from linear to spatial frames
+def sparse_pressure_coo(dimensions, extended_active_mask, extended_fluid_mask, periodic=False, index_dtype=np.int64):
+    """
+Computes the entries of the pressure matrix built by `sparse_pressure_matrix` as flat NumPy arrays.
+Entries referencing the same cell (periodic dimensions of size 1 or 2) appear multiple times and are summed when converted to a SciPy matrix.
+Values have the type `math.precision().float_type`.
 
-    for dim in dims:
-        lower_active, self_active, upper_active = _dim_shifted(extended_active_mask, dim, (-1, 0, 1), diminish_others=(1,1))
+    :return: rows, columns, values
+    """
+    N = int(np.prod(dimensions))
+    gridpoints_linear = np.arange(N, dtype=index_dtype)
+    float_type = math.precision().float_type
+    diagonal_entries = np.zeros(N, float_type)
+    rows, cols, values = [gridpoints_linear], [gridpoints_linear], [diagonal_entries]
+    stencils = {}
+    for dim in range(len(dimensions)):
+        lower_active, self_active, upper_active = _dim_shifted(extended_active_mask, dim, (-1, 0, 1), diminish_others=(1, 1))
         lower_accessible, upper_accessible = _dim_shifted(extended_fluid_mask, dim, (-1, 1), diminish_others=(1, 1))
-
-        stencil_upper = upper_active * self_active
-        stencil_lower = lower_active * self_active
-        stencil_center = - lower_accessible - upper_accessible
-
-        diagonal_entries += math.flatten(stencil_center)
-
-        dim_direction = math.expand_dims([1 if i == dim else 0 for i in range(d)], axis=-1)
-        # --- Stencil upper cells ---
-        upper_points, upper_idx = wrap_or_discard(gridpoints + dim_direction, dim, dimensions, periodic=collapsed_gather_nd(periodic, [dim, 1]))
-        A[gridpoints_linear[upper_idx], upper_points] = stencil_upper.flatten()[upper_idx]
-        # --- Stencil lower cells ---
-        lower_points, lower_idx = wrap_or_discard(gridpoints - dim_direction, dim, dimensions, periodic=collapsed_gather_nd(periodic, [dim, 0]))
-        A[gridpoints_linear[lower_idx], lower_points] = stencil_lower.flatten()[lower_idx]
-
-    A[gridpoints_linear, gridpoints_linear] = math.minimum(diagonal_entries, -1)  # avoid 0, could lead to NaN
-
-    return scipy.sparse.csc_matrix(A)
+        diagonal_entries -= np.ravel(lower_accessible)
+        diagonal_entries -= np.ravel(upper_accessible)
+        stencils[dim] = (np.ravel(lower_active * self_active), np.ravel(upper_active * self_active))
+    np.minimum(diagonal_entries, -1, out=diagonal_entries)  # avoid 0, could lead to NaN
+    for dim, upper, neighbour_rows, neighbour_cols, valid in _stencil_neighbours(dimensions, periodic, index_dtype):
+        rows.append(neighbour_rows)
+        cols.append(neighbour_cols)
+        values.append(stencils[dim][upper][valid].astype(float_type, copy=False))
+    return np.concatenate(rows), np.concatenate(cols), np.concatenate(values)
+
+
+def _stencil_neighbours(dimensions, periodic=False, index_dtype=np.int64):
+    """
+Iterates over the off-diagonal entries of the Laplace stencil, first the upper, then the lower neighbour for each dimension.
+    :return: generator yielding (dim, upper, rows, columns, valid) where `valid` selects the cells that have a neighbour in that direction
+    """
+    N = int(np.prod(dimensions))
+    d = len(dimensions)
+    gridpoints_linear = np.arange(N, dtype=index_dtype)
+    gridpoints = np.stack(np.unravel_index(gridpoints_linear, dimensions)).astype(index_dtype, copy=False)  # d * (N^2) array mapping from linear to spatial frames
+    for dim in range(d):
+        dim_direction = np.array([[1] if i == dim else [0] for i in range(d)], dtype=index_dtype)
+        for upper in (1, 0):
+            neighbours = gridpoints + dim_direction if upper else gridpoints - dim_direction
+            points, valid = wrap_or_discard(neighbours, dim, dimensions, periodic=collapsed_gather_nd(periodic, [dim, upper]))
+            yield dim, upper, gridpoints_linear[valid], points.astype(index_dtype, copy=False), valid
 
 
 def sparse_indices(dimensions, periodic=False):
     N = int(np.prod(dimensions))
-    d = len(dimensions)
-    dims = range(d)
     gridpoints_linear = np.arange(N)
-    gridpoints = np.stack(np.unravel_index(gridpoints_linear, dimensions)) # d * (N^2) array mapping from linear to spatial frames
     indices_list = [np.stack([gridpoints_linear] * 2, axis=-1)]
-    for dim in dims:
-        dim_direction = math.expand_dims([1 if i == dim else 0 for i in range(d)], axis=-1)
-        # --- Stencil upper cells ---
-        upper_points, upper_idx = wrap_or_discard(gridpoints + dim_direction, dim, dimensions, periodic=collapsed_gather_nd(periodic, [dim, 1]))
-        indices_list.append(np.stack([gridpoints_linear[upper_idx], upper_points], axis=-1))
-        # --- Stencil lower cells ---
-        lower_points, lower_idx = wrap_or_discard(gridpoints - dim_direction, dim, dimensions, periodic=collapsed_gather_nd(periodic, [dim, 0]))
-        indices_list.append(np.stack([gridpoints_linear[lower_idx], lower_points], axis=-1))
+    for _dim, _upper, rows, cols, _valid in _stencil_neighbours(dimensions, periodic):
+        indices_list.append(np.stack([rows, cols], axis=-1))
     indices = np.concatenate(indices_list, axis=0)
     # --- Sort indices ---
     sorting = np.lexsort(np.transpose(indices)[:, ::-1])
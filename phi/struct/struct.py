@@ -1,5 +1,6 @@
 # pylint: disable-msg = redefined-outer-name  # kwargs should be accessed as struct.kwargs
 import json
+import numbers
 from copy import copy
 
 import numpy as np
@@ -49,6 +50,7 @@ See the struct documentation at documentation/Structs.ipynb
     """
 
     __items__ = None
+    __item_dict__ = None
     __traits__ = None
     __initialized_class__ = None
 
@@ -130,8 +132,15 @@ The returned struct will be validated unless this struct is not valid or the con
         duplicate._set_items(**kwargs)  # pylint: disable-msg = protected-access
         target_type = change_type if change_type is not None else self.__content_type__
         if target_type is VALID and not duplicate.is_valid:
-            duplicate.__content_type__ = INVALID
-            duplicate.validate()
+            data_items = _replaced_data_items(self, kwargs) if self.is_valid and not skip_validate() else None
+            if data_items is not None:
+                # The other items were validated against data of the same shape and dtype, only the new data needs validation
+                for item in data_items:
+                    item.validate(duplicate)
+                duplicate.__content_type__ = VALID
+            else:
+                duplicate.__content_type__ = INVALID
+                duplicate.validate()
         else:
             duplicate.__content_type__ = target_type
         return duplicate
@@ -142,10 +151,12 @@ The returned struct will be validated unless this struct is not valid or the con
         if self.is_valid:
             self.__content_type__ = INVALID
         for name, value in kwargs.items():
-            try:
-                item = getattr(self.__class__, name)
-            except (KeyError, TypeError):
-                raise TypeError('Struct %s has no property %s' % (self, name))
+            item = self.__item_dict__.get(name)
+            if item is None:
+                try:
+                    item = getattr(self.__class__, name)
+                except (KeyError, TypeError):
+                    raise TypeError('Struct %s has no property %s' % (self, name))
             item.set(self, value)
 
     def validate(self):
@@ -220,6 +231,43 @@ Data-holding structs should always be valid while structs holding non-data conte
         return "%s[%s]" % (type(self).__name__, self.content_type)
 
 
+def _replaced_data_items(struct, new_values):
+    """
+Determines whether the new values only replace data arrays while keeping their shapes and dtypes.
+In that case, the validation of the other items is assumed to remain valid as it may depend on the shapes but not the values of data.
+This does not apply to structs with traits as these validate all items together.
+    :param struct: valid struct
+    :param new_values: dict mapping item names to new values
+    :return: list of data items that need to be validated or None if the whole struct needs to be validated
+    """
+    if struct.__traits__:
+        return None
+    data_items = []
+    for name, value in new_values.items():
+        item = struct.__item_dict__.get(name)
+        if item is None:
+            return None
+        old_value = item.get(struct)
+        if isinstance(value, np.ndarray) and isinstance(old_value, np.ndarray) and item.is_variable and item.holds_data:
+            if value.shape != old_value.shape or value.dtype != old_value.dtype:
+                return None
+            data_items.append(item)
+        elif not _unchanged(value, old_value):
+            return None
+    return data_items
+
+
+def _unchanged(value, old_value):
+    if value is old_value:
+        return True
+    if type(value) != type(old_value) or not isinstance(value, (tuple, six.string_types, numbers.Number)):  # pylint: disable-msg = unidiomatic-typecheck
+        return False
+    try:
+        return bool(value == old_value)
+    except ValueError:  # ambiguous comparison of arrays
+        return False
+
+
 def to_dict(struct, item_condition=None):
     if item_condition is None:
         item_condition = context_item_condition
@@ -311,6 +359,8 @@ def isstruct(obj, leaf_condition=None):
 
 
 def equal(obj1, obj2):
+    if obj1 is obj2:
+        return True
     if isinstance(obj1, np.ndarray) or isinstance(obj2, np.ndarray):
         if obj1.dtype != np.object and obj2.dtype != np.object:
             if not np.allclose(obj1, obj2):
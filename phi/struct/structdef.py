@@ -44,6 +44,7 @@ Required decorator for custom struct classes.
             item.__initialize_for__(struct_class)
         items = _order_by_dependencies(items, struct_class)
         struct_class.__items__ = tuple(items)
+        struct_class.__item_dict__ = {item.name: item for item in items}
         struct_class.__initialized_class__ = struct_class
         # --- Check trait keywords ---
         for item in items:
@@ -123,6 +124,7 @@ Represents an item type of a struct, a variable or a constant.
                 raise ValueError('Illegal dependency: %s on item %s' % (dependency, name))
         self.dependencies = dependencies
         self.holds_data = holds_data
+        self._storage_name = '_%s' % (name,)  # instance attribute holding the value
         self.trait_kwargs = trait_kwargs
         self.struct_class = None
         self._overrides = {}
@@ -135,12 +137,12 @@ Represents an item type of a struct, a variable or a constant.
 
     def set(self, struct, value):
         try:
-            setattr(struct, '_' + self.name, value)
+            setattr(struct, self._storage_name, value)
         except AttributeError:
             raise AttributeError("can't modify struct %s because item %s cannot be set." % (struct, self))
 
     def get(self, struct):
-        return getattr(struct, '_' + self.name)
+        return getattr(struct, self._storage_name)
 
     def validate(self, struct):
         if self.validation_function is not None:
@@ -188,7 +190,7 @@ Example: to override the shape of an item, put the following just below its decl
 
     def __get__(self, instance, owner):
         if instance is not None:
-            return getattr(instance, '_' + self.name)
+            return getattr(instance, self._storage_name)
         else:
             return self
 
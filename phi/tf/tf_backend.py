@@ -15,6 +15,7 @@ from phi.tf.tf_cuda_resample import *
 from . import tf
 
 from phi.backend.backend import Backend
+from phi.backend.precision import precision
 from phi.backend.tensorop import expand, collapsed_gather_nd
 
 
@@ -245,7 +246,7 @@ class TFBackend(Backend):
         return tf.shape(tensor)
 
     def to_float(self, x, float64=False):
-        return tf.cast(x, tf.float64) if float64 else tf.cast(x, tf.float32)
+        return tf.cast(x, tf.float64) if float64 else tf.cast(x, tf.as_dtype(precision().float_type))
 
     def staticshape(self, tensor):
         if self.is_tensor(tensor, only_native=True):
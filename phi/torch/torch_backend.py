@@ -7,6 +7,7 @@ import torch
 import torch.nn.functional as torchf
 
 from phi.backend.backend import Backend
+from phi.backend.precision import precision
 from phi.backend.backend_helper import split_multi_mode_pad, PadSettings, general_grid_sample_nd, combined_dim, symmetric_pad
 
 
@@ -258,7 +259,7 @@ class TorchBackend(Backend):
         if float64:
             return x.double()
         else:
-            return x.float()
+            return x.to(getattr(torch, np.dtype(precision().float_type).name))
 
     def to_int(self, x, int64=False):
         x = self.as_tensor(x)
@@ -4,11 +4,13 @@ import numpy as np
 
 from phi import struct, math
 from phi.physics.domain import Domain
-from phi.geom import box, AABox
-from phi.physics.field import CenteredGrid, Field, unstack_staggered_tensor, StaggeredGrid, data_bounds, ConstantField, Noise, staggered_curl_2d
+from phi.geom import box, AABox, Sphere
+from phi.physics.field import advect, expression, lazy_evaluation, FieldExpression, mask, CenteredGrid, Field, unstack_staggered_tensor, StaggeredGrid, data_bounds, ConstantField, Noise, SampledField, staggered_curl_2d
 from phi.physics.field.flag import SAMPLE_POINTS
 from phi.physics.field.staggered_grid import stack_staggered_components
+from phi.physics.field.util import extrapolate, shift_extrapolation
 from phi.physics.fluid import Fluid
+from phi.physics.material import CLOSED, OPEN
 
 
 class TestFields(TestCase):
@@ -117,3 +119,160 @@ class TestFields(TestCase):
         vel = staggered_curl_2d(pot)
         div = vel.divergence()
         np.testing.assert_almost_equal(div.data, 0, decimal=5)
+
+    def test_advection_plan(self):
+        domain = Domain([16, 12], boundaries=[CLOSED, (OPEN, CLOSED)])
+        velocity = domain.staggered_grid(Noise(), batch_size=2)
+        density = domain.centered_grid(Noise()).copied_with(extrapolation='constant', extrapolation_value=0.5)
+        plan = advect.AdvectionPlan(velocity, dt=2.)
+        for field in (density, density * 2, velocity):
+            advected = plan.advect(field)
+            components = (advected.unstack(), field.unstack()) if isinstance(field, StaggeredGrid) else ([advected], [field])
+            for advected_component, component in zip(*components):
+                positions = component.points - velocity.at(component.points) * 2.
+                np.testing.assert_almost_equal(advected_component.data, component.sample_at(positions.data), decimal=5)
+        self.assertEqual(len(plan._positions), 3)  # density and the two staggered components
+
+    def test_maccormack_bfecc(self):
+        domain = Domain([32, 32], boundaries=CLOSED)
+        x = np.arange(32) + 0.5
+        bump = np.exp(-((x[:, None] - 10) ** 2 + (x[None, :] - 16) ** 2) / 8.)[None, ..., None].astype(np.float32)
+        density = domain.centered_grid(bump)
+        velocity = domain.centered_grid(np.tile(np.array([0, 1], np.float32), [1, 32, 32, 1]), components=2)
+        results = {}
+        for scheme in advect.SCHEMES:
+            results[scheme] = density
+            for _ in range(10):
+                results[scheme] = advect.advect(results[scheme], velocity, dt=0.5, scheme=scheme)
+        self.assertGreater(np.max(results['maccormack'].data), np.max(results['semi_lagrangian'].data))
+        self.assertGreater(np.max(results['bfecc'].data), np.max(results['semi_lagrangian'].data))
+        for clamped in (results['maccormack'], results['bfecc']):
+            self.assertGreaterEqual(np.min(clamped.data), 0)
+            self.assertLessEqual(np.max(clamped.data), 1)
+        staggered = domain.staggered_grid(Noise())
+        for advected in (advect.maccormack(staggered, staggered, 0.5), advect.bfecc(staggered, staggered, 0.5, clamp=False)):
+            self.assertEqual(advected.staggered_tensor().shape, staggered.staggered_tensor().shape)
+
+    def test_sampled_field_scatter(self):
+        points = np.random.rand(2, 500, 2).astype(np.float32) * [16, 12]
+        values = np.random.randn(2, 500, 3).astype(np.float32)
+        box = AABox(0, [16, 12])
+        indices = np.clip(np.round(points).astype(np.int32), 0, [15, 11])
+        for mode in ('add', 'mean', 'any'):
+            field = SampledField(points, values, mode=mode)
+            scattered = field.at(CenteredGrid(np.zeros([2, 16, 12, 3]), box=box, batch_size=2)).data
+            total, count = np.zeros([2, 16, 12, 3]), np.zeros([2, 16, 12, 1])
+            batch = np.arange(2)[:, np.newaxis]
+            np.add.at(total, (batch, indices[..., 0], indices[..., 1]), values)
+            np.add.at(count, (batch, indices[..., 0], indices[..., 1]), 1)
+            expected = {'add': total, 'mean': total / np.maximum(1, count), 'any': np.where(count > 0, scattered, 0)}[mode]
+            np.testing.assert_almost_equal(scattered, expected, decimal=4)
+            self.assertTrue(np.all((scattered != 0) == (count > 0)))
+        staggered = SampledField(points, values[..., :2]).at(StaggeredGrid.sample(0, Domain([16, 12], box=box)))
+        self.assertEqual(staggered.staggered_tensor().shape, (2, 17, 13, 2))
+        self.assertEqual(len(field._particle_bins[1]), 1)
+        mask = field.mask()
+        mask.at(staggered)
+        self.assertEqual(len(mask._particle_bins[1]), 4)  # centered target inherited from field, cells and two staggered components
+        self.assertIs(mask._particle_bins[1][0], field._particle_bins[1][0])
+        self.assertEqual(len(field._particle_bins[1]), 1)
+        # Copies with other sample points neither inherit nor evict bins
+        moved = field.copied_with(sample_points=points + 0.5)
+        self.assertIsNone(moved._particle_bins)
+        moved.at(CenteredGrid(np.zeros([2, 16, 12, 3]), box=box, batch_size=2))
+        self.assertIs(field._particle_bins[0], field.sample_points)
+        self.assertIs(moved._particle_bins[0], moved.sample_points)
+
+    def test_sampled_field_precision(self):
+        points = np.random.rand(2, 500, 2) * [16, 12]
+        values = np.random.randn(2, 500, 1) * 1e-9 + 1
+        indices = np.clip(np.round(points).astype(np.int32), 0, [15, 11])
+        total = np.zeros([2, 16, 12, 1])
+        np.add.at(total, (np.arange(2)[:, np.newaxis], indices[..., 0], indices[..., 1]), values)
+        with math.use_precision(math.Precision(np.float64)):
+            for chunk_size in (None, 128):
+                for mode in ('add', 'any'):
+                    field = SampledField(points, values, mode=mode, chunk_size=chunk_size)
+                    scattered = field.at(CenteredGrid(np.zeros([2, 16, 12, 1]), box=AABox(0, [16, 12]), batch_size=2)).data
+                    self.assertEqual(scattered.dtype, np.float64)
+                    if mode == 'add':
+                        np.testing.assert_allclose(scattered, total, rtol=1e-14)
+
+    def test_advect_points(self):
+        domain = Domain([16, 12], boundaries=[CLOSED, (OPEN, CLOSED)], box=AABox(0, [8, 6]))
+        velocity = domain.staggered_grid(Noise())
+        particles = SampledField(np.random.rand(1, 100, 2).astype(np.float32) * [8, 6], data=1)
+        for integrator in advect.INTEGRATORS:
+            advected = advect.advect_points(particles, velocity, 0.5, integrator=integrator)
+            chunked = advect.advect_points(particles, velocity, 0.5, integrator=integrator, chunk_size=30)
+            np.testing.assert_almost_equal(advected.sample_points, chunked.sample_points, decimal=5)
+        # --- Compare RK4 with sampling via Field.sample_at ---
+        points = particles.sample_points
+        k1 = velocity.sample_at(points)
+        k2 = velocity.sample_at(points + 0.25 * k1)
+        k3 = velocity.sample_at(points + 0.25 * k2)
+        k4 = velocity.sample_at(points + 0.5 * k3)
+        expected = points + 0.5 / 6 * (k1 + 2 * (k2 + k3) + k4)
+        np.testing.assert_almost_equal(advect.runge_kutta_4(particles, velocity, 0.5).sample_points, expected, decimal=4)
+
+    def test_sampled_field_chunks(self):
+        points = np.random.rand(2, 500, 2).astype(np.float32) * [16, 12]
+        values = np.random.randn(2, 500, 2).astype(np.float32)
+        domain = Domain([16, 12])
+        for mode in ('add', 'mean', 'any'):
+            field = SampledField(points, values, mode=mode)
+            chunked = field.copied_with(chunk_size=128)
+            self.assertEqual(len(list(chunked.chunks())), 4)
+            centered = CenteredGrid(np.zeros([2, 16, 12, 2]), box=domain.box, batch_size=2)
+            np.testing.assert_almost_equal(chunked.at(centered).data, field.at(centered).data, decimal=4)
+            staggered = StaggeredGrid.sample(0, domain)
+            np.testing.assert_almost_equal(chunked.at(staggered).staggered_tensor(), field.at(staggered).staggered_tensor(), decimal=4)
+        self.assertEqual(advect.runge_kutta_4(chunked, domain.staggered_grid(Noise()), 1.).chunk_size, 128)
+
+    def test_extrapolate(self):
+        mask = np.zeros([1, 12, 12, 1], np.float32)
+        mask[0, 3:8, 4:9] = 1
+        data = np.random.randn(1, 12, 12, 2).astype(np.float32)
+        field, distance = extrapolate(CenteredGrid(data), mask, voxel_distance=2)
+        expected_data, expected_distance = shift_extrapolation(data, mask, 2, 1.)
+        np.testing.assert_equal(field.data, expected_data)
+        np.testing.assert_almost_equal(distance, expected_distance)
+        # Staggered: faces adjacent to fluid cells keep their values
+        staggered = StaggeredGrid(np.random.randn(1, 13, 13, 2).astype(np.float32))
+        extrapolated, distance = extrapolate(staggered, mask, voxel_distance=2)
+        self.assertEqual(distance.shape, (1, 12, 12, 1))
+        before, after = staggered.staggered_tensor(), extrapolated.staggered_tensor()
+        np.testing.assert_equal(after[0, 3:9, 4:9, 0], before[0, 3:9, 4:9, 0])
+        np.testing.assert_equal(after[0, 3:8, 4:10, 1], before[0, 3:8, 4:10, 1])
+        np.testing.assert_equal(after[0, 10, 6, 0], before[0, 8, 6, 0])
+        np.testing.assert_equal(after[0, 5, 11, 1], before[0, 5, 9, 1])
+        np.testing.assert_equal(after[0, 0, 0], before[0, 0, 0])
+
+    def test_lazy_evaluation(self):
+        domain = Domain([16, 12])
+        centered = CenteredGrid(np.random.randn(2, 16, 12, 2).astype(np.float32), box=domain.box)
+        velocity = domain.staggered_grid(Noise(), batch_size=2)
+        obs_mask = mask(Sphere([8, 6], 3), antialias=True)
+        chunk_size = expression.CHUNK_SIZE
+        try:
+            for expression.CHUNK_SIZE in (chunk_size, 20):
+                with lazy_evaluation():
+                    lazy = (1 - obs_mask) * centered + centered ** 2 * 0.5
+                    self.assertIsInstance(lazy, FieldExpression)
+                    lazy_staggered = ((1 - obs_mask) * velocity + obs_mask * (velocity - [1, 2])).at(velocity)
+                eager = (1 - obs_mask) * centered + centered ** 2 * 0.5
+                np.testing.assert_almost_equal(lazy.data, eager.at(centered).data, decimal=5)
+                eager_staggered = ((1 - obs_mask) * velocity + obs_mask * (velocity - [1, 2])).at(velocity)
+                self.assertIsInstance(lazy_staggered, StaggeredGrid)
+                np.testing.assert_almost_equal(lazy_staggered.staggered_tensor(), eager_staggered.staggered_tensor(), decimal=5)
+            # Tensors without spatial axes are broadcast, not split into chunks
+            expression.CHUNK_SIZE = 64
+            large = CenteredGrid(np.random.randn(2, 64, 48, 2).astype(np.float32))
+            scale, offset = np.array([[1., 2.]]), np.random.randn(2, 64, 48, 1)
+            with lazy_evaluation():
+                lazy = (large * scale + offset).at(large)
+                lazy_staggered = (velocity * scale - 1).at(velocity)
+            np.testing.assert_almost_equal(lazy.data, large.data * scale + offset, decimal=5)
+            np.testing.assert_almost_equal(lazy_staggered.staggered_tensor(), (velocity * scale - 1).staggered_tensor(), decimal=5)
+        finally:
+            expression.CHUNK_SIZE = chunk_size
@@ -3,14 +3,17 @@ from unittest import TestCase
 import numpy
 
 from phi import struct, math
-from phi.geom import Sphere, AABox, box
+from phi.geom import Sphere, AABox, box, union
 from phi.physics.domain import Domain
 from phi.physics.field import StaggeredGrid
 from phi.physics.field.effect import Fan, Inflow
 from phi.physics.material import CLOSED, OPEN
 from phi.physics.fluid import Fluid, INCOMPRESSIBLE_FLOW, IncompressibleFlow
-from phi.physics.obstacle import Obstacle
-from phi.physics.pressuresolver.sparse import SparseCG
+from phi.physics.field import mask
+from phi.physics.obstacle import Obstacle, ObstacleMaskCache
+from phi.physics.pressuresolver.fourier import FourierSolver
+from phi.physics.pressuresolver.geom import GeometricCG
+from phi.physics.pressuresolver.sparse import SparseCG, SparseSciPy
 from phi.physics.world import World
 
 
@@ -97,4 +100,91 @@ class TestFluid(TestCase):
 
         numpy.testing.assert_equal(d1, d2)
         numpy.testing.assert_equal(vy1, vy2)
-        numpy.testing.assert_equal(vx1, vx2)
\ No newline at end of file
+        numpy.testing.assert_equal(vx1, vx2)
+
+    def test_warm_start(self):
+        def iterations(warm_start):
+            world = World()
+            fluid = world.add(Fluid(Domain([32, 32], boundaries=CLOSED), buoyancy_factor=0.1),
+                              physics=IncompressibleFlow(pressure_solver=SparseCG(accuracy=1e-5), warm_start=warm_start))
+            world.add(Inflow(Sphere((8, 16), radius=4), rate=0.2))
+            for _ in range(4):
+                world.step()
+            return fluid.solve_info['iterations']
+
+        self.assertLess(iterations(True), iterations(False))
+        self.assertTrue(IncompressibleFlow(pressure_solver=FourierSolver()).warm_start)  # SparseCG fallback uses the guess
+        self.assertTrue(IncompressibleFlow(pressure_solver=GeometricCG()).warm_start)
+        self.assertFalse(IncompressibleFlow(pressure_solver=SparseSciPy()).warm_start)
+        self.assertFalse(IncompressibleFlow(pressure_solver=FourierSolver(fallback=SparseSciPy())).warm_start)
+
+    def test_obstacle_mask_cache(self):
+        velocity = Domain([32, 24], box=AABox(0, [16, 12])).staggered_grid(0)
+        geometries = [Sphere([i, 12 - i], radius=1.5) for i in range(1, 12, 2)] + [box[4:10, 5:7]]
+        cache = ObstacleMaskCache()
+        for step in range(3):
+            cached = cache.obstacle_mask(geometries, velocity.box, velocity.resolution)
+            numpy.testing.assert_equal(cached, mask(union(geometries)).at(velocity.center_points).data)
+            geometries[0] = geometries[0].shifted([0.7, 0.3])
+        grid_masks = cache._grids[velocity.box, velocity.resolution, repr(None), numpy.dtype(numpy.float32)]
+        unchanged = list(grid_masks.entries[1:])
+        cache.obstacle_mask(geometries, velocity.box, velocity.resolution)
+        self.assertTrue(all(a is b for a, b in zip(unchanged, grid_masks.entries[1:])))
+        # --- Alternating simulations keep their masks ---
+        other_geometries = [Sphere([8, 6], radius=3)]
+        cache = ObstacleMaskCache(max_size=2)
+        first = cache.obstacle_mask(geometries, velocity.box, velocity.resolution, CLOSED)
+        second = cache.obstacle_mask(other_geometries, velocity.box, velocity.resolution, OPEN)
+        self.assertIs(cache.obstacle_mask(geometries, velocity.box, velocity.resolution, CLOSED), first)
+        self.assertIs(cache.obstacle_mask(other_geometries, velocity.box, velocity.resolution, OPEN), second)
+        cache.obstacle_mask(geometries, AABox(0, [8, 6]), velocity.resolution, CLOSED)
+        self.assertEqual(len(cache), 2)
+        self.assertIsNot(cache.obstacle_mask(geometries, velocity.box, velocity.resolution, CLOSED), first)  # least recently used grid was discarded
+        # --- Masks follow the precision policy ---
+        with math.use_precision(math.Precision(numpy.float64)):
+            double = cache.obstacle_mask(geometries, velocity.box, velocity.resolution, CLOSED)
+        self.assertEqual(double.dtype, numpy.float64)
+        self.assertEqual(cache.obstacle_mask(geometries, velocity.box, velocity.resolution, CLOSED).dtype, numpy.float32)
+        # --- Same result in a simulation ---
+        fluid = Fluid(Domain([32, 24], boundaries=CLOSED), buoyancy_factor=0.1, density=0.5)
+        obstacles = [Obstacle(g) for g in geometries]
+        result = IncompressibleFlow().step(fluid, obstacles=obstacles)
+        reference = IncompressibleFlow().step(fluid, obstacles=[Obstacle(union(geometries))])
+        numpy.testing.assert_almost_equal(result.velocity.staggered_tensor(), reference.velocity.staggered_tensor(), decimal=5)
+
+    def test_precision(self):
+        policy = math.Precision(accumulation_type=numpy.float64, field_types={'density': numpy.float16})
+        with math.use_precision(policy):
+            world = World()
+            fluid = world.add(Fluid(Domain([16, 16], boundaries=CLOSED), buoyancy_factor=0.1), physics=IncompressibleFlow())
+            world.add(Inflow(Sphere((4, 8), radius=2), rate=0.2))
+            for _ in range(3):
+                world.step()
+            self.assertEqual(fluid.density.data.dtype, numpy.float16)
+            self.assertEqual(fluid.velocity.data[0].data.dtype, numpy.float32)
+            self.assertEqual(StaggeredGrid.sample(0, fluid.domain, dtype=numpy.float64).data[0].data.dtype, numpy.float64)
+        self.assertEqual(Fluid(Domain([16, 16])).density.data.dtype, numpy.float32)
+        self.assertGreater(numpy.sum(fluid.density.data.astype(numpy.float32)), 0)
+
+    def test_buffer_pool(self):
+        def simulate(pool, scheme):
+            world = World()
+            fluid = world.add(Fluid(Domain([32, 24], boundaries=CLOSED), buoyancy_factor=0.1), physics=IncompressibleFlow(pressure_solver=SparseCG(accuracy=1e-5, matrix_free=True), advection=scheme))
+            world.add(Inflow(Sphere((8, 12), radius=4), rate=0.2))
+            frames = []
+            with math.use_buffer_pool(pool):
+                for _ in range(4):
+                    world.step()
+                    frames.append((fluid.density.data.copy(), fluid.velocity.staggered_tensor()))
+            return frames, fluid.state
+
+        for scheme in ('semi_lagrangian', 'maccormack'):
+            pool = math.BufferPool(min_size=32)
+            frames, state = simulate(pool, scheme)
+            reference_frames, reference_state = simulate(None, scheme)
+            for (density, velocity), (reference_density, reference_velocity) in zip(frames, reference_frames):
+                numpy.testing.assert_almost_equal(density, reference_density, decimal=5)
+                numpy.testing.assert_almost_equal(velocity, reference_velocity, decimal=5)
+            numpy.testing.assert_almost_equal(state.density.data, reference_state.density.data, decimal=5)
+            numpy.testing.assert_almost_equal(state.solve_info['advected_velocity'].staggered_tensor(), reference_state.solve_info['advected_velocity'].staggered_tensor(), decimal=5)
+            self.assertGreater(pool.reuses, pool.allocations)
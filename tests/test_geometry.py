@@ -2,8 +2,10 @@ from unittest import TestCase
 
 import numpy as np
 
-from phi.geom import AABox, Sphere, box
-from phi.physics.field import CenteredGrid
+from phi import math
+from phi.geom import AABox, Sphere, box, union
+from phi.physics.field import CenteredGrid, GeometryMask, AnalyticField
+from phi.physics.field.sdf import SignedDistanceCache
 
 
 def points():
@@ -38,3 +40,41 @@ class TestGeometry(TestCase):
         values = growing_sphere.value_at(np.zeros([10, 3, 2]) + [0, 4])
         np.testing.assert_equal(values.shape, [10, 3, 1])
         np.testing.assert_equal(values[:, 0, 0], [0, 0, 0, 0, 1, 1, 1, 1, 1, 1])
+
+    def test_culled_rasterization(self):
+        grid = CenteredGrid(np.zeros([1, 20, 16, 1]), box[0:10, 0:8])
+        geometries = [Sphere([np.random.rand() * 10, np.random.rand() * 8], np.random.rand() * 2) for _ in range(20)]
+        geometries += [box[2:4.3, 1:2], Sphere([9.5, 7.5], 3), Sphere(np.array([[2., 2], [6, 6]]), 1.5)]
+        mask = GeometryMask(union(geometries))
+        expected = AnalyticField.at(mask, grid).data  # evaluates all geometries at all points
+        np.testing.assert_equal(mask.at(grid).data, expected)
+        self.assertEqual(mask.at(grid).data.shape, (2, 20, 16, 1))
+        np.testing.assert_equal(union(geometries).lies_inside(grid.points.data), expected > 0)
+
+    def test_signed_distance(self):
+        grid = CenteredGrid(np.zeros([1, 20, 16, 1]), box[0:10, 0:8])
+        sphere = Sphere([5, 4], 2.5)
+        cache = SignedDistanceCache(max_size=2)
+        distance = cache.signed_distance(sphere, grid.box, grid.resolution)
+        np.testing.assert_almost_equal(distance, sphere.approximate_signed_distance(grid.points.data), decimal=5)
+        self.assertIs(cache.signed_distance(Sphere([5, 4], 2.5), grid.box, grid.resolution), distance)
+        moved = cache.signed_distance(sphere.shifted([1, 0]), grid.box, grid.resolution)
+        self.assertIsNot(moved, distance)
+        self.assertEqual(len(cache), 1)  # the moved geometry replaces the distance field of its grid
+        self.assertIs(cache.signed_distance(sphere.shifted([1, 0]), grid.box, grid.resolution), moved)
+        cache.signed_distance(sphere, AABox(0, [5, 4]), grid.resolution)
+        cache.signed_distance(sphere, AABox(0, [20, 16]), grid.resolution)
+        self.assertEqual(len(cache), 2)
+        self.assertIsNot(cache.signed_distance(sphere.shifted([1, 0]), grid.box, grid.resolution), moved)  # least recently used grid was discarded
+        # --- Antialiased masks ---
+        mask = GeometryMask(union([sphere, box[0:3, 0:2]]), antialias=True)
+        np.testing.assert_almost_equal(mask.at(grid).data, AnalyticField.at(mask, grid).data, decimal=5)
+
+    def test_mask_precision(self):
+        grid = CenteredGrid(np.zeros([1, 20, 16, 1]), box[0:10, 0:8])
+        geometry = union([Sphere([5, 4], 2.5), box[0:3, 0:2]])
+        with math.use_precision(math.Precision(np.float64)):
+            self.assertEqual(GeometryMask(geometry).at(grid).data.dtype, np.float64)
+            self.assertEqual(GeometryMask(geometry, antialias=True).at(grid).data.dtype, np.float64)
+        self.assertEqual(GeometryMask(geometry).at(grid).data.dtype, np.float32)
+        self.assertEqual(GeometryMask(geometry, antialias=True).at(grid).data.dtype, np.float32)
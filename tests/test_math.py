@@ -116,6 +116,22 @@ class TestMath(TestCase):
         np.testing.assert_equal(lower.shape, (1, 3, 3, 1))
         np.testing.assert_equal(upper.shape, (1, 3, 3, 1))
 
+    def test_conv(self):
+        import scipy.signal
+        from phi.backend.scipy_backend import SciPyBackend
+        separable = np.multiply.outer(np.multiply.outer(np.arange(1., 4.), [1., -2.]), np.ones([2, 3])).astype(np.float32)
+        for tensor_shape, kernel in [((2, 10, 9, 2), np.random.randn(3, 3, 2, 3)),  # direct
+                                     ((2, 20, 21, 2), separable),  # separable
+                                     ((2, 20, 21, 1), np.random.randn(9, 9, 1, 1)),  # FFT
+                                     ((1, 6, 5, 7, 1), np.random.randn(3, 3, 3, 1, 1))]:
+            tensor = np.random.randn(*tensor_shape).astype(np.float32)
+            for padding in ('SAME', 'VALID'):
+                result = SciPyBackend().conv(tensor, kernel.astype(np.float32), padding)
+                for b in range(tensor.shape[0]):
+                    for o in range(kernel.shape[-1]):
+                        expected = np.sum([scipy.signal.correlate(tensor[b, ..., i], kernel[..., i, o], padding.lower()) for i in range(tensor.shape[-1])], 0)
+                        np.testing.assert_almost_equal(result[b, ..., o], expected, decimal=4)
+
     def test_gradient(self):
         # --- 1D ---
         tensor = np.expand_dims(np.expand_dims(np.arange(5), axis=-1), axis=0)
@@ -156,10 +172,59 @@ class TestMath(TestCase):
         _resample_test('constant', [0, -1, 0, 0], (0.5, 1, 1.5, 2, 1, 0, -1))
         _resample_test(['constant', 'circular', ['symmetric', 'reflect'], 'constant'], None, (1, 1, 1.5, 2, 1.5, 2.5, 1.5))
 
+    def test_spline_resample(self):
+        import scipy
+        from unittest import mock
+        data = (np.arange(32, dtype=np.float32) ** 2)[np.newaxis, :, np.newaxis]
+        coords = np.array([[[15.5], [16.25]]])  # far from the boundaries, cubic splines reproduce quadratic functions
+        for boundary in ('constant', 'replicate', 'circular'):
+            np.testing.assert_almost_equal(SciPyBackend().resample(data, coords, 'cubic', boundary)[0, :, 0], [240.25, 264.0625], decimal=3)
+        with mock.patch.object(scipy, '__version__', '1.5.4'):  # 'grid-constant' and 'grid-wrap' modes were added in SciPy 1.6
+            self.assertRaises(NotImplementedError, lambda: SciPyBackend().resample(data, coords, 'cubic', 'circular'))
+            self.assertRaises(NotImplementedError, lambda: SciPyBackend().resample(data, coords, 'cubic', 'constant'))
+            SciPyBackend().resample(data, coords, 'cubic', 'replicate')
+
+    def test_choose_backend(self):
+        from phi.backend.dynamic_backend import DynamicBackend
+        from phi.struct.struct_backend import StructBroadcastBackend
+        backend = DynamicBackend()
+        scipy_backend = SciPyBackend()
+        struct_backend = StructBroadcastBackend(backend)
+        backend.add_backend(scipy_backend)
+        backend.add_backend(struct_backend)
+        array = np.zeros([2])
+        for _ in range(2):  # second pass uses cached backends
+            self.assertIs(backend.choose_backend(array), scipy_backend)
+            self.assertIs(backend.choose_backend([array, 1.]), scipy_backend)
+            # Lists are inspected element-wise
+            self.assertIs(backend.choose_backend([array, [1, 2]]), scipy_backend)
+            self.assertIs(backend.choose_backend([array, [1, object()]]), struct_backend)
+        with backend.use_backend(struct_backend):
+            self.assertIs(backend.choose_backend(array), struct_backend)
+        self.assertIs(backend.choose_backend(array), scipy_backend)
+
+    def test_buffer_pool(self):
+        pool = BufferPool(min_size=16)
+        with use_buffer_pool(pool):
+            self.assertIs(buffer_pool(), pool)
+            scratch = pool.scratch('owner', [4, 8], np.float32)
+            self.assertIs(pool.scratch('owner', (4, 8), np.float32), scratch)
+            self.assertIsNot(pool.scratch('other', (4, 8), np.float32), scratch)
+            first = pool.ping_pong('state', [4, 8], np.float32)
+            second = pool.ping_pong('state', [4, 8], np.float32)
+            self.assertIsNot(first, second)
+            self.assertIs(pool.ping_pong('state', [4, 8], np.float32), first)
+            self.assertIs(pool.ping_pong('state', [4, 8], np.float32, avoid=second[1:]), first)  # never overwrite the input
+            self.assertEqual(pool.allocations, 4)
+            self.assertEqual(pool.scratch('owner', [4], np.float32).shape, (4,))  # below min_size
+            self.assertEqual(add(np.ones([4, 8]), 1).shape, (4, 8))  # arithmetic does not use the pool
+            self.assertEqual(pool.allocations, 4)
+        self.assertIsNone(buffer_pool())
+
 
 def _resample_test(mode, constant_values, expected):
     grid = np.tile(np.reshape(np.array([[1,2], [4,5]]), [1,2,2,1]), [1, 1, 1, 2])
     coords = np.array([[(0, -0.5), (0, 0), (0, 0.5), (0, 1), (0, 1.5), (0.5, 2), (2, 0.5)]])
-    resampled = helper_resample(grid, coords, mode, constant_values, SciPyBackend())
-    np.testing.assert_equal(resampled[..., 0], resampled[..., 1])
-    np.testing.assert_almost_equal(expected, resampled[0, :, 0], decimal=5)
+    for resampled in (helper_resample(grid, coords, mode, constant_values, SciPyBackend()), SciPyBackend().resample(grid, coords, boundary=mode, constant_values=constant_values)):
+        np.testing.assert_equal(resampled[..., 0], resampled[..., 1])
+        np.testing.assert_almost_equal(expected, resampled[0, :, 0], decimal=5)
@@ -3,12 +3,17 @@ from unittest import TestCase
 import numpy as np
 from phi import math
 
-from phi.flow import CLOSED, PERIODIC, OPEN, Domain, poisson_solve, Noise
+from phi.flow import CLOSED, PERIODIC, OPEN, Domain, PoissonDomain, poisson_solve, Noise
+from phi.math.blas import preconditioned_conjugate_gradient
 from phi.physics.pressuresolver.geom import GeometricCG
-from phi.physics.pressuresolver.sparse import SparseCG, SparseSciPy
-from phi.physics.pressuresolver.fourier import FourierSolver
+from phi.physics.pressuresolver.sparse import SparseCG, SparseSciPy, SparseLU, SparseMatrixCache, LaplaceStencil, sparse_pressure_matrix
+from phi.physics.pressuresolver.fourier import FourierSolver, fourier_transforms, SPECTRUM_CACHE, _FFTPACK_TRANSFORMS, _REAL_TRANSFORMS
+from phi.physics.pressuresolver.multigrid import MultigridSolver
+from phi.physics.pressuresolver.preconditioner import JacobiPreconditioner, IncompleteCholesky, MultigridPreconditioner
 from phi.physics.field import CenteredGrid
+from phi.physics.material import Material
 from phi.geom.geometry import AABox
+from phi.struct.tensorop import collapsed_gather_nd
 
 
 def _generate_examples():
@@ -74,6 +79,30 @@ DOMAINS = [
 ]
 
 
+
+def _loop_pressure_matrix(dimensions, extended_active_mask, extended_fluid_mask, periodic):
+    """ Dense reference for sparse_pressure_matrix, assembled cell by cell. Entries for the same neighbour are summed. """
+    N = int(np.prod(dimensions))
+    A = np.zeros([N, N], np.float32)
+    for cell in np.ndindex(*dimensions):
+        row = np.ravel_multi_index(cell, dimensions)
+        extended_cell = tuple(i + 1 for i in cell)
+        diagonal = 0
+        for dim in range(len(dimensions)):
+            for upper, step in ((1, 1), (0, -1)):
+                extended_neighbour = tuple(i + step if d == dim else i for d, i in enumerate(extended_cell))
+                diagonal -= extended_fluid_mask[(0,) + extended_neighbour + (0,)]
+                neighbour = list(cell)
+                neighbour[dim] += step
+                if not 0 <= neighbour[dim] < dimensions[dim]:
+                    if not collapsed_gather_nd(periodic, [dim, upper]):
+                        continue
+                    neighbour[dim] %= dimensions[dim]
+                A[row, np.ravel_multi_index(neighbour, dimensions)] += extended_active_mask[(0,) + extended_neighbour + (0,)] * extended_active_mask[(0,) + extended_cell + (0,)]
+        A[row, row] += min(diagonal, -1)
+    return A
+
+
 class TestPoissonSolve(TestCase):
 
     def test_equal_results(self):
@@ -87,12 +116,209 @@ class TestPoissonSolve(TestCase):
     def test_sparse_cg(self):
         _test_all(SparseCG())
 
+    def test_matrix_free_cg(self):
+        _test_all(SparseCG(matrix_free=True))
+        for domain in DOMAINS + [Domain([2, 1, 3], boundaries=[PERIODIC, PERIODIC, OPEN])]:
+            active = np.ones([1] + list(domain.resolution) + [1], np.float32)
+            active[(0,) + tuple(r // 2 for r in domain.resolution)] = 0
+            poisson_domain = PoissonDomain(domain, active=domain.centered_grid(active, extrapolation='constant'))
+            masks = poisson_domain.active_tensor(extend=1), poisson_domain.accessible_tensor(extend=1), Material.periodic(domain.boundaries)
+            A = sparse_pressure_matrix(domain.resolution, *masks)
+            stencil = LaplaceStencil(domain.resolution, *masks)
+            vec = np.random.randn(2, A.shape[0]).astype(np.float32)
+            np.testing.assert_almost_equal(stencil(vec), np.stack([A.dot(v) for v in vec]), decimal=5)
+
     def test_sparse_scipy(self):
         _test_all(SparseSciPy())
 
     def test_geometric_cg(self):
         _test_all(GeometricCG())
 
+    def test_sparse_lu(self):
+        _test_all(SparseLU())
+        cache = SparseMatrixCache()
+        domain = Domain([40, 32], boundaries=CLOSED)
+        div = domain.centered_grid(Noise(), batch_size=3)
+        p1 = poisson_solve(div, domain, SparseLU(matrix_cache=cache))[0]
+        p2 = poisson_solve(div, domain, SparseLU(matrix_cache=cache))[0]
+        np.testing.assert_equal(p1.data, p2.data)
+        self.assertEqual(len(cache), 1)
+        np.testing.assert_almost_equal(p1.laplace().data, div.data, decimal=3)
+
+    def test_preconditioned_cg(self):
+        _test_all(SparseCG(preconditioner=JacobiPreconditioner()))
+        _test_all(SparseCG(preconditioner=IncompleteCholesky()))
+        _test_all(GeometricCG(preconditioner=JacobiPreconditioner()))
+        _test_all(GeometricCG(preconditioner=MultigridPreconditioner()))
+        domain = Domain([64, 64], boundaries=CLOSED)
+        div = domain.centered_grid(Noise(), batch_size=2)
+        div -= math.mean(div.data, axis=(1, 2), keepdims=True)
+        _, plain_iterations = poisson_solve(div, domain, GeometricCG())
+        _, mg_iterations = poisson_solve(div, domain, GeometricCG(preconditioner=MultigridPreconditioner()))
+        self.assertLess(np.max(mg_iterations), np.max(plain_iterations) / 4)
+
+    def test_preconditioner_symmetry(self):
+        random = np.random.RandomState(0)
+        x, y = random.randn(2, 1, 24, 20, 1)
+        for boundaries in (OPEN, CLOSED, PERIODIC):
+            domain = PoissonDomain(Domain([24, 20], boundaries=boundaries))
+            for preconditioner in (JacobiPreconditioner(), IncompleteCholesky(), MultigridPreconditioner()):
+                apply_M_inv = preconditioner.build(domain)
+                np.testing.assert_allclose(np.sum(y * apply_M_inv(x)), np.sum(x * apply_M_inv(y)), rtol=1e-6, err_msg='%s, %s' % (preconditioner, boundaries))
+                self.assertLess(np.sum(x * apply_M_inv(x)), 0)  # negative definite like the Laplace operator
+
+    def test_batched_cg(self):
+        domain = Domain([32, 32], boundaries=OPEN)
+        div = domain.centered_grid(Noise(), batch_size=3)
+        div = div.copied_with(data=div.data * np.reshape([0., 1., 1e-2], [3, 1, 1, 1]))
+        for solver in (SparseCG(accuracy=1e-4), GeometricCG(accuracy=1e-4), SparseCG(accuracy=1e-4, preconditioner=JacobiPreconditioner())):
+            pressure, iterations = poisson_solve(div, domain, solver)
+            self.assertEqual(np.shape(iterations), (3,))
+            self.assertEqual(iterations[0], 0)
+            self.assertLess(iterations[2], iterations[1])
+            single_pressure, single_iterations = poisson_solve(div.copied_with(data=div.data[2:3]), domain, solver)
+            self.assertEqual(single_iterations[0], iterations[2])
+            np.testing.assert_almost_equal(pressure.data[2:3], single_pressure.data, decimal=5)
+
+    def test_compact_preconditioner(self):
+        k = np.random.RandomState(0).randn(3, 50) * np.reshape([0., 1., 1e-2], [3, 1])
+        scale = np.linspace(1, 2, 50)
+        batch_sizes = []
+
+        def apply_M_inv(residual):
+            batch_sizes.append(residual.shape[0])
+            return residual / scale
+        x, iterations = preconditioned_conjugate_gradient(k, lambda x: x * scale, apply_M_inv, accuracy=1e-6, compact=True)
+        full_x, full_iterations = preconditioned_conjugate_gradient(k, lambda x: x * scale, lambda r: r / scale, accuracy=1e-6)
+        np.testing.assert_equal(iterations, full_iterations)
+        np.testing.assert_almost_equal(x, full_x)
+        self.assertEqual(batch_sizes[0], 3)  # initial direction
+        self.assertTrue(all(size < 3 for size in batch_sizes[1:]), batch_sizes)
+
+    def test_accumulation_precision(self):
+        domain = Domain([32, 32], boundaries=OPEN)
+        div = domain.centered_grid(np.random.RandomState(0).randn(2, 32, 32, 1))
+        for solver in (SparseCG(accuracy=1e-9), GeometricCG(accuracy=1e-9), SparseCG(accuracy=1e-9, preconditioner=JacobiPreconditioner())):
+            with math.use_precision(math.Precision(accumulation_type=np.float64)):
+                pressure, iterations = poisson_solve(div, domain, solver)
+            self.assertEqual(pressure.data.dtype, np.float32)
+            self.assertTrue(np.all(iterations < solver.max_iterations))
+            residual = pressure.laplace(physical_units=False).data.astype(np.float64) - div.data
+            self.assertLess(np.max(np.abs(residual)), 1e-5)
+        self.assertIsNone(math.precision().accumulation_type)
+
+    def test_sparse_pressure_matrix(self):
+        geometries = [Domain([4, 5], boundaries=CLOSED), Domain([4, 5], boundaries=PERIODIC), Domain([3, 4], boundaries=[PERIODIC, OPEN]),
+                      Domain([2, 1, 3], boundaries=[PERIODIC, PERIODIC, OPEN]), Domain([1, 2], boundaries=PERIODIC), Domain([3, 2, 4], boundaries=[OPEN, CLOSED, PERIODIC])]
+        for domain in geometries:
+            obstacle = np.ones([1] + list(domain.resolution) + [1], np.float32)
+            obstacle[(0,) + tuple(r // 2 for r in domain.resolution)] = 0
+            for mask in (None, domain.centered_grid(obstacle)):
+                poisson_domain = PoissonDomain(domain, active=mask, accessible=mask)
+                masks = poisson_domain.active_tensor(extend=1), poisson_domain.accessible_tensor(extend=1), Material.periodic(domain.boundaries)
+                expected = _loop_pressure_matrix(domain.resolution, *masks)
+                for index_dtype in (np.int64, np.int32):
+                    A = sparse_pressure_matrix(domain.resolution, *masks, index_dtype=index_dtype)
+                    self.assertEqual(A.dtype, np.float32)
+                    np.testing.assert_equal(A.toarray(), expected, err_msg='%s, obstacle=%s, %s' % (domain, mask is not None, index_dtype))
+                if mask is None and domain.boundaries == PERIODIC:
+                    np.testing.assert_equal(np.sum(expected, axis=1), 0)  # duplicate entries summed to a proper Laplace stencil
+
+    def test_float64_assembly(self):
+        domain = Domain([6, 5], boundaries=[PERIODIC, CLOSED])
+        masks = PoissonDomain(domain).active_tensor(extend=1), PoissonDomain(domain).accessible_tensor(extend=1), Material.periodic(domain.boundaries)
+        cache = SparseMatrixCache()
+        with math.use_precision(math.Precision(np.float64)):
+            self.assertEqual(sparse_pressure_matrix(domain.resolution, *masks).dtype, np.float64)
+            self.assertEqual(cache.pressure_matrix(domain.resolution, *masks).dtype, np.float64)
+            stencil = LaplaceStencil(domain.resolution, *masks)
+            self.assertEqual(stencil.diagonal.dtype, np.float64)
+            self.assertTrue(all(lower.dtype == upper.dtype == np.float64 for _, lower, upper, _, _ in stencil.neighbours))
+            self.assertEqual(stencil(np.ones([1, 30])).dtype, np.float64)
+            div = domain.centered_grid(np.random.RandomState(0).randn(1, 6, 5, 1))
+            div -= math.mean(div.data)
+            for solver in (SparseCG(accuracy=1e-12), SparseCG(accuracy=1e-12, matrix_free=True)):
+                pressure, _ = poisson_solve(div, domain, solver)
+                self.assertEqual(pressure.data.dtype, np.float64)
+                residual = pressure.laplace(physical_units=False).data - div.data
+                self.assertLess(np.max(np.abs(residual)), 1e-10)
+        self.assertEqual(cache.pressure_matrix(domain.resolution, *masks).dtype, np.float32)
+        self.assertEqual(len(cache), 2)
+
+    def test_multigrid(self):
+        _test_all(MultigridSolver())
+        _test_all(MultigridSolver(cycle='W', smoother='gauss-seidel', krylov=False))
+        iterations = []
+        for resolution in (32, 128):
+            domain = Domain([resolution, resolution], boundaries=OPEN)
+            div = domain.centered_grid(Noise())
+            pressure, iteration = poisson_solve(div, domain, MultigridSolver(accuracy=1e-4, krylov=False))
+            np.testing.assert_almost_equal(pressure.laplace(physical_units=False).data, div.data, decimal=3)
+            iterations.append(iteration)
+        self.assertLessEqual(iterations[1], iterations[0] + 5)
+
+    def test_fourier_solver(self):
+        solver = FourierSolver(spectrum_cache=None)
+        _test_all(solver)
+        self.assertEqual(len(solver._spectra), len(DOMAINS) + 3)  # one spectrum per resolution and boundary combination
+        # --- Fallback for domains with obstacles ---
+        domain = Domain([40, 32], boundaries=CLOSED)
+        active = np.ones([1, 40, 32, 1], np.float32)
+        active[:, 10:20, 10:20, :] = 0
+        poisson_domain = PoissonDomain(domain, active=domain.centered_grid(active), accessible=domain.centered_grid(active))
+        self.assertIsNone(fourier_transforms(poisson_domain))
+        div = domain.centered_grid(Noise()) * active
+        div -= math.sum(div.data) / math.sum(active)
+        div *= active
+        p, iterations = poisson_solve(div, poisson_domain, FourierSolver(fallback=SparseCG()))
+        self.assertIsNotNone(iterations)
+        np.testing.assert_almost_equal(p.data, poisson_solve(div, poisson_domain, SparseCG())[0].data, decimal=5)
+
+    def test_fftpack_transforms(self):
+        x = np.random.RandomState(0).randn(2, 7, 6, 1)
+        for transform, (forward, inverse) in _FFTPACK_TRANSFORMS.items():
+            for axis in (1, 2):
+                np.testing.assert_almost_equal(forward(x, axis), _REAL_TRANSFORMS[transform][0](x, axis))
+                np.testing.assert_almost_equal(inverse(forward(x, axis), axis), x)
+
+    def test_default_spectrum_cache(self):
+        domain = Domain([24, 17], boundaries=CLOSED)
+        div = domain.centered_grid(Noise())
+        SPECTRUM_CACHE.clear()
+        p1 = poisson_solve(div, domain)[0]
+        self.assertEqual(list(SPECTRUM_CACHE.keys()), [((24, 17), ('dct', 'dct'))])
+        spectrum = SPECTRUM_CACHE[((24, 17), ('dct', 'dct'))]
+        p2 = poisson_solve(div, domain)[0]  # default solver is created again but reuses the spectrum
+        self.assertIs(SPECTRUM_CACHE[((24, 17), ('dct', 'dct'))], spectrum)
+        self.assertEqual(len(SPECTRUM_CACHE), 1)
+        np.testing.assert_equal(p1.data, p2.data)
+        self.assertEqual(len(FourierSolver(spectrum_cache=None)._spectra), 0)
+
+    def test_matrix_cache(self):
+        cache = SparseMatrixCache(max_size=2)
+        _test_all(SparseCG(matrix_cache=cache))
+        self.assertEqual(len(cache), 2)
+        active = np.ones([1, 6, 7, 1], np.float32)
+        A1 = cache.pressure_matrix([4, 5], active, active, False)
+        self.assertIs(cache.pressure_matrix([4, 5], active.copy(), active.copy(), False), A1)
+        obstacle = active.copy()
+        obstacle[0, 2, 2, 0] = 0
+        A2 = cache.pressure_matrix([4, 5], obstacle, obstacle, False)
+        self.assertIsNot(A2, A1)
+        self.assertIsNot(cache.pressure_matrix([4, 5], active, active, True), A1)
+        self.assertEqual(len(cache), 2)
+        self.assertIsNot(cache.pressure_matrix([4, 5], active, active, False), A1)  # evicted
+        # --- Moving obstacles do not accumulate matrices ---
+        cache = SparseMatrixCache()
+        for x in range(4):
+            obstacle = active.copy()
+            obstacle[0, 2, 1 + x, 0] = 0
+            cache.factorization([4, 5], obstacle, obstacle, False)
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(len(cache._factorizations), 2)
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+
 
 def _run_higher_order_fft_reconstruction(in_field, set_accuracy, tolerance=20, order=2):
     # Higher Order FFT test
@@ -108,3 +108,36 @@ class TestStruct(TestCase):
         assert dom.staggered_shape().x.content_type is struct.Struct.shape
         assert dom.staggered_grid(math.zeros).content_type is struct.VALID
         assert dom.staggered_grid(math.zeros).x.content_type is struct.VALID
+
+    def test_copied_with_data(self):
+        validations = []
+
+        @struct.definition()
+        class Counting(struct.Struct):
+
+            def __init__(self, data, label='a', **kwargs):
+                struct.Struct.__init__(self, **struct.kwargs(locals()))
+
+            @struct.variable()
+            def data(self, data):
+                validations.append('data')
+                return data
+
+            @struct.constant()
+            def label(self, label):
+                validations.append('label')
+                return label
+
+        obj = Counting(numpy.zeros([2, 3]))
+        del validations[:]
+        # Data of same shape and dtype: only data is validated
+        copy = obj.copied_with(data=numpy.ones([2, 3]), label='a')
+        self.assertEqual(['data'], validations)
+        self.assertTrue(copy.is_valid)
+        numpy.testing.assert_equal(copy.data, 1)
+        numpy.testing.assert_equal(obj.data, 0)
+        # Different shape or changed constants: full validation
+        for changes in (dict(data=numpy.ones([3, 3])), dict(data=numpy.ones([2, 3], numpy.int32)), dict(label='b')):
+            del validations[:]
+            obj.copied_with(**changes)
+            self.assertEqual(['data', 'label'], sorted(validations))
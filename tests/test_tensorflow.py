@@ -9,6 +9,12 @@ from phi import math, struct
 from phi.geom import box
 from phi.physics.field import CenteredGrid
 from phi.tf.util import variable
+from phi.physics.domain import Domain
+from phi.physics.material import OPEN
+from phi.physics.pressuresolver.solver_api import poisson_solve
+from phi.physics.pressuresolver.sparse import SparseCG
+from phi.physics.pressuresolver.geom import GeometricCG
+from phi.physics.pressuresolver.preconditioner import JacobiPreconditioner
 
 
 class TestPlaceholder(TestCase):
@@ -31,3 +37,20 @@ class TestPlaceholder(TestCase):
         self.assertEqual('Placeholder/0:0', p[0].name)
         self.assertEqual('Placeholder/1/data:0', p[1].data.name)
         self.assertIsInstance(p, tuple)
+
+
+class TestSolvers(TestCase):
+
+    def test_batched_cg(self):
+        domain = Domain([16, 16], boundaries=OPEN)
+        data = numpy.random.RandomState(0).randn(3, 16, 16, 1).astype(numpy.float32) * numpy.reshape([0., 1., 1e-2], [3, 1, 1, 1]).astype(numpy.float32)
+        for solver in (SparseCG(accuracy=1e-4), GeometricCG(accuracy=1e-4), SparseCG(accuracy=1e-4, preconditioner=JacobiPreconditioner())):
+            tf.reset_default_graph()
+            pressure, iterations = poisson_solve(CenteredGrid(tf.constant(data), domain.box), domain, solver)
+            with tf.Session() as session:
+                pressure, iterations = session.run([pressure.data, iterations])
+            numpy_pressure, numpy_iterations = poisson_solve(CenteredGrid(data, domain.box), domain, solver)
+            self.assertEqual(iterations.shape, (3,))
+            self.assertEqual(iterations[0], 0)
+            numpy.testing.assert_allclose(iterations, numpy_iterations, atol=1)
+            numpy.testing.assert_almost_equal(pressure, numpy_pressure.data, decimal=4)